@@ -1,12 +1,20 @@
 import time
+from concurrent import futures
 from logging import getLogger
 
 from astropy.coordinates import SkyCoord
 from astropy.time import Time
 
 from dk154_control.camera.ccd3 import Ccd3
+from dk154_control.camera.output_watcher import OutputWatcher
+from dk154_control.camera.quick_look import format_stats, quick_look
+from dk154_control.camera.sky_flats import SkyFlatPlanner
+from dk154_control.polling import poll_until
 from dk154_control.tcs.ascol import Ascol
 from dk154_control.tcs import ascol_constants
+from dk154_control.tcs.dome import dome_azimuth
+from dk154_control.tcs.slew_model import SlewModel
+from dk154_control.utils import dec_dms_to_deg, ra_hms_to_deg
 from dk154_control.dfosc.dfosc import Dfosc, load_dfosc_setup
 from dk154_control.lamps.wave_lamps import WaveLamps
 
@@ -28,10 +36,20 @@ class DK154:
 
     Args:
         test_mode (bool, default=False): for use with ``dk154_mock`` tools.
+        slew_model (SlewModel, optional): used to predict slew times. By default,
+            the saved model is loaded (see ``SlewModel.load``), and updated
+            after every slew.
+        data_dir (Path, optional): the CCD3 data directory, if mounted here.
+            If given, each frame is confirmed to have been written (see
+            ``OutputWatcher``), and its path is added to the ``ExposureResult``.
 
     It is preferred to use DK154 in a ``with`` block, as some connections to servers
     (ASCOL, DFOSC MOXA) are closed nicely on exit.
 
+    A single ASCOL connection is opened on ``__enter__`` (or on first use), and is
+    shared by all methods. It is health-checked before each use, and reconnected
+    if the server has dropped it.
+
     Examples:
         Move the telecope, move the A and B wheels.
 
@@ -45,24 +63,137 @@ class DK154:
         ...     wheel_b_state = dk154.move_wheel_b_and_wait("V")
         ...     tel_state = dk154.move_telescope_and_wait(m83, 0)
 
+        Or move the telescope and dome together.
+
+        >>> with DK154() as dk154:
+        ...     tel_state, dome_state = dk154.point_and_wait(m83, 0)
+
 
 
     """
 
-    def __init__(self, test_mode=False):
+    OUTPUT_TIMEOUT = 60.0  # How long after readout to wait for a file [sec].
+    SATURATION_WARNING = 1e-3  # Fraction of saturated pixels to warn about.
+
+    def __init__(self, test_mode=False, slew_model: SlewModel = None, data_dir=None):
         self.test_mode = test_mode
+        self.ascol = None
+        self.ccd3 = None
+        self.output_watcher = None
+        if data_dir is not None:
+            self.output_watcher = OutputWatcher(data_dir)
+        self.slew_model = slew_model or SlewModel.load()
 
     def __enter__(self):
+        self.get_ascol()
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         """
         Correctly close connections.
         """
+        if self.ascol is not None:
+            self.ascol.close()
+            self.ascol = None
+            logger.info("shared ASCOL connection closed in __exit__")
+        if self.ccd3 is not None:
+            self.ccd3.close()
+            self.ccd3 = None
+        if self.output_watcher is not None:
+            self.output_watcher.stop()
+
+    def get_ascol(self) -> Ascol:
+        """
+        Return the shared ASCOL connection, (re-)connecting only if required.
+
+        Returns:
+            ascol (Ascol): the long-lived connection used by all DK154 methods.
+        """
+        if self.ascol is None:
+            self.ascol = Ascol(test_mode=self.test_mode)
+        else:
+            self.ascol.ensure_connected()
+        return self.ascol
+
+    def get_ccd3(self) -> Ccd3:
+        """
+        Return the shared CCD3 client, so its HTTP connections are reused
+        between requests and frames.
+
+        Returns:
+            ccd3 (Ccd3)
+        """
+        if self.ccd3 is None:
+            self.ccd3 = Ccd3(test_mode=self.test_mode)
+        return self.ccd3
+
+    def watch_output(self, filename: str):
+        """
+        Start watching for a frame (call before starting the exposure).
+
+        Returns:
+            future (concurrent.futures.Future or None): None if no ``data_dir``,
+                or in test mode (frames are not waited for, so would never be
+                confirmed).
+        """
+        if self.output_watcher is None or self.test_mode:
+            return None
+        self.output_watcher.start()
+        return self.output_watcher.watch(filename)
+
+    def confirm_output(self, result, future, timeout: float = None):
+        """
+        Wait for the file from ``watch_output``, and add its path and
+        quick-look statistics (see ``quick_look``) to ``result``.
+        If it does not appear, log an error (the sequence carries on).
+
+        Args:
+            timeout (float, default=OUTPUT_TIMEOUT): [sec]
+
+        Returns:
+            result (ExposureResult)
+        """
+        if result is None or future is None:
+            return result
+        if timeout is None:
+            timeout = self.OUTPUT_TIMEOUT
+        try:
+            path = future.result(timeout=timeout)
+        except futures.TimeoutError:
+            self.output_watcher.unwatch(result.filename)
+            logger.error(
+                f"{result.filename} not found in {self.output_watcher.data_dir}"
+            )
+            return result
+
+        try:
+            stats = quick_look(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"quick look of {path.name} failed: {e}")
+            return result._replace(path=path)
+        logger.info(f"{path.name}: {format_stats(stats)}")
+        if stats.saturated_fraction > self.SATURATION_WARNING:
+            logger.warning(f"{path.name} is saturated")
+        return result._replace(path=path, stats=stats)
+
+    def confirm_outputs(self, results: list, output_futures: list):
+        """
+        ``confirm_output`` for the frames of a sequence, at the end. They share
+        one ``OUTPUT_TIMEOUT``: if the files are not appearing (eg. wrong
+        ``data_dir``) don't wait that long for every frame.
+
+        Returns:
+            results (list of ExposureResult)
+        """
+        deadline = time.monotonic() + self.OUTPUT_TIMEOUT
+        return [
+            self.confirm_output(r, f, timeout=max(deadline - time.monotonic(), 0.0))
+            for r, f in zip(results, output_futures)
+        ]
 
     def log_all_status(self):
-        with Ascol(test_mode=self.test_mode) as ascol:
-            ascol.log_all_status()
+        ascol = self.get_ascol()
+        ascol.log_all_status()
         with Dfosc(test_mode=self.test_mode) as dfosc:
             dfosc.log_all_status()
 
@@ -126,6 +257,51 @@ class DK154:
 
         """
 
+        ra_str, dec_str, pos_code = self.tsra_arguments(coord, pos)
+        logger.info(f"set ra/dec to {ra_str} {dec_str} {pos_code}")
+
+        ascol = self.get_ascol()
+        start_ra, start_dec, start_pos = ascol.trrd()
+        predicted_duration = self.slew_model.predict_from_trrd(
+            start_ra, start_dec, coord.ra.deg, coord.dec.deg
+        )
+        logger.info(f"predicted slew time {predicted_duration:.1f}s")
+
+        tsra_result = ascol.tsra(ra_str, dec_str, pos_code)
+        tgra_result = ascol.tgra()
+        t_go = time.monotonic()
+        time.sleep(1.0)
+        wait_result = ascol.wait_for_result(
+            ascol.ters,
+            expected_result=wait_for_state,
+            timeout=timeout,
+            predicted_duration=predicted_duration - 1.0,
+            return_wait_result=True,
+        )
+        slew_duration = time.monotonic() - t_go
+
+        if wait_result.n_polls > 1:
+            # If the first poll matched, we only know an upper limit on the time.
+            end_ra, end_dec, end_pos = ascol.trrd()
+            self.record_slew(
+                start_ra,
+                start_dec,
+                end_ra,
+                end_dec,
+                slew_duration,
+                start_pos=start_pos,
+                end_pos=end_pos,
+            )
+
+        return wait_result.result
+
+    def tsra_arguments(self, coord: SkyCoord, pos: str):
+        """
+        Format a coordinate and telescope position as required by ``Ascol.tsra``.
+
+        Returns:
+            ra_str, dec_str, pos_code (str): eg. "133700.92", "-295156.74", "0"
+        """
         ra_hms = coord.ra.hms
         dec_dms = coord.dec.dms
         ra_str = f"{int(ra_hms.h):02d}{int(ra_hms.m):02d}{ra_hms.s:05.2f}"
@@ -142,18 +318,176 @@ class DK154:
             logger.error(f"unknown position for TRRD: {pos}")
             logger.error("Choose '0' (east) or '1' (west)")
             logger.error(f"will not move to {ra_str}, {dec_str}")
+        return ra_str, dec_str, pos_code
 
-        logger.info(f"set ra/dec to {ra_str} {dec_str} {pos_code}")
+    def point_and_wait(
+        self,
+        coord: SkyCoord,
+        pos: str,
+        wait_for_state=("ready", "sky track"),
+        wait_for_dome_state=("stopped", "auto"),
+        timeout=600.0,
+        follow=True,
+    ):
+        """
+        Move the telescope and the dome to a target together, and wait for both.
+
+        The dome azimuth is computed up front (see ``tcs.dome.dome_azimuth``), so
+        the dome starts rotating at the same time as the telescope starts to slew.
+        TERS and DORS are then polled together (one ASCOL round trip per poll),
+        so the time to get on target is the slower of the slew and the dome,
+        rather than the sum.
+
+        Sending the dome to an absolute azimuth (DOSA, DOGA) switches off
+        automated dome following. With ``follow=True`` it is switched back on
+        (``Ascol.doam``) once both have arrived, so the dome follows the
+        telescope as it tracks.
+
+        Args:
+            coord (astropy.coordinates.SkyCoord): The coordinate to move the telecope to.
+            pos (str): The telescope position "0" - "east", "1"=="west"
+            wait_for_state (str or tuple of str, default=("ready", "sky track"))
+                Wait for ``ascol.ters`` to be one of these state(s).
+            wait_for_dome_state (str or tuple of str, default=("stopped", "auto"))
+                Wait for ``ascol.dors`` to be one of these state(s).
+            timeout (float, default=600.0): Raises WaitForResultTimeoutError if
+                telescope and dome are not both ready before timeout [sec].
+            follow (bool, default=True): switch on automated dome following
+                once there.
+
+        Returns:
+            telescope_state, dome_state (str): The results of ``ascol.ters``
+                and ``ascol.dors`` once both match.
+
+        Raises:
+            ValueError: if ``pos`` is not a known telescope position (nothing
+                is moved).
+
+        Example:
+            >>> from dk154_control import DK154
+            >>> from astropy.coordinates import SkyCoord
+            >>> m83 = SkyCoord(ra=204.2538, dec=-29.86576, unit="deg")
+            >>> with DK154() as dk154:
+            ...     tel_state, dome_state = dk154.point_and_wait(m83, "east")
+            >>> print(tel_state, dome_state)
+            sky track stopped
+        """
+        if isinstance(wait_for_state, str):
+            wait_for_state = (wait_for_state,)
+        if isinstance(wait_for_dome_state, str):
+            wait_for_dome_state = (wait_for_dome_state,)
 
-        with Ascol(test_mode=self.test_mode) as ascol:
-            tsra_result = ascol.tsra(ra_str, dec_str, pos_code)
-            tgra_result = ascol.tgra()
-            time.sleep(1.0)
-            res = ascol.wait_for_result(
-                ascol.ters, expected_result=wait_for_state, delay=5.0, timeout=timeout
+        ra_str, dec_str, pos_code = self.tsra_arguments(coord, pos)
+        if pos_code is None:
+            raise ValueError(f"unknown telescope position '{pos}'")
+        dome_az = dome_azimuth(coord)
+        logger.info(f"point to {ra_str} {dec_str} {pos_code}, dome az {dome_az:.2f}")
+
+        ascol = self.get_ascol()
+        start_ra, start_dec, start_pos = ascol.trrd()
+        predicted_duration = self.slew_model.predict_from_trrd(
+            start_ra, start_dec, coord.ra.deg, coord.dec.deg
+        )
+        logger.info(f"predicted slew time {predicted_duration:.1f}s")
+
+        ascol.tsra(ra_str, dec_str, pos_code)
+        ascol.dosa(dome_az)
+        ascol.tgra()
+        ascol.doga()
+        t_go = time.monotonic()
+        time.sleep(1.0)
+
+        slew = {"n_polls": 0, "t_end": None, "end_poll": None}
+
+        def read_states():
+            telescope_state, dome_state = ascol.read_many(["TERS", "DORS"])
+            slew["n_polls"] = slew["n_polls"] + 1
+            if slew["t_end"] is None and telescope_state in wait_for_state:
+                # The dome may still be moving: remember when the slew ended.
+                slew["t_end"], slew["end_poll"] = time.monotonic(), slew["n_polls"]
+            return telescope_state, dome_state
+
+        def both_ready(states):
+            telescope_state, dome_state = states
+            return (
+                telescope_state in wait_for_state and dome_state in wait_for_dome_state
             )
 
-        return res
+        wait_result = poll_until(
+            read_states,
+            both_ready,
+            timeout=timeout,
+            predicted_duration=predicted_duration - 1.0,
+            func_name="TERS+DORS",
+        )
+        logger.info(f"telescope and dome ready after {time.monotonic() - t_go:.1f}s")
+        if follow:
+            ascol.doam()  # DOGA switched the dome to manual positioning.
+
+        if slew["end_poll"] > 1:
+            # If the first poll matched, we only know an upper limit on the time.
+            end_ra, end_dec, end_pos = ascol.trrd()
+            slew_duration = slew["t_end"] - t_go
+            self.record_slew(
+                start_ra,
+                start_dec,
+                end_ra,
+                end_dec,
+                slew_duration,
+                start_pos=start_pos,
+                end_pos=end_pos,
+            )
+
+        return wait_result.result
+
+    def predict_slew_time(self, coord: SkyCoord):
+        """
+        Predict how long a slew from the current position to ``coord`` will take,
+        so that other work (wheel moves, lamp warm-up, CCD setup) can be overlapped.
+
+        Args:
+            coord (astropy.coordinates.SkyCoord): The target coordinate.
+
+        Returns:
+            duration (float): predicted slew time [sec]
+        """
+        curr_ra, curr_dec, curr_pos = self.get_ascol().trrd()
+        return self.slew_model.predict_from_trrd(
+            curr_ra, curr_dec, coord.ra.deg, coord.dec.deg
+        )
+
+    def record_slew(
+        self,
+        start_ra,
+        start_dec,
+        end_ra,
+        end_dec,
+        duration,
+        start_pos=None,
+        end_pos=None,
+    ):
+        """
+        Add a completed slew (positions as returned by ``Ascol.trrd``) to the model.
+
+        Slews where the telescope position (east/west of the pier) changed are
+        not recorded: the flip is not part of the per-axis model, and would
+        bias it to slower slews.
+        """
+        logger.info(f"slew took {duration:.1f}s")
+        if start_pos != end_pos:
+            logger.info(f"pier flip ({start_pos} -> {end_pos}): slew not recorded")
+            return
+        self.slew_model.record(
+            ra_hms_to_deg(start_ra),
+            dec_dms_to_deg(start_dec),
+            ra_hms_to_deg(end_ra),
+            dec_dms_to_deg(end_dec),
+            duration,
+        )
+        try:
+            self.slew_model.save()
+        except OSError as e:
+            logger.warning(f"could not save slew model: {e}")
 
     def move_wheel_a_and_wait(self, wheel_a_filter: str, wait_for_state="locked"):
         """
@@ -188,18 +522,18 @@ class DK154:
 
         logger.info(f"move FASU A to {wheel_a_filter} (pos={wheel_a_pos}) and wait...")
 
-        with Ascol(test_mode=self.test_mode) as ascol:
-            wheel_a_curr = ascol.warp()
-            logger.info(f"FASU A current/target: {wheel_a_curr}/{wheel_a_filter}")
-            wheel_a_state = ascol.wars()
-            if wheel_a_filter == wheel_a_curr:
-                logger.info(f"FASU A already at {wheel_a_filter} - done!")
-                return
+        ascol = self.get_ascol()
+        wheel_a_curr = ascol.warp()
+        logger.info(f"FASU A current/target: {wheel_a_curr}/{wheel_a_filter}")
+        wheel_a_state = ascol.wars()
+        if wheel_a_filter == wheel_a_curr:
+            logger.info(f"FASU A already at {wheel_a_filter} - done!")
+            return
 
-            wasp_result = ascol.wasp(wheel_a_pos)
-            wagp_result = ascol.wagp()
+        wasp_result = ascol.wasp(wheel_a_pos)
+        wagp_result = ascol.wagp()
 
-            res = ascol.wait_for_result(ascol.wars, expected_result=wait_for_state)
+        res = ascol.wait_for_result(ascol.wars, expected_result=wait_for_state)
         return res
 
     def move_wheel_b_and_wait(self, wheel_b_filter: str, wait_for_state="locked"):
@@ -235,17 +569,17 @@ class DK154:
 
         logger.info(f"move FASU B to {wheel_b_filter} (pos={wheel_b_pos}) and wait...")
 
-        with Ascol(test_mode=self.test_mode) as ascol:
-            wheel_b_curr = ascol.wbrp()
-            wheel_b_state = ascol.wbrs()
-            if wheel_b_filter == wheel_b_curr:
-                logger.info(f"FASU B already at {wheel_b_filter} - done!")
-                return
+        ascol = self.get_ascol()
+        wheel_b_curr = ascol.wbrp()
+        wheel_b_state = ascol.wbrs()
+        if wheel_b_filter == wheel_b_curr:
+            logger.info(f"FASU B already at {wheel_b_filter} - done!")
+            return
 
-            wasp_result = ascol.wbsp(wheel_b_pos)
-            wagp_result = ascol.wbgp()
+        wasp_result = ascol.wbsp(wheel_b_pos)
+        wagp_result = ascol.wbgp()
 
-            ascol.wait_for_result(ascol.wbrs, expected_result=wait_for_state)
+        ascol.wait_for_result(ascol.wbrs, expected_result=wait_for_state)
         return
 
     def move_dfosc_grism_and_wait(self, dfosc_grism: str):
@@ -325,6 +659,41 @@ class DK154:
             dfosc.filter_goto(dfosc_f_pos)
         return
 
+    def switch_lamps_off(self):
+        """
+        Switch the arc lamps off. Always sent: another script (or a person) may
+        have switched them on since. Sequences of frames call this once, at the
+        start.
+        """
+        with WaveLamps(test_mode=self.test_mode) as wvlamps:
+            wvlamps.all_lamps_off()
+
+    def science_exposure_parameters(self, exposure_time: float, object_name: str):
+        """
+        CCD3 parameters for a science frame, with the FASU A/B filters for the
+        header. FASU positions and the shutter are read in one ASCOL round trip
+        (FASU positions are usually cached), and the shutter is only opened
+        if it is not already open.
+
+        Returns:
+            exp_params (dict)
+        """
+        exp_params = {}
+        exp_params["CCD3.exposure"] = str(exposure_time)
+        exp_params["CCD3.IMAGETYP"] = "SCIENCE"
+        exp_params["CCD3.OBJECT"] = object_name
+
+        ascol = self.get_ascol()
+        FASU_A, FASU_B, shutter_pos = ascol.read_many(["WARP", "WBRP", "SHRP"])
+        if shutter_pos != "open":
+            shop_result = ascol.shop("1")
+            shutter_pos = ascol.shrp()
+        logger.info(f"shutter is {shutter_pos}")
+
+        exp_params["WASA.filter"] = FASU_A
+        exp_params["WASB.filter"] = FASU_B
+        return exp_params
+
     def take_science_frame(
         self,
         exposure_time: float,
@@ -336,10 +705,10 @@ class DK154:
         """
         Take a single science frame.
         First, Ascol.shop("1") [SHutter OPen/close] is called to ensure shutter is open.
-        Call WaveLamps().all_lamps_off() to ensure arc lamps are off.
+        Call switch_lamps_off() to ensure arc lamps are off.
         Then, call CCD3 to save to <filename>
-        Optionally wait <exposure_time>+1 seconds.
-        Wait for <read_wait> seconds (for CCD3 to read out).
+        Optionally wait until the CCD3 state shows readout has finished
+        (see ``Ccd3.wait_for_exposure``).
 
         Args:
             exposure_time (float):
@@ -350,60 +719,47 @@ class DK154:
             object_name (str):
                 Stored in the FITS header under OBJECT
             exposure_wait (bool, default=True):
-                If true, wait for <exposure_time>+1. seconds.
+                If true, wait until the exposure is read out.
             read_wait (float, default=30.0):
-                How long to wait (in seconds) after exposure for CCD to read?
+                Expected readout time [sec], used to schedule CCD state polls.
 
-        """
-        exp_params = {}
-        exp_params["CCD3.exposure"] = str(exposure_time)
-        exp_params["CCD3.IMAGETYP"] = "SCIENCE"
-        exp_params["CCD3.OBJECT"] = object_name
-
-        with WaveLamps(test_mode=self.test_mode) as wvlamps:
-            wvlamps.all_lamps_off()
+        Returns:
+            result (ExposureResult or None): None if not waiting, or in test mode.
 
-        with Ascol(test_mode=self.test_mode) as ascol:
-            FASU_A = ascol.warp()
-            FASU_B = ascol.wbrp()
-            shop_result = ascol.shop("1")
-            shutter_pos = ascol.shrp()
-            logger.info(f"shutter is {shutter_pos}")
+        Raises:
+            ExposureError: if CCD3 reports an error during the exposure.
+        """
+        self.switch_lamps_off()
+        exp_params = self.science_exposure_parameters(exposure_time, object_name)
 
-        exp_params["WASA.filter"] = FASU_A
-        exp_params["WASB.filter"] = FASU_B
+        ccd3 = self.get_ccd3()
+        ccd3.set_exposure_parameters(exp_params)
+        output_future = self.watch_output(filename)
+        ccd3.start_exposure(str(filename))
 
-        with Ccd3(test_mode=self.test_mode) as ccd3:
-            ccd3.set_exposure_parameters(exp_params)
-            ccd3.start_exposure(str(filename))
-            time.sleep(1.0)
-            ccd_status = ccd3.get_ccd_state()
-        logger.info(f"CCD state: {ccd_status}")
-
-        if not self.test_mode:
-            if exposure_wait:
-                logger.info(f"wait {exposure_time}+1 sec for exposure")
-                time.sleep(exposure_time + 1.0)
-            with Ccd3(test_mode=self.test_mode) as ccd3:
-                ccd_status = ccd3.get_ccd_state()
-            logger.info(f"CCD state: {ccd_status}")
-            if read_wait:
-                logger.info(f"wait {read_wait} sec for CCD read")
-                time.sleep(read_wait)
-                with Ccd3(test_mode=self.test_mode) as ccd3:
-                    ccd_status = ccd3.get_ccd_state()
-                logger.info(f"CCD state: {ccd_status}")
-        else:
+        if self.test_mode:
             logger.info("skip exp/read wait in test mode...")
+            return None
+        if not exposure_wait:
+            return None
+        result = ccd3.wait_for_exposure(
+            exposure_time, filename=str(filename), readout_time=read_wait
+        )
+        return self.confirm_output(result, output_future)
 
     def take_science_multi_frames(
         self, exposure_time: float, object_name: str, n_exp: int, read_wait=30.0
     ):
         """
-        Repeatedly call take_science_frame().
-        (take_science_frame() ensures shutter open, and records FASU A and B position in fits.)
+        Take a sequence of science frames, as take_science_frame()
+        (ensures shutter open, and records FASU A and B position in fits).
         Filenames will be named sequentially using object_name.
 
+        The frames are pipelined: lamps are switched off once, and while each
+        frame reads out, the FASU/shutter state for the next frame is read
+        and its parameters are sent to CCD3 (only if changed), so the next
+        exposure starts as soon as readout finishes.
+
         eg. for n_exp=3, object_name="M101", files are
         "M101_001.fits", "M101_002.fits", "M101_003.fits"
 
@@ -424,15 +780,160 @@ class DK154:
             n_exp (int):
                 How many repeat exposures?
             read_wait (float, default=30.0):
-                How long to wait (in seconds) after exposure for CCD to read?
+                Expected readout time [sec], used to schedule CCD state polls.
 
+        Returns:
+            results (list of ExposureResult)
         """
 
+        self.switch_lamps_off()
+        ccd3 = self.get_ccd3()
+        exp_params = self.science_exposure_parameters(exposure_time, object_name)
+        ccd3.set_exposure_parameters(exp_params)
+
+        def prepare_next_frame():
+            # While this frame reads out: header values and parameters for the next.
+            next_params = self.science_exposure_parameters(exposure_time, object_name)
+            ccd3.set_exposure_parameters(next_params)
+
+        results, output_futures = [], []
         for ii in range(1, n_exp + 1):
             filename = f"{object_name}_{ii:03d}.fits"
-            self.take_science_frame(
-                exposure_time, filename, object_name, read_wait=read_wait
+            output_futures.append(self.watch_output(filename))
+            ccd3.start_exposure(filename)
+            if self.test_mode:
+                logger.info("skip exp/read wait in test mode...")
+                continue
+            is_last = ii == n_exp
+            result = ccd3.wait_for_exposure(
+                exposure_time,
+                filename=filename,
+                readout_time=read_wait,
+                on_readout=None if is_last else prepare_next_frame,
             )
+            results.append(result)
+        # Don't hold up the next exposure: files are confirmed at the end.
+        return self.confirm_outputs(results, output_futures)
+
+    def read_twilight(self):
+        """
+        Returns:
+            twilight (float or None): [Lux] from ``Ascol.metw``, None if not valid.
+        """
+        twilight, validity = self.get_ascol().metw()
+        if validity != "valid":
+            logger.warning(f"twilight sensor is {validity}")
+            return None
+        return twilight
+
+    def take_sky_flats(
+        self,
+        n_flats: int,
+        flat_name="skyflat",
+        planner: SkyFlatPlanner = None,
+        max_frames: int = None,
+        max_wait: float = 600.0,
+        read_wait=30.0,
+    ):
+        """
+        Take twilight sky flats, choosing each exposure time from the quick-look
+        median of the previous flats and the twilight sensor (see
+        ``SkyFlatPlanner``). Needs ``data_dir``, to measure each flat.
+
+        If the sky is too bright in the evening (or too dark in the morning),
+        wait (up to ``max_wait`` in total) for it to change.
+        Stop once the sky is too dark in the evening (too bright in the morning).
+
+        files are named "<flat_name>_001.fits", "<flat_name>_002.fits", etc.
+
+        Example:
+            >>> with DK154(data_dir="/mnt/lin1/data") as dk154:
+            ...     results = dk154.take_sky_flats(7, flat_name="skyflat_R")
+
+        Args:
+            n_flats (int): how many flats within the planner's levels to take.
+            flat_name (str, default="skyflat"): used for file names and OBJECT.
+            planner (SkyFlatPlanner, optional): target levels, exposure time
+                limits, and ``rate_per_lux``. Defaults to ``SkyFlatPlanner()``.
+            max_frames (int, default=2*n_flats): stop after this many frames,
+                good or not.
+            max_wait (float, default=600.0): [sec]
+            read_wait (float, default=30.0):
+                Expected readout time [sec], used to schedule CCD state polls.
+
+        Returns:
+            results (list of ExposureResult): all frames taken, good or not.
+
+        Raises:
+            ValueError: if there's no ``data_dir``.
+        """
+        if self.output_watcher is None:
+            msg = "sky flats need quick-look statistics: use DK154(data_dir=...)"
+            raise ValueError(msg)
+        planner = planner or SkyFlatPlanner()
+        max_frames = max_frames or 2 * n_flats
+
+        self.switch_lamps_off()
+        ccd3 = self.get_ccd3()
+        results = []
+        n_good = 0
+        total_wait = 0.0
+        while n_good < n_flats and len(results) < max_frames:
+            lux = self.read_twilight()
+            planner.add_lux(lux)
+            exposure_time = planner.next_exposure_time()
+            status = planner.check(exposure_time)
+            if status != "ok":
+                wait = planner.time_until_ok(exposure_time)
+                if wait is None or total_wait + wait > max_wait:
+                    logger.info(f"sky is {status} ({exposure_time:.1f}s): stop")
+                    break
+                wait = min(max(wait, 10.0), 60.0)  # Then check again.
+                logger.info(f"sky is {status} ({exposure_time:.1f}s): wait {wait:.0f}s")
+                time.sleep(wait)
+                total_wait = total_wait + wait
+                continue
+
+            exposure_time = round(exposure_time, 1)
+            exp_params = self.science_exposure_parameters(exposure_time, flat_name)
+            exp_params["CCD3.IMAGETYP"] = "FLAT,SKY"
+            ccd3.set_exposure_parameters(exp_params)
+
+            filename = f"{flat_name}_{len(results) + 1:03d}.fits"
+            output_future = self.watch_output(filename)
+            t_start = time.time()
+            ccd3.start_exposure(filename)
+            if self.test_mode:
+                logger.info("skip exp/read wait in test mode...")
+                return results
+            result = ccd3.wait_for_exposure(
+                exposure_time, filename=filename, readout_time=read_wait
+            )
+            # The next exposure time depends on this frame: wait for it.
+            result = self.confirm_output(result, output_future)
+            results.append(result)
+            if result.stats is None:
+                logger.error(f"no quick look for {filename}: stop")
+                break
+
+            saturated = result.stats.saturated_fraction > 0.01
+            planner.add_frame(
+                exposure_time,
+                result.stats.median,
+                t_start,
+                lux=lux,
+                saturated=saturated,
+            )
+            if planner.is_good(result.stats.median):
+                n_good = n_good + 1
+            else:
+                logger.warning(f"{filename} median {result.stats.median:.0f}: not kept")
+
+        logger.info(f"{n_good} of {len(results)} sky flats within levels")
+        rate_per_lux = planner.fitted_rate_per_lux()
+        if rate_per_lux is not None:
+            logger.info(f"sky rate per twilight Lux: {rate_per_lux:.3g} ADU/s/Lux")
+        return results
 
     def take_dark_frames(
         self, exposure_time: float, n_exp: int, dark_name=None, read_wait=30.0
@@ -440,7 +941,7 @@ class DK154:
         """
         Take dark frames.
         First calls Ascol.shop("0") to ensure shutter is closed.
-        Call WaveLamps().all_lamps_off() to ensure arc lamps are off.
+        Call switch_lamps_off() to ensure arc lamps are off.
 
         files are named "<dark_name>_001.fits", "<dark_name>_002.fits",
         and are likely stored in lin1:/data/YYMMDD/
@@ -453,48 +954,48 @@ class DK154:
             dark_name (str, optional):
                 If not provided, defaults to "dark_<date>UT", <date>=yymmdd_HHMMSS
                 (<date> is set at time of function call, so is fixed for all n_exp frames)
-            exposure_wait (bool, default=True):
-                If true, wait for <exposure_time>+1. seconds.
             read_wait (float, default=30.0):
-                How long to wait (in seconds) after exposure for CCD to read?
-
+                Expected readout time [sec], used to schedule CCD state polls.
 
+        Returns:
+            results (list of ExposureResult): empty in test mode.
         """
 
         if dark_name is None:
             t_now = Time.now()
             t_str = t_now.strftime("%y%m%d_%H%M%S")
-            logger.info(f"dark_name defaults to {t_str}")
+            dark_name = f"dark_{t_str}UT"
+            logger.info(f"dark_name defaults to {dark_name}")
 
         exp_params = {}
         exp_params["CCD3.exposure"] = str(exposure_time)
         exp_params["CCD3.IMAGETYP"] = "DARK"
         exp_params["CCD3.OBJECT"] = "DARK"
 
-        with WaveLamps(test_mode=self.test_mode) as wvlamps:
-            wvlamps.all_lamps_off()
+        self.switch_lamps_off()
 
-        with Ascol(test_mode=self.test_mode) as ascol:
-            ascol.shop("0")
-            shutter_pos = ascol.shrp()
-            logger.info(f"shutter is {shutter_pos}")
-
-        with Ccd3(test_mode=self.test_mode) as ccd3:
-            for ii in range(1, n_exp + 1):
-                filename = f"{dark_name}_{ii:03d}.fits"
-                ccd3.set_exposure_parameters(exp_params)
-
-                ccd3.start_exposure(str(filename))
-
-                if not self.test_mode:
-                    logger.info(f"wait {exposure_time}+1 sec for exposure")
-                    time.sleep(exposure_time + 1.0)
-                    ccd_status = ccd3.get_ccd_state()
-                    logger.info("CCD state: ccd_status")
-                    logger.info(f"wait {read_wait} sec for read")
-                    time.sleep(read_wait)
-                else:
-                    logger.info("skip exp/read wait in test mode...")
+        ascol = self.get_ascol()
+        ascol.shop("0")
+        shutter_pos = ascol.shrp()
+        logger.info(f"shutter is {shutter_pos}")
+
+        ccd3 = self.get_ccd3()
+        results, output_futures = [], []
+        for ii in range(1, n_exp + 1):
+            filename = f"{dark_name}_{ii:03d}.fits"
+            ccd3.set_exposure_parameters(exp_params)
+
+            output_futures.append(self.watch_output(filename))
+            ccd3.start_exposure(str(filename))
+
+            if not self.test_mode:
+                result = ccd3.wait_for_exposure(
+                    exposure_time, filename=filename, readout_time=read_wait
+                )
+                results.append(result)
+            else:
+                logger.info("skip exp/read wait in test mode...")
+        return self.confirm_outputs(results, output_futures)
 
     def switch_lamps_on(self):
         raise NotImplementedError
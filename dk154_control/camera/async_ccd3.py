@@ -0,0 +1,258 @@
+"""
+asyncio-native client for the CCD3 camera server.
+
+Mirrors ``Ccd3``, but every request is a coroutine, so that one event loop can
+run an exposure while also moving wheels, slewing, etc. (eg. with ``AsyncAscol``).
+
+Requests are made by a ``Ccd3`` in a worker thread, so the HTTP handling, the
+keep-alive session and the retry policy are exactly those of the sync client.
+"""
+
+import asyncio
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+
+from dk154_control.camera.ccd3 import (
+    Ccd3,
+    as_str,
+    changed_parameters,
+    split_mset_params,
+)
+from dk154_control.camera.ccd3_status_codes import Ccd3State
+from dk154_control.camera.exposure import ExposureMonitor, ExposureResult
+from dk154_control.polling import async_poll_until
+
+logger = getLogger(__name__.split(".")[-1])
+
+
+class AsyncCcd3:
+    """
+    CCD3 client for ``asyncio``. Has the same methods as ``Ccd3``, which must be
+    awaited, and ``expose`` to run a whole exposure.
+
+    Example:
+        Expose while wheel A moves.
+
+        >>> import asyncio
+        >>> from dk154_control.camera.async_ccd3 import AsyncCcd3
+        >>> from dk154_control.tcs.async_ascol import AsyncAscol
+        >>> async def main():
+        ...     params = {"CCD3.exposure": "30", "CCD3.IMAGETYP": "LIGHT"}
+        ...     async with AsyncCcd3() as ccd3, AsyncAscol() as ascol:
+        ...         result, wheel_state = await asyncio.gather(
+        ...             ccd3.expose(params, "M83_001.fits"),
+        ...             ascol.wait_for_result(ascol.wars, "locked"),
+        ...         )
+        ...     return result
+        >>> result = asyncio.run(main())
+
+    Requests from many tasks are sent one at a time, by one worker thread.
+    Retries are as for ``Ccd3``: failing to connect, and 502/503/504 replies to
+    'api/get'. Errors are the same ``requests`` exceptions.
+
+    Args:
+        external (bool, default=False): use the external URL.
+        test_mode (bool, default=False): for use with ``dk154_mock`` tools.
+        debug (bool, default=False): log the full responses.
+        timeout (tuple of float, default=(3.05, 10.0)): (connect, read)
+            timeouts for each request [sec].
+        max_retries (int, default=3): retries after failing to connect.
+        request_delay (float, default=0.5): see ``Ccd3`` (the event loop keeps
+            running).
+    """
+
+    READOUT_TIME = Ccd3.READOUT_TIME
+    EXPOSURE_TIMEOUT_MARGIN = Ccd3.EXPOSURE_TIMEOUT_MARGIN
+
+    def __init__(
+        self,
+        external=False,
+        test_mode=False,
+        debug=False,
+        timeout=(3.05, 10.0),
+        max_retries=3,
+        request_delay=0.5,
+    ):
+        logger.info("initialise AsyncCcd3")
+        self.ccd3 = Ccd3(
+            external=external,
+            test_mode=test_mode,
+            timeout=timeout,
+            max_retries=max_retries,
+            request_delay=None,  # Slept here, without blocking the event loop.
+        )
+        self.base_url = self.ccd3.base_url
+        self.external = external
+        self.test_mode = test_mode
+        self.debug = debug
+        self.request_delay = request_delay
+
+        self.current_exposure_parameters = None
+        self.acknowledged_parameters = {}  # As last set on CCD3 by mset [str].
+
+        self.executor = None
+        self.lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        async with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False)
+                self.executor = None
+            self.ccd3.close()
+
+    async def get_data(self, endpoint: str, params: dict, delay=True) -> dict:
+        """
+        GET ``<base_url>/<endpoint>`` (with ``Ccd3.get_data``, in the worker
+        thread) and return the decoded JSON response.
+        """
+        url = f"{self.base_url}{endpoint}"
+        request = functools.partial(self.ccd3.get_data, url, as_str(params))
+        async with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(1, thread_name_prefix="AsyncCcd3")
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(self.executor, request)
+            if delay and self.request_delay:
+                await asyncio.sleep(self.request_delay)
+        if self.debug:
+            logger.info(f"{endpoint} full response:\n{json.dumps(response, indent=4)}")
+        return response
+
+    async def get_ccd_response(self) -> dict:
+        params = {"e": "1", "d": "CCD3"}  # Don't know what "e" or "d" mean.
+        return await self.get_data("api/get", params, delay=False)
+
+    async def set_exposure_parameters(
+        self, params: dict, use_async=True, force=False
+    ) -> dict:
+        """
+        Requests 'api/mset'. Only changed parameters are sent
+        (see ``Ccd3.set_exposure_parameters``).
+
+        Returns:
+            response (dict or None): None if nothing was sent.
+        """
+        params, request_options = split_mset_params(params, use_async)
+        self.current_exposure_parameters = params
+
+        changed_params = changed_parameters(
+            params, self.acknowledged_parameters, force=force
+        )
+        if len(changed_params) == 0:
+            logger.info("exposure parameters unchanged: skip mset")
+            return None
+        logger.info(f"mset {len(changed_params)}/{len(params)} changed parameters")
+
+        try:
+            response = await self.get_data(
+                "api/mset", {**changed_params, **request_options}
+            )
+        except OSError:  # Includes requests.exceptions.RequestException.
+            # Don't know which (if any) were set - send everything next time.
+            self.acknowledged_parameters = {}
+            raise
+        self.acknowledged_parameters.update(as_str(changed_params))
+        return response
+
+    async def start_exposure(self, filename: str) -> dict:
+        """
+        Requests 'api/expose'.
+        """
+        logger.info("starting exposure")
+        if self.current_exposure_parameters is None:
+            msg = (
+                "You have not set any exposure parameters since last exposure"
+                " - the last exposure parameters will be repeated."
+            )
+            logger.warning(msg)
+        params = {"ccd": "CCD3", "fe": str(filename)}
+        return await self.get_data("api/expose", params)
+
+    async def stop_exposure(self) -> dict:
+        """
+        Sends api/killscript to CCD3
+        """
+        return await self.get_data("api/killscript", {"d": "CCD3"})
+
+    async def get_ccd_state(self) -> Ccd3State:
+        ccd_response = await self.get_ccd_response()
+        ccd_state = Ccd3State(ccd_response["state"])
+        if self.debug:
+            logger.info(f"CCD3 state: {ccd_state:#x} ({ccd_state})")
+        return ccd_state
+
+    async def wait_for_exposure(
+        self,
+        exposure_time: float,
+        filename: str = None,
+        readout_time: float = None,
+        timeout: float = None,
+        min_delay: float = 0.2,
+        max_delay: float = 2.0,
+    ) -> ExposureResult:
+        """
+        Poll the CCD state until readout of the current exposure has finished.
+        See ``Ccd3.wait_for_exposure``.
+        """
+        if readout_time is None:
+            readout_time = self.READOUT_TIME
+        if timeout is None:
+            timeout = exposure_time + readout_time + self.EXPOSURE_TIMEOUT_MARGIN
+
+        monitor = ExposureMonitor(exposure_time, filename=filename)
+
+        def readout_finished(state):
+            return monitor.update(state)
+
+        await async_poll_until(
+            self.get_ccd_state,
+            readout_finished,
+            timeout=timeout,
+            predicted_duration=exposure_time + readout_time,
+            min_delay=min_delay,
+            max_delay=max_delay,
+            func_name="CCD3 state",
+        )
+        result = monitor.result()
+        logger.info(
+            f"exposure {filename} finished after {result.elapsed:.1f}s "
+            f"({result.n_polls} polls)"
+        )
+        return result
+
+    async def expose(
+        self, params: dict, filename: str, readout_time: float = None
+    ) -> ExposureResult:
+        """
+        Set the exposure parameters, start the exposure, and wait until it is
+        read out.
+
+        Args:
+            params (dict): exposure parameters, including "CCD3.exposure".
+            filename (str): the name of the file to save.
+            readout_time (float, optional): see ``wait_for_exposure``.
+
+        Returns:
+            result (ExposureResult)
+
+        Raises:
+            ExposureError: if CCD3 reports an error during the exposure.
+        """
+        exposure_time = float(params["CCD3.exposure"])
+        await self.set_exposure_parameters(params)
+        t_start = time.monotonic()
+        await self.start_exposure(filename)
+        result = await self.wait_for_exposure(
+            exposure_time, filename=str(filename), readout_time=readout_time
+        )
+        logger.info(f"expose {filename}: {time.monotonic() - t_start:.1f}s in total")
+        return result
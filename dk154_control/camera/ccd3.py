@@ -3,6 +3,12 @@ from logging import getLogger
 
 import requests
 import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from dk154_control.camera.ccd3_status_codes import Ccd3State
+from dk154_control.camera.exposure import ExposureMonitor, ExposureResult
+from dk154_control.polling import poll_until
 
 logger = getLogger(__name__.split(".")[-1])
 
@@ -23,7 +29,67 @@ EXPECTED_PARAMETERS = (
 )
 
 
+def as_str(params: dict) -> dict:
+    return {key: str(val) for key, val in params.items()}
+
+
+def split_mset_params(params: dict, use_async=True):
+    """
+    Separate the "async" request option from the exposure parameters,
+    and warn about unexpected parameters.
+
+    Returns:
+        params, request_options (dict)
+    """
+    params = dict(params)
+    request_options = {}
+    if "async" in params:
+        request_options["async"] = params.pop("async")
+    elif use_async:
+        request_options["async"] = 0
+
+    # Are we trying to set something unexpected?
+    unknown_params = {
+        key: val for key, val in params.items() if key not in EXPECTED_PARAMETERS
+    }
+    if len(unknown_params) > 0:
+        logger.warning(f"Unknown exposure parameters:\n {unknown_params}")
+    return params, request_options
+
+
+def changed_parameters(params: dict, acknowledged: dict, force=False) -> dict:
+    """
+    The parameters which differ from those ``acknowledged`` by CCD3.
+    Compared as str: everything is sent as str in the query anyway.
+    """
+    if force:
+        return dict(params)
+    return {
+        key: val for key, val in params.items() if acknowledged.get(key) != str(val)
+    }
+
+
 class Ccd3:
+    """
+    HTTP client for the CCD3 camera server.
+
+    One ``requests.Session`` is kept for the lifetime of the object, so
+    connections are reused (keep-alive) rather than opened for every request.
+    Connection failures are retried with backoff, and so are 502/503/504
+    replies to 'api/get'. Any other request that reached the server is never
+    re-sent: a repeated ``api/expose`` would start a second exposure.
+
+    Args:
+        external (bool, default=False): use the external URL.
+        test_mode (bool, default=False): for use with ``dk154_mock`` tools.
+        debug (bool, default=False): log the full responses.
+        timeout (tuple of float, default=(3.05, 10.0)): (connect, read)
+            timeouts for each request [sec].
+        max_retries (int, default=3): retries after failing to connect.
+        request_delay (float, default=0.5): sleep after each request which
+            changes something (mset, expose...), not after reading the state [sec].
+    """
+
     EXTERNAL_URL = "http://134.171.81.78:/8889/"
     INTERNAL_URL = "http://192.168.132.52:8889/"
     LOCAL_URL = "http://127.0.0.1:8884/"
@@ -31,8 +97,21 @@ class Ccd3:
     PASSWORD = "dk154"
 
     EXPOSURE_SLEEP_BUFFER = 3.0
-
-    def __init__(self, external=False, test_mode=False, debug=False):
+    READOUT_TIME = 25.0  # Rough, only used to schedule state polls [sec].
+    EXPOSURE_TIMEOUT_MARGIN = 60.0
+    RETRY_BACKOFF_FACTOR = 0.2  # sleep 0.2, 0.4, 0.8... between retries
+    RETRY_STATUS_CODES = (502, 503, 504)
+    STATUS_RETRY_ENDPOINTS = ("api/get",)  # Only these are safe to re-send.
+
+    def __init__(
+        self,
+        external=False,
+        test_mode=False,
+        debug=False,
+        timeout=(3.05, 10.0),
+        max_retries=3,
+        request_delay=0.5,
+    ):
         logger.info("initialise Ccd3 ")
 
         self.exposure_parameters = None
@@ -50,19 +129,63 @@ class Ccd3:
         self.debug = debug  # TODO: change debug mode so that the LOGGER is changed!
 
         self.auth = requests.auth.HTTPBasicAuth(self.USER, self.PASSWORD)
+        self.timeout = timeout
+        # Czech scripts show waiting 0.5s after calling is helpful.
+        self.request_delay = request_delay
+        self.session = self.make_session(max_retries)
 
         self.current_exposure_parameters = None
+        self.acknowledged_parameters = {}  # As last set on CCD3 by mset [str].
+
+    def make_session(self, max_retries: int) -> requests.Session:
+        """
+        Every request is retried after failing to connect. Only 'api/get'
+        (reading the state) is also retried on 502/503/504: the server may have
+        acted on an 'api/expose' or 'api/mset' before replying with an error.
+        """
+        connect_retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,  # The server may have acted on the request - don't resend.
+            status=0,
+            backoff_factor=self.RETRY_BACKOFF_FACTOR,
+            raise_on_status=False,
+        )
+        status_retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            status_forcelist=self.RETRY_STATUS_CODES,
+            allowed_methods=("GET",),
+            backoff_factor=self.RETRY_BACKOFF_FACTOR,
+            raise_on_status=False,
+        )
+        session = requests.Session()
+        session.auth = self.auth
+        session.mount("http://", HTTPAdapter(max_retries=connect_retry, pool_maxsize=4))
+        # The longest matching prefix is used, so these are only for 'api/get'.
+        for endpoint in self.STATUS_RETRY_ENDPOINTS:
+            session.mount(
+                f"{self.base_url}{endpoint}",
+                HTTPAdapter(max_retries=status_retry, pool_maxsize=4),
+            )
+        return session
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        pass
+        self.close()
 
-    def get_data(self, url, params):
+    def close(self):
+        self.session.close()
 
-        response = requests.get(url, auth=self.auth, params=params)
-        time.sleep(0.5)  # Czech scripts show waiting 0.5s after calling is helpful.
+    def get_data(self, url, params, delay=True):
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        if delay and self.request_delay:
+            time.sleep(self.request_delay)
 
         return response.json()
 
@@ -70,7 +193,7 @@ class Ccd3:
         get_url = f"{self.base_url}api/get"
         params = {"e": "1", "d": "CCD3"}  # Don't know what "e" or "d" mean.
 
-        response = self.get_data(get_url, params=params)
+        response = self.get_data(get_url, params=params, delay=False)
         if self.debug:
             # TODO: Remove next two lines?
             response_str = json.dumps(response, indent=4)
@@ -78,30 +201,51 @@ class Ccd3:
         return response
 
     def set_exposure_parameters(
-        self, params: dict, use_async=True
+        self, params: dict, use_async=True, force=False
     ) -> requests.Response:
         """
         Requests 'api/mset'
 
+        Only the parameters which differ from the last ones acknowledged by CCD3
+        are sent. If none have changed, no request is made at all.
+
         Parameters
         ----------
         params [dict]
             dictionary parameters to set.
+        use_async [bool]
+            add "async"=0 to the request, if not in params.
+        force [bool]
+            send all of params, even if CCD3 should already have them
+            (eg. if the CCD3 server was restarted).
+
+        Returns
+        -------
+        response [dict or None]
+            None if nothing was sent.
         """
 
         mset_url = f"{self.base_url}api/mset"
-        if use_async and "async" not in params:
-            params["async"] = 0
-
-        # Are we trying to set something unexpected?
-        unknown_params = {
-            key: val for key, val in params.items() if key not in EXPECTED_PARAMETERS
-        }
-        if len(unknown_params) > 0:
-            logger.warning(f"Unknown exposure parameters:\n {unknown_params}")
+        params, request_options = split_mset_params(params, use_async)
         self.current_exposure_parameters = params
 
-        response = self.get_data(mset_url, params=params)
+        changed_params = changed_parameters(
+            params, self.acknowledged_parameters, force=force
+        )
+        if len(changed_params) == 0:
+            logger.info("exposure parameters unchanged: skip mset")
+            return None
+        logger.info(f"mset {len(changed_params)}/{len(params)} changed parameters")
+
+        try:
+            response = self.get_data(
+                mset_url, params={**changed_params, **request_options}
+            )
+        except requests.exceptions.RequestException:
+            # Don't know which (if any) were set - send everything next time.
+            self.acknowledged_parameters = {}
+            raise
+        self.acknowledged_parameters.update(as_str(changed_params))
 
         if self.debug:
             # TODO: Remove next two lines?
@@ -144,12 +288,83 @@ class Ccd3:
 
         return self.get_data(stop_url, params)
 
-    def get_ccd_state(self) -> int:
+    def get_ccd_state(self) -> Ccd3State:
+        """
+        Returns:
+            ccd_state (Ccd3State): the raw state as an ``IntFlag``, with properties
+                ``is_exposing``, ``is_reading``, ``has_image``, ``has_error``...
+        """
 
         ccd_response = self.get_ccd_response()
 
-        ccd_state = ccd_response["state"]
+        ccd_state = Ccd3State(ccd_response["state"])
         if self.debug:
-            logger.info(f"CCD3 state: {ccd_state}")
+            logger.info(f"CCD3 state: {ccd_state:#x} ({ccd_state})")
 
         return ccd_state
+
+    def wait_for_exposure(
+        self,
+        exposure_time: float,
+        filename: str = None,
+        readout_time: float = None,
+        timeout: float = None,
+        min_delay: float = 0.2,
+        max_delay: float = 2.0,
+        on_readout=None,
+    ) -> ExposureResult:
+        """
+        Poll the CCD state until readout of the current exposure has finished
+        (see ``exposure.ExposureMonitor``). Call straight after ``start_exposure``.
+
+        Args:
+            exposure_time (float): The exposure time [sec].
+            filename (str, optional): recorded in the result.
+            readout_time (float, optional): The expected readout time [sec], used to
+                schedule the polls. Defaults to ``READOUT_TIME``.
+            timeout (float, optional): Defaults to exposure plus readout time,
+                plus ``EXPOSURE_TIMEOUT_MARGIN`` [sec].
+            min_delay (float, default=0.2): shortest sleep between polls [sec].
+            max_delay (float, default=2.0): longest sleep between polls [sec].
+            on_readout (Callable, optional): called (with no arguments) once, as
+                soon as readout is seen - eg. to prepare the next frame.
+
+        Returns:
+            result (ExposureResult)
+
+        Raises:
+            ExposureError: if CCD3 reports a device error (eg. exposure killed).
+            WaitForResultTimeoutError: if readout has not finished before timeout.
+        """
+        if readout_time is None:
+            readout_time = self.READOUT_TIME
+        if timeout is None:
+            timeout = exposure_time + readout_time + self.EXPOSURE_TIMEOUT_MARGIN
+
+        monitor = ExposureMonitor(exposure_time, filename=filename)
+
+        def readout_finished(state):
+            nonlocal on_readout
+            done = monitor.update(state)
+            if on_readout is not None and (done or monitor.t_readout is not None):
+                callback, on_readout = on_readout, None
+                callback()
+                if not done:  # Readout may have finished meanwhile.
+                    done = monitor.update(self.get_ccd_state())
+            return done
+
+        poll_until(
+            self.get_ccd_state,
+            readout_finished,
+            timeout=timeout,
+            predicted_duration=exposure_time + readout_time,
+            min_delay=min_delay,
+            max_delay=max_delay,
+            func_name="CCD3 state",
+        )
+        result = monitor.result()
+        logger.info(
+            f"exposure {filename} finished after {result.elapsed:.1f}s "
+            f"({result.n_polls} polls)"
+        )
+        return result
@@ -1,3 +1,5 @@
+from enum import IntFlag
+
 # ERROR states
 # mask used to communicate errors which occured on device
 DEVICE_ERROR_MASK = 0x00FF0000
@@ -127,3 +129,144 @@ CAM_MASK_FOCUSING = 0x0800
 
 CAM_NOFOCUSING = 0x0000
 CAM_FOCUSING = 0x0800
+
+
+# Decoded state
+
+_PHASES = {
+    CAM_NOEXPOSURE: "idle",
+    CAM_EXPOSING: "exposing",
+    CAM_READING: "reading",
+    CAM_EXPOSING | CAM_READING: "exposing+reading",
+}
+
+_ERRORS = {
+    DEVICE_ERROR_KILL: "exposure killed",
+    DEVICE_ERROR_HW: "hardware error",
+    DEVICE_NOT_READY: "device not ready",
+}
+
+_BOPS = {
+    BOP_EXPOSURE: "exposure blocked",
+    BOP_READOUT: "readout blocked",
+    BOP_TEL_MOVE: "telescope move blocked",
+    BOP_WILL_EXPOSE: "will expose",
+    BOP_TRIG_EXPOSE: "waiting for trigger",
+}
+
+
+def _describe_bits(table: dict, mask: int) -> dict:
+    """
+    Precompute the description of every combination of bits in ``mask``.
+    """
+    bits = [bit for bit in table if bit & mask]
+    lookup = {0: ""}
+    for ii in range(1, 2 ** len(bits)):
+        value = sum(bit for jj, bit in enumerate(bits) if ii >> jj & 1)
+        lookup[value] = ", ".join(table[bit] for bit in bits if value & bit)
+    return lookup
+
+
+# Block OPeration bits which hold something up (not BOP_WILL_EXPOSE).
+BLOCK_MASK = BOP_EXPOSURE | BOP_READOUT | BOP_TEL_MOVE | BOP_TRIG_EXPOSE
+
+ERROR_STR_LOOKUP = _describe_bits(_ERRORS, DEVICE_ERROR_MASK)
+BOP_STR_LOOKUP = _describe_bits(_BOPS, BOP_MASK)
+
+
+class Ccd3State(IntFlag):
+    """
+    The state returned by CCD3, as flags. It is still an ``int``, so compares
+    equal to the raw state, but the fields can be read without masking by hand:
+
+    >>> state = Ccd3State(0x04000001)
+    >>> state.is_exposing, state.is_reading, state.has_error
+    (True, False, False)
+    >>> print(state)
+    exposing [telescope move blocked]
+
+    Each distinct value is only decoded once (``enum`` caches it), so building
+    one on every poll is cheap.
+    """
+
+    EXPOSING = CAM_EXPOSING
+    READING = CAM_READING
+    FRAME_TRANSFER = CAM_FT
+    HAS_IMAGE = CAM_HAS_IMAGE
+    EXPOSING_NOIM = CAM_EXPOSING_NOIM
+    FOCUSING = CAM_FOCUSING
+
+    SC_CURR = DEVICE_SC_CURR
+    NEED_RELOAD = DEVICE_NEED_RELOAD
+    STARTUP = DEVICE_STARTUP
+    SHUTDOWN = DEVICE_SHUTDOWN
+
+    ERROR_KILL = DEVICE_ERROR_KILL
+    ERROR_HW = DEVICE_ERROR_HW
+    NOT_READY = DEVICE_NOT_READY
+
+    BLOCK_EXPOSURE = BOP_EXPOSURE
+    BLOCK_READOUT = BOP_READOUT
+    BLOCK_TEL_MOVE = BOP_TEL_MOVE
+    WILL_EXPOSE = BOP_WILL_EXPOSE
+    TRIG_EXPOSE = BOP_TRIG_EXPOSE
+
+    STOP = STOP_EVERYTHING
+    BAD_WEATHER = BAD_WEATHER
+
+    @property
+    def is_exposing(self) -> bool:
+        return bool(self._value_ & CAM_EXPOSING)
+
+    @property
+    def is_reading(self) -> bool:
+        return bool(self._value_ & CAM_READING)
+
+    @property
+    def is_working(self) -> bool:
+        return bool(self._value_ & CAM_WORKING)
+
+    @property
+    def is_waiting(self) -> bool:
+        """About to expose (``BOP_WILL_EXPOSE``)."""
+        return bool(self._value_ & BOP_WILL_EXPOSE)
+
+    @property
+    def blocked(self) -> "Ccd3State":
+        """
+        The Block OPeration bits which are set (eg. ``BLOCK_READOUT``: readout
+        is blocked, so it has not started). Falsy if nothing is blocked.
+        """
+        return Ccd3State(self._value_ & BLOCK_MASK)
+
+    @property
+    def has_image(self) -> bool:
+        return bool(self._value_ & CAM_HAS_IMAGE)
+
+    @property
+    def has_error(self) -> bool:
+        return bool(self._value_ & DEVICE_ERROR_MASK)
+
+    @property
+    def phase(self) -> str:
+        return _PHASES[self._value_ & CAM_WORKING]
+
+    @property
+    def error_str(self) -> str:
+        error = self._value_ & DEVICE_ERROR_MASK
+        return ERROR_STR_LOOKUP.get(error, f"unknown error {error:#x}")
+
+    @property
+    def block_str(self) -> str:
+        return BOP_STR_LOOKUP.get(self._value_ & BOP_MASK, "")
+
+    def __str__(self) -> str:
+        parts = [self.phase]
+        if self.has_image:
+            parts.append("has image")
+        description = ", ".join(parts)
+        if self.block_str:
+            description = f"{description} [{self.block_str}]"
+        if self.has_error:
+            description = f"{description} ERROR: {self.error_str}"
+        return description
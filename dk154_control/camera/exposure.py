@@ -0,0 +1,146 @@
+"""
+Follow a CCD3 exposure by its state, rather than sleeping for a fixed time.
+
+The state returned by ``Ccd3.get_ccd_state`` is a bitmask, decoded by
+``ccd3_status_codes.Ccd3State``: whether the camera is exposing, reading out,
+has an image, or has an error.
+"""
+
+import time
+from collections import namedtuple
+from logging import getLogger
+
+from dk154_control.camera.ccd3_status_codes import Ccd3State
+
+logger = getLogger(__name__.split(".")[-1])
+
+
+class ExposureError(Exception):
+    pass
+
+
+ExposureResult = namedtuple(
+    "ExposureResult",
+    (
+        "filename",
+        "exposure_time",
+        "state",
+        "elapsed",
+        "exposure_elapsed",
+        "readout_elapsed",
+        "n_polls",
+        "path",
+        "stats",
+    ),
+    defaults=(None, None),
+)
+ExposureResult.__doc__ = """
+A finished exposure, with timing metadata.
+
+Attributes:
+    filename (str or None): The file the image is saved to.
+    exposure_time (float): The requested exposure time [sec].
+    state (Ccd3State): The last CCD3 state (``has_image`` should be True).
+    elapsed (float): Time from start of wait until readout finished [sec].
+    exposure_elapsed (float or None): Time from start of wait until readout
+        was first seen [sec]. None if readout was never seen.
+    readout_elapsed (float or None): How long readout was seen for [sec].
+    n_polls (int): How many times the state was read.
+    path (Path or None): Where the file was found (see ``OutputWatcher``).
+    stats (QuickLookStats or None): Quick-look statistics of the frame
+        (see ``quick_look``).
+"""
+
+
+class ExposureMonitor:
+    """
+    Track the phases of one exposure (waiting, exposing, reading out) from the
+    CCD3 states, read after the exposure was started.
+
+    The exposure is finished once the camera has been seen exposing or reading,
+    and is now doing neither. In case both phases are missed between two polls
+    (eg. a bias), a state with ``CAM_HAS_IMAGE`` is also accepted once
+    ``exposure_time + start_timeout`` has passed.
+
+    Args:
+        exposure_time (float): The requested exposure time [sec].
+        filename (str, optional): Only used in the result and log messages.
+        start_timeout (float, default=10.0): Raise ``ExposureError`` if the
+            exposure has not been seen after ``exposure_time + start_timeout``.
+    """
+
+    def __init__(self, exposure_time: float, filename=None, start_timeout=10.0):
+        self.exposure_time = exposure_time
+        self.filename = filename
+        self.start_timeout = start_timeout
+
+        self.t_start = time.monotonic()
+        self.started = False
+        self.t_readout = None
+        self.t_done = None
+        self.n_polls = 0
+        self.state = None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.t_start
+
+    def update(self, state: Ccd3State) -> bool:
+        """
+        Add a new state.
+
+        Returns:
+            done (bool): True if readout has finished.
+
+        Raises:
+            ExposureError: if the state has an error (eg. exposure killed), or
+                the exposure never started.
+        """
+        state = Ccd3State(state)
+        self.n_polls = self.n_polls + 1
+        if state.blocked and (
+            self.state is None or state.blocked != self.state.blocked
+        ):
+            logger.info(f"CCD3 {state.blocked.block_str} at {self.elapsed():.1f}s")
+        self.state = state
+        elapsed = self.elapsed()
+
+        if state.has_error:
+            msg = f"CCD3 state {state:#010x} at {elapsed:.1f}s: {state.error_str}"
+            raise ExposureError(msg)
+
+        if state.is_exposing or state.is_reading:
+            self.started = True
+        if state.is_reading and self.t_readout is None:
+            logger.info(f"CCD3 reading out after {elapsed:.1f}s")
+            self.t_readout = time.monotonic()
+        if state.is_exposing or state.is_reading or state.is_waiting:
+            return False
+
+        if not self.started:
+            if elapsed < self.exposure_time + self.start_timeout:
+                return False
+            if not state.has_image:
+                msg = f"CCD3 exposure not seen after {elapsed:.1f}s ({state})"
+                raise ExposureError(msg)
+            logger.warning("CCD3 has image, but exposure/readout were not seen")
+
+        self.t_done = time.monotonic()
+        if not state.has_image:
+            logger.warning(f"CCD3 finished, but no image ({state})")
+        return True
+
+    def result(self) -> ExposureResult:
+        t_done = self.t_done or time.monotonic()
+        exposure_elapsed, readout_elapsed = None, None
+        if self.t_readout is not None:
+            exposure_elapsed = self.t_readout - self.t_start
+            readout_elapsed = t_done - self.t_readout
+        return ExposureResult(
+            self.filename,
+            self.exposure_time,
+            self.state,
+            t_done - self.t_start,
+            exposure_elapsed,
+            readout_elapsed,
+            self.n_polls,
+        )
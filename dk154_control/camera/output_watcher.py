@@ -0,0 +1,332 @@
+"""
+Watch the (mounted) CCD3 data directory, to confirm each frame has been written.
+
+On Linux, inotify (via ``ctypes``) reports files as soon as they are closed.
+Pending files are also checked with ``os.stat`` every ``poll_interval``, as inotify
+does not see files written by another machine onto a network mount. Without
+inotify (eg. not Linux) only the polling is used.
+
+A file is only reported once it is a complete FITS file (see ``fits_is_complete``).
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from concurrent import futures
+from logging import getLogger
+from pathlib import Path
+
+logger = getLogger(__name__.split(".")[-1])
+
+FITS_BLOCK = 2880
+FITS_CARD = 80
+
+# inotify constants, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; then name.
+
+
+def fits_is_complete(path) -> bool:
+    """
+    Check that a FITS file has been fully written: the primary header has
+    its END card, and the file is at least as long as header plus data,
+    in whole 2880-byte blocks.
+    """
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0 or size % FITS_BLOCK != 0:
+                return False
+            header = {}
+            n_header_blocks = 0
+            end_found = False
+            while not end_found:
+                block = f.read(FITS_BLOCK)
+                if len(block) < FITS_BLOCK:
+                    return False
+                n_header_blocks = n_header_blocks + 1
+                for ii in range(0, FITS_BLOCK, FITS_CARD):
+                    card = block[ii : ii + FITS_CARD].decode("ascii", "replace")
+                    keyword = card[:8].strip()
+                    if keyword == "END":
+                        end_found = True
+                        break
+                    if card[8:10] == "= ":
+                        header[keyword] = card[10:].split("/")[0].strip()
+    except OSError:
+        return False
+
+    try:
+        bitpix = abs(int(header["BITPIX"]))
+        naxis = int(header["NAXIS"])
+        n_pixels = 1 if naxis > 0 else 0
+        for ii in range(1, naxis + 1):
+            n_pixels = n_pixels * int(header[f"NAXIS{ii}"])
+    except (KeyError, ValueError):
+        return False
+    data_bytes = n_pixels * bitpix // 8
+    n_data_blocks = -(-data_bytes // FITS_BLOCK)  # ceil
+    return size >= (n_header_blocks + n_data_blocks) * FITS_BLOCK
+
+
+class Inotify:
+    """
+    Minimal ``ctypes`` wrapper of the Linux inotify API.
+
+    Raises:
+        OSError: if inotify is not available.
+    """
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.watches = {}  # {watch descriptor: directory}
+
+    def add_watch(self, directory: Path, mask: int) -> int:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(directory))
+        self.watches[wd] = Path(directory)
+        return wd
+
+    def read_events(self, timeout: float) -> list:
+        """
+        Returns:
+            events (list of tuple): (directory, mask, name) for each event.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset = offset + INOTIFY_EVENT.size
+            name = buffer[offset : offset + length].rstrip(b"\0")
+            offset = offset + length
+            directory = self.watches.get(wd, None)
+            if directory is not None:
+                events.append((directory, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class OutputWatcher:
+    """
+    Resolve a ``Future`` for each expected frame, once it is fully written.
+
+    Frames are looked for in ``data_dir``, and in its ``YYYYMMDD`` subdirectories
+    for today and yesterday (UT), where CCD3 usually saves them.
+
+    Example:
+        >>> from dk154_control.camera.output_watcher import OutputWatcher
+        >>> with OutputWatcher("/mnt/lin1/data") as watcher:
+        ...     future = watcher.watch("M83_001.fits")
+        ...     # ... start the exposure ...
+        ...     path = future.result(timeout=120.0)
+
+    In ``asyncio`` code, use ``await asyncio.wrap_future(future)``.
+
+    Args:
+        data_dir (Path): the (mounted) CCD3 data directory.
+        poll_interval (float, default=1.0): how often to stat pending files [sec].
+        use_inotify (bool, default=True): use inotify, if available.
+    """
+
+    def __init__(self, data_dir, poll_interval: float = 1.0, use_inotify=True):
+        self.data_dir = Path(data_dir)
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+
+        self.pending = {}  # {filename: (Future, time watched, {old path: mtime})}
+        self.callbacks = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.inotify = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        if self.use_inotify:
+            try:
+                self.inotify = Inotify()
+                self.add_watches()
+            except OSError as e:
+                logger.warning(f"inotify unavailable ({e}): poll only")
+                if self.inotify is not None:
+                    self.inotify.close()
+                self.inotify = None
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self.run, name="OutputWatcher", daemon=True
+        )
+        self.thread.start()
+        logger.info(f"watching {self.data_dir} (inotify={self.inotify is not None})")
+
+    def stop(self, timeout: float = 5.0):
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join(timeout=timeout)
+        self.thread = None
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def date_dirs(self) -> list:
+        now = time.time()
+        dates = {time.strftime("%Y%m%d", time.gmtime(now - dt)) for dt in (0, 86400)}
+        return [self.data_dir / date for date in sorted(dates)]
+
+    def add_watches(self):
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        watched = set(self.inotify.watches.values())
+        for directory in [self.data_dir] + self.date_dirs():
+            if directory.is_dir() and directory not in watched:
+                self.inotify.add_watch(directory, mask)
+
+    def add_callback(self, func):
+        """
+        Call ``func(path)`` (in the watcher thread) for every completed frame,
+        eg. to start quick-look processing.
+        """
+        self.callbacks.append(func)
+
+    def watch(self, filename: str) -> futures.Future:
+        """
+        Start watching for ``filename``. Call before starting the exposure.
+        A file which is already there (eg. from an earlier night) is ignored,
+        unless it is written again. Its mtime is compared with the one seen
+        now, not with the local clock, as the data directory is usually on
+        another machine.
+
+        Returns:
+            future (concurrent.futures.Future): resolves to the ``Path`` of the
+                complete file.
+        """
+        filename = Path(filename).name
+        existing = {}
+        for directory in [self.data_dir] + self.date_dirs():
+            path = directory / filename
+            try:
+                existing[path] = path.stat().st_mtime
+            except OSError:
+                continue
+        future = futures.Future()
+        with self.lock:
+            self.pending[filename] = (future, time.time(), existing)
+        return future
+
+    def unwatch(self, filename: str):
+        """
+        Stop watching for ``filename`` (eg. after giving up waiting for it),
+        and cancel its future.
+        """
+        filename = Path(filename).name
+        with self.lock:
+            future, t_watch, existing = self.pending.pop(filename, (None, None, None))
+        if future is not None:
+            future.cancel()
+
+    def wait_for(self, filename: str, timeout: float = None) -> Path:
+        """
+        Watch for ``filename``, and block until it is complete.
+
+        Raises:
+            TimeoutError: if not complete after ``timeout`` [sec].
+        """
+        future = self.watch(filename)
+        try:
+            return future.result(timeout=timeout)
+        except futures.TimeoutError:
+            self.unwatch(filename)
+            raise
+
+    def check(self, filename: str, directories=None) -> bool:
+        """
+        Resolve the future for ``filename`` if the file is complete.
+        """
+        with self.lock:
+            future, t_watch, existing = self.pending.get(filename, (None, None, None))
+        if future is None:
+            return False
+        for directory in directories or [self.data_dir] + self.date_dirs():
+            path = directory / filename
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                continue
+            if existing.get(path) == mtime:
+                continue  # An old file with the same name, not rewritten (yet).
+            if fits_is_complete(path):
+                self.resolve(filename, path)
+                return True
+        return False
+
+    def resolve(self, filename: str, path: Path):
+        with self.lock:
+            future, t_watch, existing = self.pending.pop(filename, (None, None, None))
+        if future is None:
+            return
+        logger.info(f"{filename} written after {time.time() - t_watch:.1f}s")
+        future.set_result(path)
+        for func in self.callbacks:
+            try:
+                func(path)
+            except Exception as e:
+                logger.error(f"output callback {func} failed: {e!r}")
+
+    def run(self):
+        t_poll = 0.0
+        while not self.stop_event.is_set():
+            if self.inotify is not None:
+                timeout = max(t_poll + self.poll_interval - time.monotonic(), 0.0)
+                for directory, mask, name in self.inotify.read_events(timeout):
+                    if mask & IN_ISDIR:
+                        if mask & IN_CREATE:
+                            self.add_watches()  # New night directory.
+                    elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                        self.check(name, directories=[directory])
+            else:
+                self.stop_event.wait(self.poll_interval)
+
+            if time.monotonic() - t_poll >= self.poll_interval:
+                t_poll = time.monotonic()
+                if self.inotify is not None:
+                    self.add_watches()
+                with self.lock:
+                    filenames = list(self.pending)
+                for filename in filenames:
+                    self.check(filename)
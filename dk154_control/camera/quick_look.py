@@ -0,0 +1,204 @@
+"""
+Quick-look statistics of a new frame: is it saturated, empty or trailed?
+
+The frame is opened memory-mapped, and only a strided subsample is read.
+Scaling (BZERO/BSCALE) is applied to the subsample only: letting astropy scale
+the data would make a full-frame copy.
+"""
+
+import time
+from collections import namedtuple
+from logging import getLogger
+
+import numpy as np
+from astropy.io import fits
+
+logger = getLogger(__name__.split(".")[-1])
+
+QuickLookStats = namedtuple(
+    "QuickLookStats",
+    (
+        "median",
+        "p01",
+        "p99",
+        "noise",
+        "saturated_fraction",
+        "fwhm",
+        "elongation",
+        "n_sources",
+        "elapsed",
+    ),
+)
+QuickLookStats.__doc__ = """
+Robust statistics from a subsample of a frame.
+
+Attributes:
+    median (float): Median pixel value [ADU].
+    p01 (float): 1st percentile [ADU].
+    p99 (float): 99th percentile [ADU].
+    noise (float): Robust standard deviation (from the MAD) [ADU].
+    saturated_fraction (float): Fraction of sampled pixels at saturation.
+    fwhm (float or None): Median FWHM of the brightest unsaturated sources [pix].
+        None if no sources were found.
+    elongation (float or None): Median major/minor axis ratio of the same
+        sources. Much more than ~1.5 suggests trailing.
+    n_sources (int): How many sources were used for ``fwhm``.
+    elapsed (float): Time taken [sec].
+"""
+
+
+def saturation_level(header) -> float:
+    """
+    ``SATURATE`` from the header, or else the largest value the data type holds.
+    """
+    if "SATURATE" in header:
+        return float(header["SATURATE"])
+    bitpix = header["BITPIX"]
+    if bitpix < 0:
+        return np.inf
+    bzero = header.get("BZERO", 0.0)
+    bscale = header.get("BSCALE", 1.0)
+    return (2 ** (bitpix - 1) - 1) * bscale + bzero
+
+
+def source_shape(cutout: np.ndarray, background: float):
+    """
+    FWHM (from the area above half maximum) and elongation (from second moments
+    of that area) of the source at the peak of ``cutout``.
+
+    Returns:
+        fwhm (float or None), elongation (float or None): None if the source is
+            not contained in the cutout.
+    """
+    cutout = cutout - background
+    peak = cutout.max()
+    if peak <= 0.0:
+        return None, None
+    above = cutout > 0.5 * peak
+    if above[0, :].any() or above[-1, :].any() or above[:, 0].any():
+        return None, None  # Extended, or not centred.
+    if above[:, -1].any():
+        return None, None
+    fwhm = 2.0 * np.sqrt(above.sum() / np.pi)
+
+    yy, xx = np.nonzero(above)
+    weights = cutout[yy, xx]
+    xc = np.average(xx, weights=weights)
+    yc = np.average(yy, weights=weights)
+    cxx = np.average((xx - xc) ** 2, weights=weights)
+    cyy = np.average((yy - yc) ** 2, weights=weights)
+    cxy = np.average((xx - xc) * (yy - yc), weights=weights)
+    eigenvalues = np.linalg.eigvalsh([[cxx, cxy], [cxy, cyy]])
+    if eigenvalues[0] <= 0.0:
+        return fwhm, None
+    return fwhm, float(np.sqrt(eigenvalues[1] / eigenvalues[0]))
+
+
+def quick_look(
+    path,
+    step: int = 4,
+    n_sources: int = 5,
+    detect_sigma: float = 20.0,
+    box: int = 31,
+    hdu: int = 0,
+) -> QuickLookStats:
+    """
+    Compute ``QuickLookStats`` from every ``step``-th row and column of a frame.
+
+    Sources are found in every ``step``-th (full) row, so that stars are not
+    missed between sampled columns. The FWHM of each is then measured in a
+    full-resolution ``box`` x ``box`` cutout.
+
+    Args:
+        path (Path): the FITS file.
+        step (int, default=4): subsample stride [pix].
+        n_sources (int, default=5): how many of the brightest sources to measure.
+        detect_sigma (float, default=20.0): sources must be this many times
+            the noise above the median.
+        box (int, default=31): cutout size for measuring sources [pix].
+        hdu (int, default=0): which HDU holds the image.
+
+    Returns:
+        stats (QuickLookStats)
+    """
+    t_start = time.perf_counter()
+    with fits.open(path, memmap=True, do_not_scale_image_data=True) as hdul:
+        header = hdul[hdu].header
+        raw = hdul[hdu].data
+        if raw is None or raw.ndim != 2:
+            raise ValueError(f"{path} HDU {hdu} is not a 2D image")
+        bzero = header.get("BZERO", 0.0)
+        bscale = header.get("BSCALE", 1.0)
+        saturation = saturation_level(header)
+
+        def scaled(data):
+            return np.asarray(data, dtype=np.float32) * bscale + bzero
+
+        rows = scaled(raw[::step])
+        sample = rows[:, ::step]
+        p01, median, p99 = np.percentile(sample, (1.0, 50.0, 99.0))
+        noise = 1.4826 * np.median(np.abs(sample - median))
+        saturated_fraction = np.count_nonzero(sample >= saturation) / sample.size
+
+        # Brightest unsaturated peaks, blanking out each one's neighbourhood.
+        half = box // 2
+        candidates = np.where(rows >= saturation, -np.inf, rows)
+        threshold = median + detect_sigma * max(noise, 1.0)
+        shapes = []
+        for ii in range(4 * n_sources):
+            if len(shapes) >= n_sources:
+                break
+            row, col = np.unravel_index(np.argmax(candidates), candidates.shape)
+            if candidates[row, col] < threshold:
+                break
+            r_lo, r_hi = max(row - half // step, 0), row + half // step + 1
+            candidates[r_lo:r_hi, max(col - half, 0) : col + half + 1] = -np.inf
+
+            y = row * step
+            y_lo, x_lo = y - half, col - half
+            if y_lo < 0 or x_lo < 0:
+                continue
+            cutout = scaled(raw[y_lo : y_lo + box, x_lo : x_lo + box])
+            if cutout.shape != (box, box) or cutout.max() >= saturation:
+                continue
+            # Re-centre on the true peak, which may be between sampled rows.
+            dy, dx = np.unravel_index(np.argmax(cutout), cutout.shape)
+            y_lo, x_lo = y_lo + dy - half, x_lo + dx - half
+            if y_lo < 0 or x_lo < 0:
+                continue
+            cutout = scaled(raw[y_lo : y_lo + box, x_lo : x_lo + box])
+            if cutout.shape != (box, box) or cutout.max() >= saturation:
+                continue
+            fwhm, elongation = source_shape(cutout, median)
+            if fwhm is not None and fwhm > 1.5:  # Smaller is a cosmic/hot pixel.
+                shapes.append((fwhm, elongation))
+
+    fwhm, elongation = None, None
+    if shapes:
+        fwhm = float(np.median([s[0] for s in shapes]))
+        elongations = [s[1] for s in shapes if s[1] is not None]
+        if elongations:
+            elongation = float(np.median(elongations))
+    return QuickLookStats(
+        float(median),
+        float(p01),
+        float(p99),
+        float(noise),
+        float(saturated_fraction),
+        fwhm,
+        elongation,
+        len(shapes),
+        time.perf_counter() - t_start,
+    )
+
+
+def format_stats(stats: QuickLookStats) -> str:
+    fwhm = "none" if stats.fwhm is None else f"{stats.fwhm:.1f}pix"
+    msg = (
+        f"median {stats.median:.0f} (1-99% {stats.p01:.0f}-{stats.p99:.0f}), "
+        f"noise {stats.noise:.1f}, saturated {100.0 * stats.saturated_fraction:.3f}%, "
+        f"FWHM {fwhm} ({stats.n_sources} sources)"
+    )
+    if stats.elongation is not None:
+        msg = msg + f", elongation {stats.elongation:.2f}"
+    return msg
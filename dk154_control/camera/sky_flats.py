@@ -0,0 +1,243 @@
+"""
+Choose exposure times for twilight sky flats.
+
+In twilight the sky brightness changes roughly exponentially with time, so the
+count rate of each flat (from its quick-look median) is fitted with
+``ln(rate) = a + k * t``. The next exposure time is chosen so that the counts,
+integrated over the changing sky, reach the target level.
+
+Until there are two flats, the trend ``k`` comes from the twilight sensor
+(``Ascol.metw``). If ``rate_per_lux`` is known (eg. from a previous night, see
+``SkyFlatPlanner.fitted_rate_per_lux``), the sensor also sets the first
+exposure time.
+"""
+
+import math
+import time
+from collections import namedtuple
+from logging import getLogger
+
+import numpy as np
+
+logger = getLogger(__name__.split(".")[-1])
+
+SkyFlatRecord = namedtuple(
+    "SkyFlatRecord",
+    ("timestamp", "exposure_time", "median", "rate", "lux", "saturated"),
+)
+SkyFlatRecord.__doc__ = """
+One sky flat, as seen by ``SkyFlatPlanner``.
+
+Attributes:
+    timestamp (float): Middle of the exposure (unix time) [sec].
+    exposure_time (float): [sec].
+    median (float): Median counts [ADU].
+    rate (float): Sky count rate, above bias [ADU/sec].
+    lux (float or None): Twilight sensor reading before the exposure [Lux].
+    saturated (bool): If True, ``rate`` is only a lower limit.
+"""
+
+
+class SkyFlatPlanner:
+    """
+    Predict sky flat exposure times from previous flats and the twilight sensor.
+
+    Example:
+        >>> planner = SkyFlatPlanner(target_level=30000.0)
+        >>> planner.add_lux(1200.0)
+        >>> exposure_time = planner.next_exposure_time()
+        >>> # ... take the flat, starting at t_start ...
+        >>> planner.add_frame(exposure_time, stats.median, t_start, lux=1200.0)
+
+    Args:
+        target_level (float, default=30000.0): median counts to aim for [ADU].
+        min_level (float, default=15000.0): flats below this are not kept.
+        max_level (float, default=45000.0): flats above this are not kept.
+        bias_level (float, default=0.0): subtracted from medians [ADU].
+        min_exposure_time (float, default=1.0): shorter exposures show the
+            shutter pattern [sec].
+        max_exposure_time (float, default=60.0): [sec]
+        first_exposure_time (float, default=5.0): used if nothing better is known.
+        rate_per_lux (float, optional): sky count rate per twilight sensor
+            reading [ADU/sec/Lux], for this filter/grism.
+    """
+
+    N_FIT = 5  # Fit the trend to the most recent flats only.
+    MIN_LUX_BASELINE = 10.0  # Sensor readings must span this long for a trend [sec].
+    RECHECK_INTERVAL = 15.0  # Wait this long if the trend is not known yet [sec].
+
+    def __init__(
+        self,
+        target_level: float = 30000.0,
+        min_level: float = 15000.0,
+        max_level: float = 45000.0,
+        bias_level: float = 0.0,
+        min_exposure_time: float = 1.0,
+        max_exposure_time: float = 60.0,
+        first_exposure_time: float = 5.0,
+        rate_per_lux: float = None,
+    ):
+        self.target_level = target_level
+        self.min_level = min_level
+        self.max_level = max_level
+        self.bias_level = bias_level
+        self.min_exposure_time = min_exposure_time
+        self.max_exposure_time = max_exposure_time
+        self.first_exposure_time = first_exposure_time
+        self.rate_per_lux = rate_per_lux
+
+        self.records = []
+        self.lux_readings = []  # [(timestamp, lux)]
+
+    def add_lux(self, lux: float, timestamp: float = None):
+        """
+        Add a twilight sensor reading. Invalid readings (None, <= 0) are ignored.
+        """
+        if lux is None or lux <= 0.0:
+            return
+        self.lux_readings.append((timestamp or time.time(), float(lux)))
+
+    def add_frame(
+        self,
+        exposure_time: float,
+        median: float,
+        t_start: float,
+        lux: float = None,
+        saturated=False,
+    ) -> SkyFlatRecord:
+        """
+        Add a finished flat, started at ``t_start`` (unix time).
+        """
+        rate = max(median - self.bias_level, 1.0) / exposure_time
+        record = SkyFlatRecord(
+            t_start + 0.5 * exposure_time, exposure_time, median, rate, lux, saturated
+        )
+        self.records.append(record)
+        return record
+
+    def is_good(self, median: float) -> bool:
+        return self.min_level <= median <= self.max_level
+
+    def usable_records(self) -> list:
+        return [rec for rec in self.records if not rec.saturated]
+
+    def trend(self):
+        """
+        Rate of change of ln(sky brightness) [1/sec]: negative in the evening.
+
+        Returns:
+            k (float or None): None if there's not enough data yet.
+        """
+        records = self.usable_records()[-self.N_FIT :]
+        if len(records) >= 2:
+            t = np.array([rec.timestamp for rec in records])
+            if np.ptp(t) > 0.0:
+                ln_rate = np.log([rec.rate for rec in records])
+                return float(np.polyfit(t - t[0], ln_rate, 1)[0])
+        readings = self.lux_readings[-self.N_FIT :]
+        if len(readings) >= 2:
+            t, lux = np.array(readings).T
+            if np.ptp(t) >= self.MIN_LUX_BASELINE:
+                return float(np.polyfit(t - t[0], np.log(lux), 1)[0])
+        return None
+
+    def rate_at(self, timestamp: float):
+        """
+        Predicted sky count rate at ``timestamp`` [ADU/sec].
+
+        Returns:
+            rate (float or None): None if there are no usable flats, and no
+                ``rate_per_lux``.
+        """
+        k = self.trend() or 0.0
+        records = self.usable_records()
+        if len(records) > 0:
+            latest = records[-1]
+            return latest.rate * math.exp(k * (timestamp - latest.timestamp))
+        if self.rate_per_lux is not None and len(self.lux_readings) > 0:
+            t_lux, lux = self.lux_readings[-1]
+            return self.rate_per_lux * lux * math.exp(k * (timestamp - t_lux))
+        return None
+
+    def next_exposure_time(self, t_start: float = None) -> float:
+        """
+        Exposure time to reach ``target_level``, for an exposure starting at
+        ``t_start`` (default now). Not clipped to the allowed range
+        (see ``check``).
+
+        Returns:
+            exposure_time (float): ``inf`` if the sky is fading too fast to ever
+                reach the target.
+        """
+        t_start = t_start or time.time()
+        rate = self.rate_at(t_start)
+        if rate is None:
+            saturated = [rec.exposure_time for rec in self.records if rec.saturated]
+            if len(saturated) > 0:
+                return min(saturated) / 4.0
+            return self.first_exposure_time
+
+        counts = self.target_level - self.bias_level
+        k = self.trend() or 0.0
+        if abs(k) * counts / rate < 1e-6:
+            return counts / rate  # Constant sky.
+        # Solve counts = rate * (exp(k * T) - 1) / k for T.
+        arg = 1.0 + k * counts / rate
+        if arg <= 0.0:
+            return math.inf
+        return math.log(arg) / k
+
+    def check(self, exposure_time: float) -> str:
+        """
+        Returns:
+            status (str): "ok", "too bright" or "too dark".
+        """
+        if exposure_time < self.min_exposure_time:
+            return "too bright"
+        if exposure_time > self.max_exposure_time:
+            return "too dark"
+        return "ok"
+
+    def time_until_ok(self, exposure_time: float):
+        """
+        How long until the sky has changed enough that a "too bright" (evening)
+        or "too dark" (morning) exposure time is within the allowed range.
+        If the trend is not known yet (eg. only one sensor reading), wait
+        ``RECHECK_INTERVAL`` and check again.
+
+        Returns:
+            wait (float or None): [sec]. None if the sky is changing the wrong way,
+                so waiting will not help.
+        """
+        if exposure_time < self.min_exposure_time:
+            factor = (
+                self.min_exposure_time / exposure_time
+            )  # Need sky this much fainter.
+        elif exposure_time > self.max_exposure_time:
+            factor = self.max_exposure_time / exposure_time
+        else:
+            return 0.0
+        k = self.trend()
+        if k is None:
+            return self.RECHECK_INTERVAL
+        if k == 0.0 or not math.isfinite(exposure_time):
+            return None
+        wait = -math.log(factor) / k
+        return wait if wait > 0.0 else None
+
+    def fitted_rate_per_lux(self):
+        """
+        Median sky count rate per twilight sensor reading, from the flats so far.
+        Pass as ``rate_per_lux`` next time, for the same filter/grism.
+
+        Returns:
+            rate_per_lux (float or None)
+        """
+        ratios = [
+            rec.rate / rec.lux
+            for rec in self.usable_records()
+            if rec.lux is not None and rec.lux > 0.0
+        ]
+        if len(ratios) == 0:
+            return None
+        return float(np.median(ratios))
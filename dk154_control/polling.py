@@ -0,0 +1,206 @@
+"""
+Adaptive polling: wait for a command to return an expected result.
+
+Poll often close to when the result is expected (eg. predicted end of a slew),
+and back off while far from it. Used by ``Ascol.wait_for_result`` and friends.
+"""
+
+import asyncio
+import random
+import time
+from collections import namedtuple
+from logging import getLogger
+
+logger = getLogger(__name__.split(".")[-1])
+
+
+class WaitForResultTimeoutError(Exception):
+    pass
+
+
+WaitResult = namedtuple(
+    "WaitResult", ("result", "elapsed", "n_polls", "predicted_duration")
+)
+WaitResult.__doc__ = """
+The matching result of a wait, with timing metadata.
+
+Attributes:
+    result: The result of the polled function which matched.
+    elapsed (float): Time from start of wait until the match was seen [sec].
+    n_polls (int): How many times the function was called.
+    predicted_duration (float or None): The duration predicted before the wait [sec].
+"""
+
+
+class PollSchedule:
+    """
+    Work out how long to sleep between polls.
+
+    With a ``predicted_duration``, the delay halves the time remaining until the
+    predicted completion, so polls bunch up close to it. Once past the prediction
+    (or without one), the delay grows geometrically from ``min_delay``.
+    Delays are always between ``min_delay`` and ``max_delay``.
+
+    Args:
+        predicted_duration (float, optional): expected time until completion [sec].
+        min_delay (float, default=0.2): shortest sleep between polls [sec].
+        max_delay (float, default=5.0): longest sleep between polls [sec].
+        backoff (float, default=1.5): growth factor of the delay when late.
+        timeout (float, optional): never sleep past this time after start [sec].
+    """
+
+    def __init__(
+        self,
+        predicted_duration: float = None,
+        min_delay: float = 0.2,
+        max_delay: float = 5.0,
+        backoff: float = 1.5,
+        timeout: float = None,
+    ):
+        self.predicted_duration = predicted_duration
+        self.min_delay = min_delay
+        self.max_delay = max(max_delay, min_delay)
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.t_start = time.monotonic()
+        self.n_late = 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.t_start
+
+    def next_delay(self) -> float:
+        elapsed = self.elapsed()
+
+        remaining = None
+        if self.predicted_duration is not None:
+            remaining = self.predicted_duration - elapsed
+
+        if remaining is not None and remaining > self.min_delay:
+            delay = 0.5 * remaining
+        else:
+            delay = self.min_delay * self.backoff**self.n_late
+            self.n_late = self.n_late + 1
+
+        delay = min(max(delay, self.min_delay), self.max_delay)
+        if self.timeout is not None:
+            delay = max(min(delay, self.timeout - elapsed), 0.0)
+        return delay
+
+
+def backoff_delay(
+    attempt: int, base_delay: float = 0.05, max_delay: float = 5.0
+) -> float:
+    """
+    Sleep before retry number ``attempt`` (from 0): exponential backoff with
+    'full jitter' - uniform between 0 and ``base_delay * 2**attempt``,
+    so many clients retrying at once don't all hit the server together.
+    """
+    return random.uniform(0.0, min(base_delay * 2.0**attempt, max_delay))
+
+
+def result_matches(result, expected_result) -> bool:
+    """
+    ``expected_result`` can be a single value, a list/tuple of allowed values,
+    or a callable which returns True for a matching result.
+    """
+    if callable(expected_result):
+        return expected_result(result)
+    return result in expected_result
+
+
+def _prepare(func, expected_result, func_name):
+    if isinstance(expected_result, str):
+        expected_result = [expected_result]  # now can always check result 'in'
+    func_name = func_name or getattr(func, "__name__", "func").upper()
+    if callable(expected_result):
+        res_str = getattr(expected_result, "__name__", "condition")
+    else:
+        res_str = "/".join(str(r) for r in expected_result)
+    logger.info(f"{func_name} wait for result: '{res_str}'")
+    return expected_result, func_name
+
+
+def poll_until(
+    func,
+    expected_result,
+    timeout: float = 180.0,
+    predicted_duration: float = None,
+    min_delay: float = 0.2,
+    max_delay: float = 5.0,
+    func_name: str = None,
+) -> WaitResult:
+    """
+    Call ``func()`` until its result matches ``expected_result``,
+    sleeping between calls as given by a ``PollSchedule``.
+
+    Args:
+        func (Callable): called with no arguments.
+        expected_result (str, tuple of str, or Callable): see ``result_matches``.
+        timeout (float, default=180.0): give up after this many seconds.
+        predicted_duration (float, optional): when the result is expected [sec].
+        min_delay (float, default=0.2): shortest sleep between polls [sec].
+        max_delay (float, default=5.0): longest sleep between polls [sec].
+        func_name (str, optional): name used in log messages.
+
+    Returns:
+        wait_result (WaitResult)
+
+    Raises:
+        WaitForResultTimeoutError
+    """
+    expected_result, func_name = _prepare(func, expected_result, func_name)
+    schedule = PollSchedule(
+        predicted_duration, min_delay=min_delay, max_delay=max_delay, timeout=timeout
+    )
+
+    n_polls = 0
+    while True:
+        result = func()
+        n_polls = n_polls + 1
+        elapsed = schedule.elapsed()
+        if result_matches(result, expected_result):
+            logger.info(f"{func_name} returned '{result}' after {elapsed:.1f}s: exit")
+            return WaitResult(result, elapsed, n_polls, predicted_duration)
+        if elapsed >= timeout:
+            break
+        delay = schedule.next_delay()
+        logger.info(f"{func_name} returned '{result}', wait {delay:.1f}s...")
+        time.sleep(delay)
+    msg = f"wait for {func_name} did not result in {expected_result} before timeout {timeout:.2f}s"
+    raise WaitForResultTimeoutError(msg)
+
+
+async def async_poll_until(
+    func,
+    expected_result,
+    timeout: float = 180.0,
+    predicted_duration: float = None,
+    min_delay: float = 0.2,
+    max_delay: float = 5.0,
+    func_name: str = None,
+) -> WaitResult:
+    """
+    As ``poll_until``, but ``func`` is a coroutine function, and the event loop
+    keeps running while waiting.
+    """
+    expected_result, func_name = _prepare(func, expected_result, func_name)
+    schedule = PollSchedule(
+        predicted_duration, min_delay=min_delay, max_delay=max_delay, timeout=timeout
+    )
+
+    n_polls = 0
+    while True:
+        result = await func()
+        n_polls = n_polls + 1
+        elapsed = schedule.elapsed()
+        if result_matches(result, expected_result):
+            logger.info(f"{func_name} returned '{result}' after {elapsed:.1f}s: exit")
+            return WaitResult(result, elapsed, n_polls, predicted_duration)
+        if elapsed >= timeout:
+            break
+        delay = schedule.next_delay()
+        logger.info(f"{func_name} returned '{result}', wait {delay:.1f}s...")
+        await asyncio.sleep(delay)
+    msg = f"wait for {func_name} did not result in {expected_result} before timeout {timeout:.2f}s"
+    raise WaitForResultTimeoutError(msg)
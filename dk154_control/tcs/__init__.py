@@ -1,2 +1,4 @@
 import dk154_control.tcs.ascol
 import dk154_control.tcs.ascol_constants
+import dk154_control.tcs.async_ascol
+import dk154_control.tcs.telemetry
@@ -7,24 +7,22 @@ Based on ASCOL protocol: from doc v1.1.0 (20-07-2014)
 """
 
 import time
+import select
 import socket
 from logging import getLogger
+from types import MappingProxyType
 
-from dk154_control.tcs import ascol_constants
+from dk154_control.polling import WaitForResultTimeoutError, poll_until
+from dk154_control.tcs import ascol_commands, ascol_constants
+from dk154_control.tcs.ascol_base import AscolBase
+from dk154_control.tcs.ascol_commands import AscolInputError
 from dk154_control.utils import SilenceLoggers
 
 logger = getLogger(__name__.split(".")[-1])
 
 
-class AscolInputError(Exception):
-    pass
-
-
-class WaitForResultTimeoutError(Exception):
-    pass
-
-
-class Ascol:
+@ascol_commands.add_command_methods
+class Ascol(AscolBase):
     """
     ASCOL implemented as in the documentation v1.1.0 (20-07-2014)
 
@@ -35,7 +33,8 @@ class Ascol:
     date.
 
     Many ASCOL commands have methods defined, which translates the ASCOL response
-    into a human readable string.
+    into a human readable string. These methods are generated from the table in
+    ``ascol_commands`` - add new commands there.
 
     Example:
         It's preferable to use Ascol() in a ``with`` block, as this makes sure
@@ -50,70 +49,147 @@ class Ascol:
 
     Args:
         test_mode (bool, default: ``False``): For testing commands with
-            the ``dk154_mock`` package.
+            the local mock server (see ``mock_ascol``).
         debug (bool, default: ``False``): Log extra information (eg. success
             on sending commands, 'raw' ASCOL response.)
         delay (float, optional):
             If provided, wait this many seconds before sending commands after request.
         external (bool): Use the external IP address. Unlikely to be needed...
+        cache_ttl (dict, optional): {command: time-to-live [sec]} for cached
+            responses, updates ``ascol_constants.CACHE_TTL``. eg. ``{"WARP": 0}``
+            to never cache WARP.
+        use_proxy (bool, default: ``False``): Connect via the local ``AscolProxy``,
+            which shares one connection to the ASCOL server between many clients.
+        dump_stats (bool or str, default: ``False``): On exit, log a summary of
+            ``stats()``. If a file path, also write the full stats there as JSON.
+        connect_timeout (float, default=5.0): give up on a connect after this [sec].
+        read_timeout (float, default=10.0): give up waiting for a reply after
+            this [sec] (the connection is then re-made, and the command re-sent).
+        max_reconnects (int, default=5): attempts to (re-)connect, with jittered
+            exponential backoff between them, before raising ``ConnectionError``.
     """
 
-    INTERNAL_HOST = "192.168.132.11"  # The remote host, internal IP of the TCS
-    EXTERNAL_HOST = "134.171.81.74"  # The remote host, external IP of the TCS
-    LOCAL_HOST = "127.0.0.1"
-    ASCOL_PORT = (
-        2003  # Same port used by the server, ports avail 2001-2009, 2007 is occupied
-    )
-    LOCAL_PORT = 8883  # Alt-HTTP port -- safe to use?
-    _GLOBAL_PASSWORD = "1178"
-
     def __init__(
         self,
         test_mode: bool = False,
         debug: bool = False,
         delay: float = 0.1,
         external: bool = False,
+        cache_ttl: dict = None,
+        use_proxy: bool = False,
+        dump_stats=False,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 10.0,
+        max_reconnects: int = 5,
     ):
+        super().__init__(
+            test_mode=test_mode,
+            debug=debug,
+            delay=delay,
+            external=external,
+            cache_ttl=cache_ttl,
+            use_proxy=use_proxy,
+            dump_stats=dump_stats,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            max_reconnects=max_reconnects,
+        )
+        self.sock = None
+        self.recv_buffer = b""
+        self.reconnect()
 
-        logger.info("initialise Ascol")
-        self.external = external
-        if self.external:
-            self.HOST = self.EXTERNAL_HOST
-        else:
-            self.HOST = self.INTERNAL_HOST
-        self.PORT = self.ASCOL_PORT
+    def connect_socket(self):
+        """
+        (Re-)connect to the ASCOL server, once.
+        The connection is ready when the server has replied to ``PROBE_COMMAND``.
+        """
+        logger.info("socket connect")
+        t_start = time.perf_counter()
+        is_reconnect = self.conn_timestamp is not None
+        self.close()
+        sock = socket.create_connection(
+            (self.HOST, self.PORT), timeout=self.connect_timeout
+        )
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
 
-        self.test_mode = test_mode
-        if self.test_mode:
-            self.HOST = self.LOCAL_HOST
-            self.PORT = self.LOCAL_PORT
-            logger.info(f"starting in TEST MODE (use localhost:{self.PORT})")
+        self.sock = sock  # Don't name it 'socket' else overload module...
+        self.recv_buffer = b""  # Unread bytes from a previous connection are stale.
+        self.logged_in = False  # Login is per connection.
+        try:
+            self.probe()
+        except OSError:
+            self.close()
+            raise
+        self.connected(t_start, is_reconnect)
 
-        self.debug = debug  # TODO: change debug mode so that the LOGGER is changed!
+    def probe(self):
+        """
+        Send ``PROBE_COMMAND`` and wait (up to ``PROBE_TIMEOUT``) for the reply,
+        rather than sleeping for a fixed time after connecting.
+        """
+        self.sock.settimeout(min(self.PROBE_TIMEOUT, self.read_timeout))
+        self.sock.sendall(f"{self.PROBE_COMMAND}\n".encode("utf-8"))
+        line = self.read_line()
+        if self.debug:
+            logger.info(f"probe {self.PROBE_COMMAND} reply: {line}")
+        self.sock.settimeout(self.read_timeout)
 
-        self.init_time = time.time()
-        self.delay = delay
+    def reconnect(self):
+        """
+        Connect, retrying with jittered exponential backoff
+        (see ``polling.backoff_delay``). The first retry is almost immediate.
 
-        self.connect_socket()
+        Raises:
+            ConnectionError: if all of ``max_reconnects`` attempts fail.
+        """
+        for attempt in range(self.max_reconnects):
+            try:
+                self.connect_socket()
+                return
+            except OSError as e:
+                time.sleep(self.connect_retry_delay(attempt, e))
 
-    def connect_socket(self):
+    def is_connected(self):
         """
-        (Re-)connect to the ASCOL server.
+        Cheap health check of the socket, without sending anything to the server.
+
+        The socket is polled (without blocking) - if the server has closed the
+        connection, the socket is 'readable' but returns no bytes.
+
+        Returns:
+            connected (bool)
         """
-        logger.info("socket connect")
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((self.HOST, self.PORT))
-        self.conn_timestamp = time.time()
-        time.sleep(0.5)
+        if self.sock is None or self.sock.fileno() < 0:
+            return False
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0.0)
+            if readable:
+                peek = self.sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+                return len(peek) > 0  # b"" means the server closed the connection.
+        except (OSError, ValueError):
+            return False
+        return True
 
-        self.sock = sock  # Don't name it 'socket' else overload module...
+    def ensure_connected(self):
+        """
+        Reconnect to the ASCOL server only if the current connection is broken.
+        """
+        if not self.is_connected():
+            logger.info("ASCOL connection lost - reconnecting")
+            self.reconnect()
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.sock.close()
+        self.close()
         logger.info("ASCOL connection closed in __exit__")
+        self.exit_stats()
 
     def get_data(self, command: str) -> tuple:
         """
@@ -143,864 +219,236 @@ class Ascol:
 
         """
 
-        print_command = command
-        if "GLLG" in command:
-            print_command = "GLLG <passwd>"  # Don't print the actual pwd to logs!
-
-        logger.info(f"send to ASCOL: {print_command}")
-
-        send_command = (command + "\n").encode("utf-8")
-
-        if self.delay is not None:
-            time.sleep(self.delay)  # Sensible to wait a little?
-
-        try:
-            self.sock.sendall(send_command)  # Send the command to the TCS computer
-            if self.debug:
-                logger.info("successful sending")
-        except OSError as e:
-            logger.info("try reconnecting socket...")
-            self.connect_socket()
-            self.sock.sendall(send_command)
-            if self.debug:
-                logger.info("successful sending after reconnect")
-
-        data = self.sock.recv(1024)  # Ask for the result, up to 1024 char long.
-        data = data.decode("ascii")  # Decode from binary string
-        data = data.rstrip()  # Strip some unimportant newlines
-        data = tuple(data.split())  # Immutable 'tuple' better than 'list'.
-
-        if self.debug:
-            logger.info(
-                f"data received from server {self.HOST}:{self.PORT}\n    {data}"
-            )
-
-        if len(data) == 1 and data[0] == "ERR":
-            command_code = command.split()[0]
-            logger.warning(f"Result is ERR. Is {command_code} a 'set' command?")
-            logger.warning(f"You might have forgotten to send the password: use gllg()")
-
+        (data,) = self.get_many([command])
         return data
 
-    def wait_for_result(self, func, expected_result, delay=5.0, timeout=180.0):
-        """
-        Run a command repeatedly (with delay) until the expected result is returned.
-
-        Note:
-            This function is experimental!
-
-        Args:
-            func (Callable): The (ASCOL) function to run many times.
-            exp_result (str or tuple of str): The expected result (eg. "sky track")
-            delay (float, default: 180.0): sleep time between repeats [in sec]
-            timeout (float): give up after this many seconds
-
-        Returns:
-            result: The result of `func` which matched `expected_result`
-
-        Examples:
-            Note: don't call the function (ie, no parentheses after `ascol.ters`.)
-
-            >>> with Ascol() as ascol:
-            ...     result = ascol.wait_for_result(ascol.ters, "sky_track")
-
-        """
-
-        if isinstance(expected_result, str):
-            expected_result = [expected_result]  # now can always check result 'in'
-
-        func_name = func.__name__.upper()
-        res_str = "/".join(expected_result)
-        logger.info(f"{func_name} wait for result: '{res_str}'")
-
-        t_start = time.time()
-        while time.time() - t_start < timeout:
-            result = func()
-            if result in expected_result:
-                logger.info(f"{func_name} returned '{result}': exit")
-                return result
-            logger.info(f"{func_name} returned '{result}', wait {delay:.1f}s...")
-            time.sleep(delay)
-        msg = f"wait for {func_name} did not result in {expected_result} before timeout {timeout:.2f}s"
-        raise WaitForResultTimeoutError(msg)
-
-    def glre(self):
-        """
-        GLobal read REmote state [Not defined in ASCOL doc]
-
-        Returns:
-            result: a human-readable string
-        """
-        command = f"GLRE"
-        result_code, *dummy_values = self.get_data(command)
-        return ascol_constants.GLRE_CODES[result_code]
-
-    def glsr(self):
-        """
-        GLobal read Safety Relay state [Not defined in ASCOL doc]
-
-        Returns:
-            result (str): a human-readable string
-        """
-        command = f"GLSR"
-        result_code, *dummy_values = self.get_data(command)
-        return ascol_constants.GLSR_CODES[result_code]
-
-    def gllg(self, password=None):
-        """
-        GLobal LoGin [ASCOL 2.2]
-
-        Args:
-            password (str, default: "****"):
-                Send this string as the password to the server.
-                You will likely never need to provide this.
-
-        Returns:
-            password_result (str): 0 (wrong pwd) or 1 (correct)
-        """
-        password = password or self._GLOBAL_PASSWORD
-
-        command = f"GLLG {password}"
-        result_code, *dummy_values = self.get_data(command)
-        password_result = ascol_constants.GLLG_CODES[result_code]
-        return password_result
-
-    def glll(self):
-        """
-        GLobal read Latitude and Longitude [ASCOL 2.3]
-
-        Returns:
-            tuple containing
-                lat (str): latitude in format hhmmss.ss
-                lon (str): longitude in format +ddmmss.ss
-        """
-        lat, lon = self.get_data("GLLL")
-        return lat, lon
-
-    def glut(self):
-        """
-        GLobal read UTC [ASCOL 2.4]
-
-        Returns:
-            MJD (int): The date part of the current UTC.
-            time_str (str): The time in format hhmmss.ss
-        """
-        mjd, time_str, *dummy_values = self.get_data("GLUT")
-        return int(mjd), time_str
-
-    def glsd(self):
-        """
-        GLobal read SiDereal time [ASCOL 2.5]
-
-        Returns:
-            time (str): format hhmmss.ss (eg. 120000.00)
-        """
-        time_str, *dummy_values = self.get_data("GLSD")
-        return time_str
-
-    def gldp(self):
-        """
-        GLobal DePartment [ASCOL 2.6]
-
-        Returns:
-            department (str): a human-readable string
-        """
-        result_code, *dummy_values = self.get_data("GLDP")
-        return ascol_constants.GLDP_CODES.get(
-            result_code, f"Unknown dept {result_code}"
-        )
-
-    def teon(self, on_off: str):
-        """
-        Telescope ON/off [ASCOL 2.10]
-
-        Parameters:
-            on_off (str): [1 - on, 0 - off]
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        self.gllg()  # Requires set password
-
-        on_off = str(on_off)
-        if on_off not in ["1", "0"]:
-            errstr = "teon: use input '1' for on, '0' for off"
-            raise AscolInputError(errstr)
-
-        command = f"TEON {on_off}"
-        result_code, *dummy_values = self.get_data(command)
-        return result_code
-
-    def test(self):
-        """
-        TElescope STop [ASCOL 2.11]
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        self.gllg()
-        return self.get_data("TEST")
-
-    def tefl(self):
-        """
-        TElescope FLip [ASCOL 2.13]
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        self.gllg()
-        return self.get_data("TEFL")
-
-    def tepa(self):
-        """
-        Telescope PArk [ASCOL 2.14]
-
-        Returns:
-            result (str): "1" (ok) or ERR
+    def get_many(self, commands) -> list:
         """
-        self.gllg()  # Set commands require global password
-        return self.get_data("TEPA")
+        Send many ASCOL commands in one go, and read back all of the responses.
 
-    def tein(self):
-        """
-        TElescope INitialization [ASCOL 2.15]
+        All commands are written with a single ``sendall``, and the responses are
+        read from a newline-framed receive buffer, in the same order as the
+        commands. A full status snapshot therefore costs about one round trip.
 
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        self.gllg()
-        return self.get_data("TEIN")
-
-    def tsra(self, ra: str, dec: str, position: str):
-        """
-        Telescope Set Right Ascension and declination [ASCOL 2.17]
+        Responses to read commands which rarely change are served from a cache
+        (see ``ascol_constants.CACHE_TTL``), and are not sent at all - unless
+        they come after a 'set' command in the same batch.
 
         Args:
-            ra (str): hhmmss.s
-            dec (str): ddmmss.s
-            position (str): 0 - east, 1 - west
+            commands (list of str): Commands recognised by ASCOL.
+                'set' commands can be included, but the password (GLLG) must
+                be sent first (it can be the first command in the list).
 
         Returns:
-            result (str): "1" (ok) or ERR
-        """
-        self.gllg()  # Set commands require global password
-        command = f"TSRA {ra} {dec} {position}"
-
-        result_code, *dummy_values = self.get_data(command)
-        return result_code
-
-    def tgra(self):
-        """
-        Telescope Go Right Ascension and declination [ASCOL 2.19]
+            data (list of tuple): The 'raw' result of each command, in order.
 
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        self.gllg()  # Set commands require global password
-        result_code, *dummy_values = self.get_data("TGRA")
-        return result_code
-
-    def trrd(self):
-        """
-        Telescope Read Right ascension and Declination [ASCOL 2.41]
-
-        Returns:
-            RA (str): right ascension, format hhmmss.s
-            dec (str): declination, format +ddmmss.s
-            position (str): east/west
-        """
-        ra, dec, position_code, *dummy_values = self.get_data("TRRD")
-        return ra, dec, ascol_constants.TRRD_POSITION_CODES[position_code]
+        Example:
+            >>> with Ascol() as ascol:
+            ...     ters_data, dors_data = ascol.get_many(["TERS", "DORS"])
+            >>> print(ters_data, dors_data)
+            ('05',) ('00',)
 
-    def ters(self):
         """
-        TElescope Read State. [ASCOL 2.43]
 
-        Returns:
-            result (str): a human-readable string
-        """
-        result_code, *dummy_values = self.get_data("TERS")
-        return ascol_constants.TERS_CODES[result_code]
+        commands = list(commands)
+        results = self.cached_results(commands)
+        missed = [c for c, result in zip(commands, results) if result is None]
+        if len(missed) > 0:
+            results = self.merge_results(results, self.exchange(missed))
+        return results
 
-    def dosa(self, dome_pos):
+    def read_many(self, commands) -> list:
         """
-        DOme Set Absolute position [ASCOL 2.44]
+        As ``get_many``, but each response is translated as by the method for that
+        command (see ``ascol_commands``).
 
         Args:
-            dome_pos (str): formatted as ddd.dd: (eg. 0.00-359.99)
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        if isinstance(dome_pos, float):
-            dome_pos = f"{dome_pos:.2f}"
-        command = f"DOSA {dome_pos}"
-        result_code, *dummy_values = self.get_data(command)
-        return result_code
-
-    def doga(self):
-        """
-        DOme Go Absolute position [ASCOL 2.45]
+            commands (list of str): Commands in ``ascol_commands.COMMANDS``.
 
         Returns:
-            result (str): "1" (ok) or ERR
+            results (list): eg. ``["sky track", ("120000.00", "-300000.00", "east")]``
+                for ``["TERS", "TRRD"]``.
         """
-        result_code, *dummy_values = self.get_data("DOGA")
-        return result_code
+        commands = list(commands)
+        data = self.get_many(commands)
+        return [ascol_commands.decode(c, d) for c, d in zip(commands, data)]
 
-    def doam(self):
+    def exchange(self, commands: list) -> list:
         """
-        DOme AutoMated [ASCOL 2.46]
-
-        Returns:
-            result (str): "1" (ok) or ERR
+        Send commands to the server, and read the response to each (no caching).
         """
-        self.gllg()
-        result_code, *dummy_values = self.get_data("DOAM")
-        return result_code
+        self.log_send(commands)
 
-    def dopa(self):
-        """
-        DOme PArk [ASCOL 2.47]
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        self.gllg()
-        result_code, *dummy_values = self.get_data("DOPA")
-        return result_code
-
-    def doin(self):
-        """
-        DOme INitialization [ASCOL 2.48]
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        self.gllg()
-        result_code, *dummy_values = self.get_data("DOIN")
-        return result_code
-
-    def doso(self, open_close):
-        """
-        DOme Slit Open/close [ASCOL 2.50]
+        if self.delay is not None:
+            time.sleep(self.delay)  # Sensible to wait a little?
+            self.command_stats.record_delay(self.delay)
+
+        if self.sock is None:
+            self.reconnect()
+
+        results = []
+        n_resends = 0
+        while len(results) < len(commands):
+            pending = commands[len(results) :]
+            send_command = "".join(c + "\n" for c in pending).encode("utf-8")
+            try:
+                self.command_stats.record_batch()
+                t_send = time.perf_counter()
+                self.sock.sendall(send_command)  # Send the command to the TCS computer
+                if self.debug:
+                    logger.info("successful sending")
+                for command in pending:
+                    line = self.read_line()
+                    results.append(self.record_reply(command, line, t_send))
+            except OSError as e:
+                # Includes socket.timeout: no reply within read_timeout.
+                self.close()  # Late replies on this socket would be out of order.
+                n_resends = n_resends + 1
+                self.resend_or_raise(e, n_resends, pending)
+                self.reconnect()
+        return results
+
+    def read_line(self) -> str:
+        """
+        Read exactly one newline-terminated response from the receive buffer,
+        only reading from the socket if a full line is not already buffered.
+        """
+        while b"\n" not in self.recv_buffer:
+            chunk = self.sock.recv(1024)
+            if len(chunk) == 0:
+                raise ConnectionError("ASCOL server closed the connection")
+            self.recv_buffer += chunk
+        line, self.recv_buffer = self.recv_buffer.split(b"\n", 1)
+        return line.decode("ascii")  # Decode from binary string
+
+    def get_set_data(self, command: str) -> tuple:
+        """
+        Send a 'set' command, which requires the global password.
+        Login (``gllg``) is only sent if not already logged in on this connection.
+
+        If the reply is ERR, and the login was skipped (or the socket was
+        reconnected while sending), log in again and re-send the command once.
 
         Args:
-            open_close (str): 1 - open, 0 - close
+            command (str): A 'set' command recognised by ASCOL.
 
         Returns:
-            result (str): "1" (ok) or ERR
-        """
-        self.gllg()
-        command = f"DOSO {open_close}"
-        result_code, *dummy_values = self.get_data(command)
-        return result_code
-
-    def dost(self):
+            data (tuple): The result of the command.
         """
-        DOme STop [ASCOL 2.51]
+        login_skipped = self.logged_in
+        conn_timestamp = self.conn_timestamp
 
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
         self.gllg()
-        result_code, *dummy_values = self.get_data("DOST")
-        return result_code
-
-    def dors(self):
-        """
-        DOme Read State [ASCOL 2.56]
-
-        Returns:
-            dome_state (str): "1" (ok) or ERR
-        """
-        return_code, *dummy_values = self.get_data("DORS")
-        return ascol_constants.DORS_CODES[return_code]
-
-    def fcop(self, open_close: str):
-        """
-        Flap Cassegrain OPen/close [ASCOL 2.57]
-
-        Args:
-            open_close (str): 1 - open, 0 - close
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        open_close = str(open_close)
-        if open_close not in ["1", "0"]:
-            msg = "fcop: use input '1' for open, '0' for close"
-            raise AscolInputError(msg)
-
-        self.gllg()  # Use global login.
-        command = f"FCOP {open_close}"
-        return_code, *dummy_values = self.get_data(command)
-        return return_code
-
-    def fcrs(self):
-        """
-        Flap Cassegrain Read State [ASCOL 2.59]
-
-        Returns:
-            flap_cass_state (str): "1" (ok) or ERR
-        """
-        result_code, *dummy_values = self.get_data("FCRS")
-        return ascol_constants.FCRS_CODES[result_code]
-
-    def fmop(self, open_close: str):
-        """
-        Flap Mirror OPen/close [ASCOL 2.60]
-
-        Args:
-            open_close (str): 1 - open, 0 - close
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        open_close = str(open_close)
-        if open_close not in ["1", "0"]:
-            errstr = "fmop: use input '1' for open, '0' for close"
-            raise AscolInputError(errstr)
-
-        self.gllg()  # Set commands require global password
-        command = f"FMOP {open_close}"
-        result_code, *dummy_values = self.get_data(command)
-        return result_code
-
-    def fmrs(self):
-        """
-        Flap Mirror Read State [ASCOL 2.62]
-
-        Returns:
-            flap_mirror_state (str): "1" (ok) or ERR
-        """
-        result_code, *dummy_values = self.get_data("FMRS")
-        return ascol_constants.FMRS_CODES[result_code]
-
-    def wasp(self, position: str):
-        """
-        Wheel A Set Position [ASCOL 2.63]
-
-        Args:
-            position (str): wheel a position, 0-7 (see ``ascol_constants.WARP_CODES``)
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        if int(position) not in range(8):  # range(8) incl. 0, excl, 8
-            msg = f"Wheel A has positions 0-7; provided: {position}"
-            logger.warning(msg)
-
-        self.gllg()  # Set commands require global password
-        command = f"WASP {position}"
-        result_code, *dummy_values = self.get_data(command)
-        return result_code
-
-    def wagp(self):
-        """
-        Wheel A Go Position [ASCOL 2.64]
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        self.gllg()  # Set commands require global password
-        result_code, *dummy_values = self.get_data("WAGP")
-        return result_code
-
-    def warp(self):
-        """
-        Wheel A Read Position [ASCOL 2.66]
-
-        Returns:
-            wheel_a_pos (str): human-readable string
-        """
-        result_code, *dummy_values = self.get_data("WARP")
-        return ascol_constants.WARP_CODES[result_code]
-
-    def wars(self):
-        """
-        Wheel A Read State [ASCOL 2.68]
-
-        Returns:
-            wheel_a_state (str): human-readable string
-        """
-        result_code, *dummy_values = self.get_data("WARS")
-        return ascol_constants.WARS_CODES[result_code]
+        data = self.get_data(command)
+        if self.retry_set(data, login_skipped, conn_timestamp):
+            self.gllg()
+            data = self.get_data(command)
+        return data
 
-    def wbsp(self, position):
+    def wait_for_result(
+        self,
+        func,
+        expected_result,
+        delay=None,
+        timeout=180.0,
+        predicted_duration=None,
+        min_delay=0.2,
+        max_delay=5.0,
+        return_wait_result=False,
+    ):
         """
-        Wheel B Set Position [ASCOL 2.69]
+        Run a command repeatedly until the expected result is returned.
 
+        By default, the time between polls adapts: it is short close to
+        ``predicted_duration`` (or at the start, if no prediction), and backs off
+        up to ``max_delay`` while far from it. See ``dk154_control.polling``.
 
         Args:
-            position (str): wheel a position, 0-6 (see ``ascol_constants.WBRP_CODES``)
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        if int(position) not in range(7):  # range(7) incl. 0, excl. 7
-            msg = f"Wheel B has positions 0-6; provided: {position}"
-            logger.warning(msg)
-
-        self.gllg()  # Set commands require global login
-        command = f"WBSP {position}"
-        result_code, *dummy_values = self.get_data(command)
-        return result_code
-
-    def wbgp(self):
-        """
-        Wheel B Go Position [ASCOL 2.70]
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        self.gllg()  # Set commands require global login
-        result_code, *dummy_values = self.get_data("WBGP")
-        return result_code
-
-    def wbrp(self):
-        """
-        Wheel B Read Position [ASCOL 2.72]
-
-        Returns:
-            wheel_b_pos (str): human-readable string
-        """
-        result_code, *dummy_values = self.get_data("WBRP")
-        return ascol_constants.WBRP_CODES[result_code]
-
-    def wbrs(self):
-        """
-        Wheel B Read State [ASCOL 2.74]
-
-        Returns:
-            wheel_b_state (str): human-readable string
-        """
-        result_code, *dummy_values = self.get_data("WBRS")
-        return ascol_constants.WBRS_CODES[result_code]
-
-    def fora(self):
-        """
-        FOcus Read Absolute position [ASCOL 2.82]
-
-        Returns:
-            focus_pos (float): focus absolule position [mm]
-        """
-        focus_pos, *dummy_values = self.get_data("FORA")
-        return float(focus_pos)
-
-    def fors(self):
-        """
-        FOcus Read State [ASCOL 2.87]
-
-        Returns:
-            focus_state (str): human-readable string
-        """
-        result_code, *dummy_values = self.get_data("FORS")
-        return ascol_constants.FORS_CODES[result_code]
-
-    def shop(self, open_close):
-        """
-        SHutter OPen/close [ASCOL 2.134]
-
-        Parameters
-        ----------
-        open_close [1 - open, 0 - close]
-
-        Returns:
-            result (str): "1" (ok) or ERR
-        """
-        self.gllg()  # Set global password required.
-
-        open_close = str(open_close)
-        if open_close not in ["1", "0"]:
-            errstr = "shop: use input '1' for open, '0' for close"
-            raise AscolInputError(errstr)
-        command = f"SHOP {open_close}"
-        result_code, *dummy_values = self.get_data(command)
-        return result_code
-
-    def shrp(self):
-        """
-        SHutter Read Position [ASCOL 2.135]
-
-        Returns:
-            shutter_pos (str): human-readable string
-        """
-        result_code, *dummy_values = self.get_data("SHRP")
-        return ascol_constants.SHRP_CODES[result_code]
-
-    def mebe(self):
-        """
-        MEteo Brightness East [ASCOL 2.136]
-
-        Returns:
-            brightness (float): kLux
-            validity (str)
-        """
-        command = f"MEBE"
-        brightness, validity_code, *dummy_values = self.get_data(command)
-        return float(brightness), ascol_constants.MEBE_VALIDITY_CODES[validity_code]
-
-    def mebn(self):
-        """
-        MEteo Brightness North [ASCOL 2.137]
-
-        Returns:
-            brightness (float): kLux
-            validity (str)
-        """
-        brightness, validity_code, *dummy_values = self.get_data("MEBN")
-        return float(brightness), ascol_constants.MEBN_VALIDITY_CODES[validity_code]
-
-    def mebw(self):
-        """
-        MEteo Brightness West [ASCOL 2.138]
-
-        Returns:
-            brightness (float): kLux
-            validity (str)
-        """
-        brightness, validity_code, *dummy_values = self.get_data("MEBW")
-        return float(brightness), ascol_constants.MEBW_VALIDITY_CODES[validity_code]
-
-    def metw(self):
-        """
-        MEteo TWilight [ASCOL 2.139]
-
-        Returns:
-            twilight (float): Lux
-            validity (str)
-        """
-        brightness, validity_code, *dummy_values = self.get_data("METW")
-        return float(brightness), ascol_constants.METW_VALIDITY_CODES[validity_code]
-
-    def mehu(self):
-        """
-        MEteo HUmidity [ASCOL 2.140]
-
-        Returns:
-            brightness (float): percentage
-            validity (str)
-        """
-        humidity, validity_code, *dummy_values = self.get_data("MEHU")
-        return float(humidity), ascol_constants.MEHU_VALIDITY_CODES[validity_code]
-
-    def mete(self):
-        """
-        MEteo TEmperature [ASCOL 2.141]
+            func (Callable): The (ASCOL) function to run many times.
+            exp_result (str or tuple of str): The expected result (eg. "sky track")
+            delay (float, optional): If provided, use a fixed sleep time between
+                repeats [in sec] instead of adaptive polling.
+            timeout (float): give up after this many seconds
+            predicted_duration (float, optional): When the result is expected [sec].
+            min_delay (float, default: 0.2): shortest sleep between repeats [sec].
+            max_delay (float, default: 5.0): longest sleep between repeats [sec].
+            return_wait_result (bool, default: ``False``): If True, return a
+                ``WaitResult`` with timing metadata rather than just the result.
 
         Returns:
-            temperature (float): celcius]
-            validity (str)
-        """
-        temperature, validity_code, *dummy_values = self.get_data("METE")
-        return float(temperature), ascol_constants.METE_VALIDITY_CODES[validity_code]
+            result: The result of `func` which matched `expected_result`
+                (or ``WaitResult``, if ``return_wait_result=True``)
 
-    def mews(self):
-        """
-        MEteo Wind Speed [ASCOL 2.142]
+        Examples:
+            Note: don't call the function (ie, no parentheses after `ascol.ters`.)
 
-        Returns:
-            wind_speed (float): m/s
-            validity (str)
-        """
-        wind_speed, validity_code, *dummy_values = self.get_data("MEWS")
-        return float(wind_speed), ascol_constants.MEWS_VALIDITY_CODES[validity_code]
+            >>> with Ascol() as ascol:
+            ...     result = ascol.wait_for_result(ascol.ters, "sky_track")
 
-    def mepr(self):
         """
-        MEteo PRecipitation [ASCOL 2.143]
+        if delay is not None:
+            min_delay, max_delay = delay, delay
 
-        Returns:
-            precipitiation (str): yes/no
-            validity (str)
-        """
-        precip_code, validity_code, *dummy_values = self.get_data("MEPR")
-        return (
-            ascol_constants.MEPR_CODES[precip_code],
-            ascol_constants.MEPR_VALIDITY_CODES[validity_code],
+        wait_result = poll_until(
+            func,
+            expected_result,
+            timeout=timeout,
+            predicted_duration=predicted_duration,
+            min_delay=min_delay,
+            max_delay=max_delay,
         )
+        if return_wait_result:
+            return wait_result
+        return wait_result.result
 
-    def meap(self):
-        """
-        MEteo Atmospheric Pressure [ASCOL 2.144]
-
-        Returns:
-            atmospheric_pressure (float): mbar
-            validity (str)
-        """
-        pressure, validity_code, *dummy_values = self.get_data("MEAP")
-        return float(pressure), ascol_constants.MEPR_VALIDITY_CODES[validity_code]
-
-    def mepy(self):
-        """
-        MEteo PYrgeometer [ASCOL 2.145]
-
-        Returns:
-            irradience (float): W/m2
-            validity (str)
-        """
-        irradience, validity_code, *dummy_values = self.get_data("MEPY")
-        return float(irradience), ascol_constants.MEPY_VALIDITY_CODES[validity_code]
-
-    def doss(self):
-        """
-        DOme read Slit State [Not defined in ASCOL document]
-
-        Returns:
-            slit_state (str): human-readable string
-        """
-        result_code, *dummy_values = self.get_data("DOSS")
-        return ascol_constants.DOSS_CODES[result_code]
-
-    def dola(self):
-        """
-        DOme read LAmp state [Not defined in ASCOL document]
-
-        Returns:
-            lamp_state (str): human-readable string
-        """
-        result_code, *dummy_values = self.get_data("DOLA")
-        return ascol_constants.DOLA_CODES[result_code]
-
-    def vnos(self):
-        """
-        Vent NOrth read State [Not defined in ASCOL document]
-
-        Returns:
-            n_vent_state (str): human-readable string
-        """
-        vnos_code, *dummy_values = self.get_data("VNOS")
-        return ascol_constants.VNOS_CODES.get(vnos_code, f"Unknown code {vnos_code}")
-
-    def vnes(self):
-        """
-        Vent NorthEast read State [Not defined in ASCOL document]
-
-        Returns:
-            ne_vent_state (str): human-readable string
-        """
-        vnes_code, *dummy_values = self.get_data("VNES")
-        return ascol_constants.VNES_CODES.get(vnes_code, f"Unknown code {vnes_code}")
-
-    def veas(self):
-        """
-        Vent EAst read State [Not defined in ASCOL document]
-
-        Returns:
-            e_vent_state (str): human-readable string
-        """
-        veas_code, *dummy_values = self.get_data("VEAS")
-        return ascol_constants.VNOS_CODES.get(veas_code, f"Unknown code {veas_code}")
-
-    def vses(self):
+    def gllg(self, password=None, force=False):
         """
-        Vent SouthEast read State [Not defined in ASCOL document]
-
-        Returns:
-            se_vent_state (str): human-readable string
-        """
-        vses_code, *dummy_values = self.get_data("VSES")
-        return ascol_constants.VSES_CODES.get(vses_code, f"Unknown code {vses_code}")
-
-    def vsos(self):
-        """
-        Vent SOuth read State [Not defined in ASCOL document]
-
-        Returns:
-            s_vent_state (str): human-readable string
-        """
-        vsos_code, *dummy_values = self.get_data("VSOS")
-        return ascol_constants.VSOS_CODES.get(vsos_code, f"Unknown code {vsos_code}")
-
-    def vsws(self):
-        """
-        Vent SouthWest read State [Not defined in ASCOL document]
-
-        Returns:
-            sw_vent_state (str): human-readable string
-        """
-        vsws_code, *dummy_values = self.get_data("VSWS")
-        return ascol_constants.VNOS_CODES.get(vsws_code, f"Unknown code {vsws_code}")
-
-    def vwes(self):
-        """
-        Vent WEst read State [Not defined in ASCOL document]
+        GLobal LoGin [ASCOL 2.2]
 
-        Returns:
-            w_vent_state (str): human-readable string
-        """
-        vwes_code, *dummy_values = self.get_data("VWES")
-        return ascol_constants.VWES_CODES.get(vwes_code, f"Unknown code {vwes_code}")
+        A successful login is remembered for the current connection, so
+        repeated calls are skipped (see ``logins_skipped``) until there is
+        a reconnect or an ERR reply.
 
-    def vnws(self):
-        """
-        Vent NorthWest read State [Not defined in ASCOL document]
+        Args:
+            password (str, default: "****"):
+                Send this string as the password to the server.
+                You will likely never need to provide this.
+            force (bool, default: ``False``):
+                Send the login even if already logged in.
 
         Returns:
-            nw_vent_state (str): human-readable string
+            password_result (str): 0 (wrong pwd) or 1 (correct)
         """
-        vnws_code, *dummy_values = self.get_data("VNWS")
-        return ascol_constants.VNWS_CODES.get(vnws_code, f"Unknown code {vnws_code}")
+        if self.skip_login(password=password, force=force):
+            return ascol_constants.GLLG_CODES["1"]
+        return self.login_result(self.get_data(self.login_command(password)))
 
     def log_all_status(self):
         """
         Log the position/state of telescope, dome, wheels and mirrors.
         """
 
-        remote_state = self.glre()
-        safety_relay_state = self.glsr()
-        telescope_state = self.ters()
-        dome_state = self.dors()
-        dome_slit_state = self.doss()
-        flap_cassegrain_state = self.fcrs()
-        flap_mirror_state = self.fmrs()
-        curr_ra, curr_dec, curr_pos = self.trrd()
-        shutter_pos = self.shrp()
-        wheel_a_state = self.wars()
-        wheel_b_state = self.wbrs()
-        wheel_a_position = self.warp()
-        wheel_b_position = self.wbrp()
-        wheel_a_state = self.wars()
-        wheel_b_state = self.wbrs()
-
-        status_str = (
-            f"Telescope status:\n"
-            f"    remote/local [GLRE]: {remote_state}\n"
-            f"    safety relay [GLSR]: {safety_relay_state}\n"
-            f"    tel. state [TERS]  : {telescope_state}\n"
-            f"    dome state [DORS]  : {dome_state}\n"
-            f"    domeslit ste [DOSS]: {dome_slit_state}\n"
-            f"    casseg. flap [FCRS]: {flap_cassegrain_state}\n"
-            f"    mirror flap [FMRS] : {flap_mirror_state}\n"
-            f"    RA/Dec (pos) [TRRD]: {curr_ra}, {curr_dec} ({curr_pos})\n"
-            f"    shutter pos [SHRP] : {shutter_pos}\n"
-            f"    wheel A pos. [WARP]: {wheel_a_position}\n"
-            f"    wheel B pos. [WBRP]: {wheel_b_position}\n"
-            f"    wh. A state  [WARS]: {wheel_a_state}\n"
-            f"    wh. B state  [WARS]: {wheel_b_state}\n"
-        )
-        logger.info(f"{status_str}")
+        status = AscolStatus.from_ascol(self)
+        status.log_telescope_status()
         return
 
     def log_meteo_status(self):
 
-        with Ascol(test_mode=self.test_mode) as ascol:
-            twilight, tw_valid = ascol.metw()  # Lux
-            # brightness_east, be_valid = ascol.mebe()  # kLux
-            # brightness_north, bn_valid = ascol.mebn()  # kLux
-            # brightness_west, bw_valid = ascol.mebn()  # kLux
-            humidity, hu_valid = ascol.mehu()  # percent
-            temp, te_valid = ascol.mete()  # C
-            wind_speed, wi_valid = ascol.mews()  # m/s
-            precip, pr_valid = ascol.mepr()  # y/n
-            atm_pressure, ap_valid = ascol.meap()  # mbar
-            irradience, ir_valid = ascol.mepy()  # W/m2
+        twilight, tw_valid = self.metw()  # Lux
+        # brightness_east, be_valid = self.mebe()  # kLux
+        # brightness_north, bn_valid = self.mebn()  # kLux
+        # brightness_west, bw_valid = self.mebn()  # kLux
+        humidity, hu_valid = self.mehu()  # percent
+        temp, te_valid = self.mete()  # C
+        wind_speed, wi_valid = self.mews()  # m/s
+        precip, pr_valid = self.mepr()  # y/n
+        atm_pressure, ap_valid = self.meap()  # mbar
+        irradience, ir_valid = self.mepy()  # W/m2
 
         status_str = (
             "Meteorology status:\n"
             f"    twilight [METW]  : {twilight:.2f} Lux [{tw_valid}]\n"
-            f"    humidity [MEHU]  : {humidity:03d} \% [{hu_valid}]\n"
+            f"    humidity [MEHU]  : {humidity:.0f} % [{hu_valid}]\n"
             f"    temperat. [METE] : {temp:.1f} C [{te_valid}]\n"
             f"    wind speed [MEWS]: {wind_speed:.1f} m/s [{wi_valid}]\n"
             f"    precip. [MEPR]   : {precip} [{pr_valid}]\n"
@@ -1011,6 +459,25 @@ class Ascol:
         return
 
 
+# Commands read by AscolStatus - all are read-only, so are safe to batch.
+STATUS_COMMANDS = (
+    "GLUT",
+    "GLRE",
+    "GLSR",
+    "TERS",
+    "DORS",
+    "DOSS",
+    "FCRS",
+    "FMRS",
+    "TRRD",
+    "SHRP",
+    "WARS",
+    "WBRS",
+    "WARP",
+    "WBRP",
+)
+
+
 class AscolStatus:
 
     @classmethod
@@ -1027,6 +494,25 @@ class AscolStatus:
             )
         return status
 
+    @classmethod
+    def from_ascol(cls, ascol: Ascol):
+        """
+        Collect the status with an already open connection.
+        """
+        status = cls.__new__(cls)
+        status.collect(ascol)
+        return status
+
+    @classmethod
+    def from_replies(cls, replies: dict):
+        """
+        Build the status from 'raw' responses, keyed by command
+        (eg. from ``AsyncAscol.get_many``).
+        """
+        status = cls.__new__(cls)
+        status.decode(replies)
+        return status
+
     def __init__(
         self,
         test_mode: bool = False,
@@ -1037,25 +523,54 @@ class AscolStatus:
         with Ascol(
             test_mode=test_mode, debug=debug, delay=delay, external=external
         ) as ascol:
-            mjd, time_str = ascol.glut()
-            self.mjd = mjd
-            self.time_str = time_str
-            self.remote_state = ascol.glre()
-            self.safety_relay_state = ascol.glsr()
-            self.telescope_state = ascol.ters()
-            self.dome_state = ascol.dors()
-            self.dome_slit_state = ascol.doss()
-            self.flap_cassegrain_state = ascol.fcrs()
-            self.flap_mirror_state = ascol.fmrs()
-            current_ra, current_dec, current_position = ascol.trrd()
-            self.current_ra = current_ra
-            self.current_dec = current_dec
-            self.current_position = current_position
-            self.shutter_position = ascol.shrp()
-            self.wheel_a_state = ascol.wars()
-            self.wheel_b_state = ascol.wbrs()
-            self.wheel_a_position = ascol.warp()
-            self.wheel_b_position = ascol.wbrp()
+            self.collect(ascol)
+
+    def collect(self, ascol: Ascol):
+        """
+        Read all status commands in a single batch (see ``Ascol.get_many``).
+        """
+        replies = dict(zip(STATUS_COMMANDS, ascol.get_many(STATUS_COMMANDS)))
+        self.decode(replies)
+
+    def __setattr__(self, name, value):
+        if getattr(self, "frozen", False):
+            raise AttributeError(f"AscolStatus is frozen: can't set '{name}'")
+        super().__setattr__(name, value)
+
+    def freeze(self):
+        """
+        Make this status read-only, so it can be safely shared between threads.
+        """
+        self.replies = MappingProxyType(dict(self.replies))
+        self.frozen = True
+        return self
+
+    def decode(self, replies: dict):
+        """
+        Translate the 'raw' responses into human-readable strings.
+        Responses to any other commands are kept in ``replies``.
+        """
+        self.timestamp = time.time()
+        self.replies = dict(replies)
+
+        decode = ascol_commands.decode
+        self.mjd, self.time_str = decode("GLUT", replies["GLUT"])
+        self.remote_state = decode("GLRE", replies["GLRE"])
+        self.safety_relay_state = decode("GLSR", replies["GLSR"])
+        self.telescope_state = decode("TERS", replies["TERS"])
+        self.dome_state = decode("DORS", replies["DORS"])
+        self.dome_slit_state = decode("DOSS", replies["DOSS"])
+        self.flap_cassegrain_state = decode("FCRS", replies["FCRS"])
+        self.flap_mirror_state = decode("FMRS", replies["FMRS"])
+        current_ra, current_dec, current_position = decode("TRRD", replies["TRRD"])
+        self.current_ra = current_ra
+        self.current_dec = current_dec
+        self.current_position = current_position
+        self.shutter_position = decode("SHRP", replies["SHRP"])
+        self.wheel_a_state = decode("WARS", replies["WARS"])
+        self.wheel_b_state = decode("WBRS", replies["WBRS"])
+        self.wheel_a_position = decode("WARP", replies["WARP"])
+        self.wheel_b_position = decode("WBRP", replies["WBRP"])
 
     def get_status_str(self):
         return (
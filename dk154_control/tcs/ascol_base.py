@@ -0,0 +1,275 @@
+"""
+Logic shared by the ``Ascol`` and ``AsyncAscol`` clients.
+
+Everything which does not touch the socket lives here: host/port selection,
+reply parsing, login bookkeeping, the response cache and the command stats.
+The two clients only differ in how they connect, send and read.
+"""
+
+import time
+from logging import getLogger
+
+from dk154_control.polling import backoff_delay
+from dk154_control.tcs import ascol_constants
+from dk154_control.tcs.ascol_cache import AscolCache
+from dk154_control.tcs.ascol_stats import AscolStats
+
+logger = getLogger(__name__.split(".")[-1])
+
+
+def is_set_command(command: str) -> bool:
+    """
+    Does this command change the state of the telescope/dome/etc.?
+    (see ``ascol_constants.SET_COMMANDS``)
+    """
+    return command.split(maxsplit=1)[0] in ascol_constants.SET_COMMANDS
+
+
+class AscolBase:
+    """
+    Base class of the ASCOL clients. Arguments are as for ``Ascol``.
+    """
+
+    INTERNAL_HOST = "192.168.132.11"  # The remote host, internal IP of the TCS
+    EXTERNAL_HOST = "134.171.81.74"  # The remote host, external IP of the TCS
+    LOCAL_HOST = "127.0.0.1"
+    ASCOL_PORT = (
+        2003  # Same port used by the server, ports avail 2001-2009, 2007 is occupied
+    )
+    LOCAL_PORT = 8883  # Alt-HTTP port -- safe to use?
+    PROXY_PORT = 8893  # Local AscolProxy, see ascol_proxy.py
+    _GLOBAL_PASSWORD = "1178"
+
+    PROBE_COMMAND = "GLUT"  # Harmless read, to check a new connection is ready.
+    PROBE_TIMEOUT = 2.0
+
+    def __init__(
+        self,
+        test_mode: bool = False,
+        debug: bool = False,
+        delay: float = 0.1,
+        external: bool = False,
+        cache_ttl: dict = None,
+        use_proxy: bool = False,
+        dump_stats=False,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 10.0,
+        max_reconnects: int = 5,
+    ):
+        logger.info(f"initialise {type(self).__name__}")
+        self.external = external
+        if self.external:
+            self.HOST = self.EXTERNAL_HOST
+        else:
+            self.HOST = self.INTERNAL_HOST
+        self.PORT = self.ASCOL_PORT
+
+        self.test_mode = test_mode
+        if self.test_mode:
+            self.HOST = self.LOCAL_HOST
+            self.PORT = self.LOCAL_PORT
+            logger.info(f"starting in TEST MODE (use localhost:{self.PORT})")
+
+        self.use_proxy = use_proxy
+        if self.use_proxy:
+            self.HOST = self.LOCAL_HOST
+            self.PORT = self.PROXY_PORT
+            logger.info(f"connect via local proxy (localhost:{self.PORT})")
+
+        self.debug = debug  # TODO: change debug mode so that the LOGGER is changed!
+
+        self.init_time = time.time()
+        self.delay = delay
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_reconnects = max_reconnects
+
+        self.logged_in = False  # Is the login (GLLG) still valid for this connection?
+        self.logins_skipped = 0
+
+        self.cache = AscolCache(ttl=cache_ttl)
+        self.command_stats = AscolStats()
+        self.dump_stats = dump_stats
+
+        self.conn_timestamp = None
+
+    # Connection bookkeeping
+
+    def connect_retry_delay(self, attempt: int, error: Exception) -> float:
+        """
+        How long to wait before the next connect attempt
+        (see ``polling.backoff_delay``).
+
+        Raises:
+            ConnectionError: if that was the last of ``max_reconnects`` attempts.
+        """
+        if attempt == self.max_reconnects - 1:
+            msg = f"could not connect to {self.HOST}:{self.PORT}: {error}"
+            raise ConnectionError(msg) from error
+        delay = backoff_delay(attempt)
+        logger.warning(f"connect failed ({error}): retry in {delay:.2f}s")
+        return delay
+
+    def connected(self, t_start: float, is_reconnect: bool):
+        """
+        Record a new connection, which was started at ``t_start`` (perf_counter).
+        """
+        self.conn_timestamp = time.time()
+        if is_reconnect:
+            self.command_stats.record_reconnect(time.perf_counter() - t_start)
+
+    def exit_stats(self):
+        if self.dump_stats:
+            stats_path = None if self.dump_stats is True else self.dump_stats
+            self.command_stats.dump(path=stats_path)
+
+    # Batches, replies and cache
+
+    def cached_results(self, commands: list) -> list:
+        """
+        Look up cached responses in order. A read after a 'set' command in the
+        same batch (eg. WARP after WAGP) is never served from the cache, as the
+        set will have changed it.
+
+        Returns:
+            results (list): the cached response for each command, or None if it
+                must be sent.
+        """
+        results = []
+        after_set = False
+        for command in commands:
+            after_set = after_set or is_set_command(command)
+            results.append(None if after_set else self.cache.get(command))
+        return results
+
+    @staticmethod
+    def merge_results(results: list, exchanged: list) -> list:
+        """
+        Fill the gaps (None) in ``results`` with ``exchanged``, in order.
+        """
+        data_iter = iter(exchanged)
+        return [next(data_iter) if r is None else r for r in results]
+
+    def log_send(self, commands: list):
+        print_commands = ", ".join(self.get_print_command(c) for c in commands)
+        logger.info(f"send to ASCOL: {print_commands}")
+
+    def record_reply(self, command: str, line: str, t_send: float) -> tuple:
+        """
+        Parse one reply line (without the newline), and add it to the stats.
+        """
+        data = self.parse_reply(command, line)
+        self.command_stats.record(
+            command,
+            t_send,
+            time.perf_counter(),
+            len(command) + 1,
+            len(line) + 1,
+            data == ("ERR",),
+        )
+        return data
+
+    def resend_or_raise(self, error: Exception, n_resends: int, pending: list):
+        """
+        Called after a send/read fails, for the ``pending`` commands which have
+        not had a reply. Only reads are re-sent: a 'set' may already have been
+        done (eg. a second TGRA or DOSA), so the caller must decide.
+
+        Raises:
+            ConnectionError: if a 'set' command is pending, or there have been
+                too many attempts already.
+        """
+        sets = [c for c in pending if is_set_command(c)]
+        if len(sets) > 0:
+            print_sets = ", ".join(self.get_print_command(c) for c in sets)
+            msg = f"ASCOL error ({error!r}): not re-sending {print_sets}"
+            raise ConnectionError(msg) from error
+        if n_resends > self.max_reconnects:
+            raise error
+        logger.info(f"ASCOL error ({error!r}): try reconnecting...")
+
+    def parse_reply(self, command: str, line: str) -> tuple:
+        data = line.rstrip()  # Strip some unimportant newlines
+        data = tuple(data.split())  # Immutable 'tuple' better than 'list'.
+
+        if self.debug:
+            logger.info(
+                f"data received from server {self.HOST}:{self.PORT}\n    {data}"
+            )
+
+        if len(data) == 1 and data[0] == "ERR":
+            command_code = command.split()[0]
+            logger.warning(f"Result is ERR. Is {command_code} a 'set' command?")
+            logger.warning(f"You might have forgotten to send the password: use gllg()")
+            self.logged_in = False  # Don't trust the remembered login any more.
+        elif command.startswith("GLLG"):
+            self.logged_in = data == ("1",)
+        self.cache.update(command, data)
+
+        return data
+
+    @staticmethod
+    def get_print_command(command: str) -> str:
+        if "GLLG" in command:
+            return "GLLG <passwd>"  # Don't print the actual pwd to logs!
+        return command
+
+    # Login
+
+    def skip_login(self, password=None, force=False) -> bool:
+        """
+        A successful login is remembered for the current connection: don't send
+        another until there is a reconnect or an ERR reply.
+        """
+        if self.logged_in and not force and password is None:
+            self.logins_skipped = self.logins_skipped + 1
+            return True
+        return False
+
+    def login_command(self, password=None) -> str:
+        password = password or self._GLOBAL_PASSWORD
+        return f"GLLG {password}"
+
+    @staticmethod
+    def login_result(data: tuple) -> str:
+        result_code, *dummy_values = data
+        return ascol_constants.GLLG_CODES[result_code]
+
+    def retry_set(self, data: tuple, login_skipped: bool, conn_timestamp) -> bool:
+        """
+        Should a 'set' command which replied ERR be sent again (after login)?
+        Only if the login was skipped, or the socket was reconnected while sending.
+        """
+        if data == ("ERR",) and (
+            login_skipped or self.conn_timestamp != conn_timestamp
+        ):
+            logger.info("ERR after remembered login/reconnect: login and retry")
+            return True
+        return False
+
+    # Stats
+
+    def stats(self) -> dict:
+        """
+        Counters and latencies for each command sent, plus reconnects, time spent
+        in ``delay``, and the cache hits/misses (see ``AscolStats``).
+
+        Returns:
+            stats (dict)
+        """
+        stats = self.command_stats.stats()
+        stats["cache"] = self.cache.stats()
+        return stats
+
+    def clear_stats(self):
+        self.command_stats.clear()
+
+    def cache_stats(self) -> dict:
+        """
+        Returns:
+            stats (dict): cache hits and misses, in total and for each command.
+        """
+        return self.cache.stats()
+
+    def clear_cache(self):
+        self.cache.clear()
@@ -0,0 +1,83 @@
+"""
+Time-to-live cache for the responses of ASCOL read commands.
+
+Used by ``Ascol`` and ``AsyncAscol``, so that values which rarely change
+(site lat/lon, department, wheel positions) are not re-queried on every status dump.
+"""
+
+import time
+from logging import getLogger
+
+from dk154_control.tcs import ascol_constants
+
+logger = getLogger(__name__.split(".")[-1])
+
+
+class AscolCache:
+    """
+    Cache of 'raw' ASCOL responses, keyed by command.
+
+    Args:
+        ttl (dict, optional): {command: time-to-live [sec]}. Updates the defaults
+            in ``ascol_constants.CACHE_TTL``. Use a ttl of 0 to never cache a command.
+    """
+
+    def __init__(self, ttl: dict = None):
+        self.ttl = dict(ascol_constants.CACHE_TTL)
+        self.ttl.update(ttl or {})
+
+        self.entries = {}  # {command: (expiry_time, data)}
+        self.hits = {}
+        self.misses = {}
+
+    def get(self, command: str):
+        """
+        Returns:
+            data (tuple or None): The cached response, or None if not cached/expired.
+        """
+        if self.ttl.get(command, 0.0) <= 0.0:
+            return None  # Never cached - don't count as a miss.
+
+        entry = self.entries.get(command, None)
+        if entry is not None and time.monotonic() < entry[0]:
+            self.hits[command] = self.hits.get(command, 0) + 1
+            return entry[1]
+        self.misses[command] = self.misses.get(command, 0) + 1
+        return None
+
+    def update(self, command: str, data: tuple):
+        """
+        Store the response to a read command, or invalidate the responses
+        affected by a 'set' command.
+        """
+        command_code = command.split()[0]
+        for invalid_command in ascol_constants.CACHE_INVALIDATED_BY.get(
+            command_code, ()
+        ):
+            self.entries.pop(invalid_command, None)
+
+        ttl = self.ttl.get(command, 0.0)
+        if ttl <= 0.0 or len(data) == 0 or data[0] == "ERR":
+            return
+        if data[0] in ascol_constants.CACHE_TRANSIENT_RESULTS.get(command, ()):
+            self.entries.pop(command, None)
+            return
+        self.entries[command] = (time.monotonic() + ttl, data)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            stats (dict): total hits/misses, and hits/misses for each command.
+        """
+        commands = sorted(set(self.hits) | set(self.misses))
+        return {
+            "hits": sum(self.hits.values()),
+            "misses": sum(self.misses.values()),
+            "commands": {
+                c: {"hits": self.hits.get(c, 0), "misses": self.misses.get(c, 0)}
+                for c in commands
+            },
+        }
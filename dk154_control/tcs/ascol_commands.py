@@ -0,0 +1,603 @@
+"""
+Table of ASCOL commands, from which the ``Ascol``/``AsyncAscol`` methods are built.
+
+Each entry gives the command's arguments, whether it needs the global password,
+and the type of each field of the response (``str``, ``int``, ``float``,
+or a code table from ``ascol_constants``). The parser for each command is built
+once, when this module is imported, so decoding a response is only a few lookups.
+
+Commands which need special handling (eg. ``gllg``) are written out by hand in
+the client classes, and are not replaced.
+"""
+
+import inspect
+from logging import getLogger
+
+from dk154_control.tcs import ascol_constants as ac
+
+logger = getLogger(__name__.split(".")[-1])
+
+
+class AscolInputError(Exception):
+    pass
+
+
+class Arg:
+    """
+    An argument to an ASCOL command.
+
+    Args:
+        name (str): name of the argument in the generated method.
+        doc (str): description, for the docstring.
+        choices (tuple of str, optional): allowed values.
+        strict (bool, default=True): raise ``AscolInputError`` for a value not in
+            ``choices`` (else only log a warning).
+        fmt (Callable, optional): format non-string values, eg. ``"{:.2f}".format``.
+    """
+
+    def __init__(self, name, doc, choices=None, strict=True, fmt=None):
+        self.name = name
+        self.doc = doc
+        self.choices = choices
+        self.strict = strict
+        self.fmt = fmt
+
+    def to_str(self, value, method_name) -> str:
+        if self.fmt is not None and not isinstance(value, str):
+            value = self.fmt(value)
+        value = str(value)
+        if self.choices is not None and value not in self.choices:
+            choices_str = "/".join(self.choices)
+            msg = f"{method_name}: {self.name} should be {choices_str}; got {value}"
+            if self.strict:
+                raise AscolInputError(msg)
+            logger.warning(msg)
+        return value
+
+
+class Field:
+    """
+    One field of an ASCOL response.
+
+    Args:
+        name (str): name of the field, for the docstring.
+        kind: ``str``, ``int``, ``float``, or a dict of codes to human-readable strings.
+        doc (str): description, for the docstring.
+        unknown (str, optional): for codes, returned for a code not in ``kind``,
+            formatted with the code (eg. "Unknown code {}"). If not given,
+            an unknown code raises ``KeyError``.
+    """
+
+    def __init__(self, name, kind, doc, unknown=None):
+        self.name = name
+        self.kind = kind
+        self.doc = doc
+        self.unknown = unknown
+
+    def converter(self):
+        if isinstance(self.kind, dict):
+            codes = self.kind
+            if self.unknown is None:
+                return codes.__getitem__
+            unknown = self.unknown
+
+            def lookup(code):
+                result = codes.get(code, None)
+                if result is None:
+                    return unknown.format(code)
+                return result
+
+            return lookup
+        if self.kind is str:
+            return None  # No conversion needed.
+        return self.kind
+
+    def type_name(self):
+        if isinstance(self.kind, dict):
+            return "str"
+        return self.kind.__name__
+
+
+def build_parser(code: str, fields: tuple):
+    """
+    Build a function which converts the 'raw' response tuple for one command.
+    A single field is returned as a value, many fields as a tuple.
+    Any extra values in the response are ignored.
+    """
+    converters = tuple(field.converter() for field in fields)
+    n_fields = len(fields)
+
+    def check(data):
+        if len(data) < n_fields:
+            raise ValueError(f"{code}: expected {n_fields} values, got {data}")
+
+    if n_fields == 1:
+        (conv0,) = converters
+        if conv0 is None:
+            return lambda data: data[0]
+        return lambda data: conv0(data[0])
+
+    if n_fields == 2 and None not in converters:
+        conv0, conv1 = converters
+
+        def parse_two(data):
+            check(data)
+            return conv0(data[0]), conv1(data[1])
+
+        return parse_two
+
+    converters = tuple((lambda x: x) if c is None else c for c in converters)
+
+    def parse(data):
+        check(data)
+        return tuple([conv(value) for conv, value in zip(converters, data)])
+
+    return parse
+
+
+class AscolCommand:
+    """
+    Definition of one ASCOL command.
+
+    Args:
+        code (str): the four-letter command, eg. "TERS".
+        doc (str): first line of the docstring, eg. "TElescope Read State [ASCOL 2.43]"
+        args (tuple of Arg): arguments sent with the command.
+        fields (tuple of Field): fields of the response.
+        password (bool, default=False): a 'set' command, which needs login first.
+        raw (bool, default=False): return the 'raw' response tuple, not ``fields``.
+    """
+
+    def __init__(self, code, doc, args=(), fields=(), password=False, raw=False):
+        self.code = code
+        self.name = code.lower()
+        self.doc = doc
+        self.args = tuple(args)
+        self.fields = tuple(fields)
+        self.password = password
+        self.raw = raw
+        self.parse = tuple if raw else build_parser(code, self.fields)
+
+    def format(self, *args, **kwargs) -> str:
+        """
+        The command string to send, eg. ``format("1")`` -> "TEON 1".
+        """
+        if len(args) + len(kwargs) != len(self.args):
+            arg_names = ", ".join(a.name for a in self.args) or "no arguments"
+            msg = f"{self.name}() takes {arg_names}"
+            raise TypeError(msg)
+        if len(kwargs) > 0:
+            args = args + tuple(kwargs[a.name] for a in self.args[len(args) :])
+        if len(args) == 0:
+            return self.code
+        arg_strs = [arg.to_str(value, self.name) for arg, value in zip(self.args, args)]
+        return " ".join([self.code, *arg_strs])
+
+    def signature(self):
+        params = [inspect.Parameter("self", inspect.Parameter.POSITIONAL_OR_KEYWORD)]
+        for arg in self.args:
+            params.append(
+                inspect.Parameter(arg.name, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+            )
+        return inspect.Signature(params)
+
+    def docstring(self) -> str:
+        lines = [self.doc, ""]
+        if len(self.args) > 0:
+            lines.append("Args:")
+            for arg in self.args:
+                lines.append(f"    {arg.name} (str): {arg.doc}")
+            lines.append("")
+        lines.append("Returns:")
+        if self.raw:
+            lines.append("    data (tuple): the 'raw' response, eg. ('1',)")
+            return "\n".join(lines)
+        for field in self.fields:
+            lines.append(f"    {field.name} ({field.type_name()}): {field.doc}")
+        return "\n".join(lines)
+
+
+def set_command(code, doc, args=(), raw=False):
+    result = Field("result", str, '"1" (ok) or ERR')
+    return AscolCommand(code, doc, args=args, fields=(result,), password=True, raw=raw)
+
+
+def state_command(code, doc, name, codes, unknown=None):
+    field = Field(name, codes, "human-readable string", unknown=unknown)
+    return AscolCommand(code, doc, fields=(field,))
+
+
+def meteo_command(code, doc, name, unit, validity_codes):
+    fields = (
+        Field(name, float, unit),
+        Field("validity", validity_codes, "valid/invalid"),
+    )
+    return AscolCommand(code, doc, fields=fields)
+
+
+OPEN_CLOSE = Arg("open_close", "1 - open, 0 - close", choices=("1", "0"))
+
+COMMAND_LIST = [
+    # Global
+    state_command(
+        "GLRE",
+        "GLobal read REmote state [Not defined in ASCOL doc]",
+        "result",
+        ac.GLRE_CODES,
+    ),
+    state_command(
+        "GLSR",
+        "GLobal read Safety Relay state [Not defined in ASCOL doc]",
+        "result",
+        ac.GLSR_CODES,
+    ),
+    AscolCommand(
+        "GLLG",
+        "GLobal LoGin [ASCOL 2.2]",
+        args=(Arg("password", "the global password"),),
+        fields=(Field("password_result", ac.GLLG_CODES, "correct/wrong password"),),
+    ),
+    AscolCommand(
+        "GLLL",
+        "GLobal read Latitude and Longitude [ASCOL 2.3]",
+        fields=(
+            Field("lat", str, "latitude in format hhmmss.ss"),
+            Field("lon", str, "longitude in format +ddmmss.ss"),
+        ),
+    ),
+    AscolCommand(
+        "GLUT",
+        "GLobal read UTC [ASCOL 2.4]",
+        fields=(
+            Field("mjd", int, "The date part of the current UTC."),
+            Field("time_str", str, "The time in format hhmmss.ss"),
+        ),
+    ),
+    AscolCommand(
+        "GLSD",
+        "GLobal read SiDereal time [ASCOL 2.5]",
+        fields=(Field("time_str", str, "format hhmmss.ss (eg. 120000.00)"),),
+    ),
+    state_command(
+        "GLDP",
+        "GLobal DePartment [ASCOL 2.6]",
+        "department",
+        ac.GLDP_CODES,
+        unknown="Unknown dept {}",
+    ),
+    # Telescope
+    set_command(
+        "TEON",
+        "Telescope ON/off [ASCOL 2.10]",
+        args=(Arg("on_off", "1 - on, 0 - off", choices=("1", "0")),),
+    ),
+    set_command("TEST", "TElescope STop [ASCOL 2.11]", raw=True),
+    set_command("TEFL", "TElescope FLip [ASCOL 2.13]", raw=True),
+    set_command("TEPA", "Telescope PArk [ASCOL 2.14]", raw=True),
+    set_command("TEIN", "TElescope INitialization [ASCOL 2.15]", raw=True),
+    set_command(
+        "TSRA",
+        "Telescope Set Right Ascension and declination [ASCOL 2.17]",
+        args=(
+            Arg("ra", "hhmmss.s"),
+            Arg("dec", "ddmmss.s"),
+            Arg("position", "0 - east, 1 - west"),
+        ),
+    ),
+    set_command("TGRA", "Telescope Go Right Ascension and declination [ASCOL 2.19]"),
+    AscolCommand(
+        "TRRD",
+        "Telescope Read Right ascension and Declination [ASCOL 2.41]",
+        fields=(
+            Field("ra", str, "right ascension, format hhmmss.s"),
+            Field("dec", str, "declination, format +ddmmss.s"),
+            Field("position", ac.TRRD_POSITION_CODES, "east/west"),
+        ),
+    ),
+    state_command(
+        "TERS", "TElescope Read State [ASCOL 2.43]", "telescope_state", ac.TERS_CODES
+    ),
+    # Dome
+    set_command(
+        "DOSA",
+        "DOme Set Absolute position [ASCOL 2.44]",
+        args=(
+            Arg(
+                "dome_pos",
+                "formatted as ddd.dd: (eg. 0.00-359.99)",
+                fmt="{:.2f}".format,
+            ),
+        ),
+    ),
+    set_command("DOGA", "DOme Go Absolute position [ASCOL 2.45]"),
+    set_command("DOAM", "DOme AutoMated [ASCOL 2.46]"),
+    set_command("DOPA", "DOme PArk [ASCOL 2.47]"),
+    set_command("DOIN", "DOme INitialization [ASCOL 2.48]"),
+    set_command("DOSO", "DOme Slit Open/close [ASCOL 2.50]", args=(OPEN_CLOSE,)),
+    set_command("DOST", "DOme STop [ASCOL 2.51]"),
+    state_command("DORS", "DOme Read State [ASCOL 2.56]", "dome_state", ac.DORS_CODES),
+    state_command(
+        "DOSS",
+        "DOme read Slit State [Not defined in ASCOL document]",
+        "slit_state",
+        ac.DOSS_CODES,
+    ),
+    state_command(
+        "DOLA",
+        "DOme read LAmp state [Not defined in ASCOL document]",
+        "lamp_state",
+        ac.DOLA_CODES,
+    ),
+    # Flaps
+    set_command("FCOP", "Flap Cassegrain OPen/close [ASCOL 2.57]", args=(OPEN_CLOSE,)),
+    state_command(
+        "FCRS",
+        "Flap Cassegrain Read State [ASCOL 2.59]",
+        "flap_cass_state",
+        ac.FCRS_CODES,
+    ),
+    set_command("FMOP", "Flap Mirror OPen/close [ASCOL 2.60]", args=(OPEN_CLOSE,)),
+    state_command(
+        "FMRS",
+        "Flap Mirror Read State [ASCOL 2.62]",
+        "flap_mirror_state",
+        ac.FMRS_CODES,
+    ),
+    # Wheels
+    set_command(
+        "WASP",
+        "Wheel A Set Position [ASCOL 2.63]",
+        args=(
+            Arg(
+                "position",
+                "wheel a position, 0-7 (see ``ascol_constants.WARP_CODES``)",
+                choices=tuple(str(ii) for ii in range(8)),
+                strict=False,
+            ),
+        ),
+    ),
+    set_command("WAGP", "Wheel A Go Position [ASCOL 2.64]"),
+    state_command(
+        "WARP", "Wheel A Read Position [ASCOL 2.66]", "wheel_a_pos", ac.WARP_CODES
+    ),
+    state_command(
+        "WARS", "Wheel A Read State [ASCOL 2.68]", "wheel_a_state", ac.WARS_CODES
+    ),
+    set_command(
+        "WBSP",
+        "Wheel B Set Position [ASCOL 2.69]",
+        args=(
+            Arg(
+                "position",
+                "wheel b position, 0-6 (see ``ascol_constants.WBRP_CODES``)",
+                choices=tuple(str(ii) for ii in range(7)),
+                strict=False,
+            ),
+        ),
+    ),
+    set_command("WBGP", "Wheel B Go Position [ASCOL 2.70]"),
+    state_command(
+        "WBRP", "Wheel B Read Position [ASCOL 2.72]", "wheel_b_pos", ac.WBRP_CODES
+    ),
+    state_command(
+        "WBRS", "Wheel B Read State [ASCOL 2.74]", "wheel_b_state", ac.WBRS_CODES
+    ),
+    # Focus
+    AscolCommand(
+        "FORA",
+        "FOcus Read Absolute position [ASCOL 2.82]",
+        fields=(Field("focus_pos", float, "focus absolute position [mm]"),),
+    ),
+    state_command(
+        "FORS", "FOcus Read State [ASCOL 2.87]", "focus_state", ac.FORS_CODES
+    ),
+    # Shutter
+    set_command("SHOP", "SHutter OPen/close [ASCOL 2.134]", args=(OPEN_CLOSE,)),
+    state_command(
+        "SHRP", "SHutter Read Position [ASCOL 2.135]", "shutter_pos", ac.SHRP_CODES
+    ),
+    # Meteo
+    meteo_command(
+        "MEBE",
+        "MEteo Brightness East [ASCOL 2.136]",
+        "brightness",
+        "kLux",
+        ac.MEBE_VALIDITY_CODES,
+    ),
+    meteo_command(
+        "MEBN",
+        "MEteo Brightness North [ASCOL 2.137]",
+        "brightness",
+        "kLux",
+        ac.MEBN_VALIDITY_CODES,
+    ),
+    meteo_command(
+        "MEBW",
+        "MEteo Brightness West [ASCOL 2.138]",
+        "brightness",
+        "kLux",
+        ac.MEBW_VALIDITY_CODES,
+    ),
+    meteo_command(
+        "METW",
+        "MEteo TWilight [ASCOL 2.139]",
+        "twilight",
+        "Lux",
+        ac.METW_VALIDITY_CODES,
+    ),
+    meteo_command(
+        "MEHU",
+        "MEteo HUmidity [ASCOL 2.140]",
+        "humidity",
+        "percentage",
+        ac.MEHU_VALIDITY_CODES,
+    ),
+    meteo_command(
+        "METE",
+        "MEteo TEmperature [ASCOL 2.141]",
+        "temperature",
+        "celsius",
+        ac.METE_VALIDITY_CODES,
+    ),
+    meteo_command(
+        "MEWS",
+        "MEteo Wind Speed [ASCOL 2.142]",
+        "wind_speed",
+        "m/s",
+        ac.MEWS_VALIDITY_CODES,
+    ),
+    AscolCommand(
+        "MEPR",
+        "MEteo PRecipitation [ASCOL 2.143]",
+        fields=(
+            Field("precipitation", ac.MEPR_CODES, "yes/no"),
+            Field("validity", ac.MEPR_VALIDITY_CODES, "valid/invalid"),
+        ),
+    ),
+    meteo_command(
+        "MEAP",
+        "MEteo Atmospheric Pressure [ASCOL 2.144]",
+        "atmospheric_pressure",
+        "mbar",
+        ac.MEAP_VALIDITY_CODES,
+    ),
+    meteo_command(
+        "MEPY",
+        "MEteo PYrgeometer [ASCOL 2.145]",
+        "irradiance",
+        "W/m2",
+        ac.MEPY_VALIDITY_CODES,
+    ),
+    # Vents
+    state_command(
+        "VNOS",
+        "Vent NOrth read State [Not defined in ASCOL document]",
+        "n_vent_state",
+        ac.VNOS_CODES,
+        unknown="Unknown code {}",
+    ),
+    state_command(
+        "VNES",
+        "Vent NorthEast read State [Not defined in ASCOL document]",
+        "ne_vent_state",
+        ac.VNES_CODES,
+        unknown="Unknown code {}",
+    ),
+    state_command(
+        "VEAS",
+        "Vent EAst read State [Not defined in ASCOL document]",
+        "e_vent_state",
+        ac.VEAS_CODES,
+        unknown="Unknown code {}",
+    ),
+    state_command(
+        "VSES",
+        "Vent SouthEast read State [Not defined in ASCOL document]",
+        "se_vent_state",
+        ac.VSES_CODES,
+        unknown="Unknown code {}",
+    ),
+    state_command(
+        "VSOS",
+        "Vent SOuth read State [Not defined in ASCOL document]",
+        "s_vent_state",
+        ac.VSOS_CODES,
+        unknown="Unknown code {}",
+    ),
+    state_command(
+        "VSWS",
+        "Vent SouthWest read State [Not defined in ASCOL document]",
+        "sw_vent_state",
+        ac.VSWS_CODES,
+        unknown="Unknown code {}",
+    ),
+    state_command(
+        "VWES",
+        "Vent WEst read State [Not defined in ASCOL document]",
+        "w_vent_state",
+        ac.VWES_CODES,
+        unknown="Unknown code {}",
+    ),
+    state_command(
+        "VNWS",
+        "Vent NorthWest read State [Not defined in ASCOL document]",
+        "nw_vent_state",
+        ac.VNWS_CODES,
+        unknown="Unknown code {}",
+    ),
+]
+
+COMMANDS = {command.code: command for command in COMMAND_LIST}
+
+
+def decode(command: str, data: tuple):
+    """
+    Translate the 'raw' response to ``command`` (eg. from ``Ascol.get_many``),
+    exactly as the method for that command would.
+    """
+    return COMMANDS[command.split(maxsplit=1)[0]].parse(data)
+
+
+def _finish_method(method, command: AscolCommand):
+    method.__name__ = command.name
+    method.__doc__ = command.docstring()
+    method.__signature__ = command.signature()
+    method.ascol_command = command
+    return method
+
+
+def make_method(command: AscolCommand):
+    parse, format_command = command.parse, command.format
+
+    if command.password:
+
+        def method(self, *args, **kwargs):
+            return parse(self.get_set_data(format_command(*args, **kwargs)))
+
+    else:
+
+        def method(self, *args, **kwargs):
+            return parse(self.get_data(format_command(*args, **kwargs)))
+
+    return _finish_method(method, command)
+
+
+def make_async_method(command: AscolCommand):
+    parse, format_command = command.parse, command.format
+
+    if command.password:
+
+        async def method(self, *args, **kwargs):
+            return parse(await self.get_set_data(format_command(*args, **kwargs)))
+
+    else:
+
+        async def method(self, *args, **kwargs):
+            return parse(await self.get_data(format_command(*args, **kwargs)))
+
+    return _finish_method(method, command)
+
+
+def _add_methods(cls, factory):
+    for command in COMMAND_LIST:
+        if command.name in cls.__dict__:
+            continue  # Written by hand.
+        method = factory(command)
+        method.__qualname__ = f"{cls.__name__}.{command.name}"
+        setattr(cls, command.name, method)
+    return cls
+
+
+def add_command_methods(cls):
+    """
+    Class decorator: add a method for each command in the table
+    (eg. ``ascol.ters()``), which uses ``cls.get_data``/``cls.get_set_data``.
+    """
+    return _add_methods(cls, make_method)
+
+
+def add_async_command_methods(cls):
+    """
+    As ``add_command_methods``, but the methods are coroutines.
+    """
+    return _add_methods(cls, make_async_method)
@@ -408,3 +408,68 @@ VNWS_CODES = {
     "04": "open",
     "05": "closed",
 }
+
+# 'set' commands: they change the state of the telescope/dome/etc.,
+# so they must be sent in order, and never merged or cached.
+SET_COMMANDS = (
+    "TEON",
+    "TEST",
+    "TEFL",
+    "TEPA",
+    "TEIN",
+    "TSRA",
+    "TGRA",
+    "DOSA",
+    "DOGA",
+    "DOAM",
+    "DOPA",
+    "DOIN",
+    "DOSO",
+    "DOST",
+    "FCOP",
+    "FMOP",
+    "WASP",
+    "WAGP",
+    "WBSP",
+    "WBGP",
+    "SHOP",
+)
+
+# RESPONSE CACHE
+
+# Time-to-live [sec] for the responses of read commands which rarely change.
+# Commands not listed here are never cached.
+CACHE_TTL = {
+    "GLLL": 3600.0,
+    "GLDP": 3600.0,
+    "GLRE": 60.0,
+    "WARP": 60.0,
+    "WBRP": 60.0,
+}
+
+# Don't cache these results - they will change soon (eg. wheel is rotating).
+CACHE_TRANSIENT_RESULTS = {
+    "WARP": ("8",),
+    "WBRP": ("7",),
+}
+
+# Sending a 'set' command drops the cached responses of these read commands.
+CACHE_INVALIDATED_BY = {
+    "TEON": ("TERS",),
+    "TSRA": ("TERS", "TRRD"),
+    "TGRA": ("TERS", "TRRD"),
+    "DOSA": ("DORS",),
+    "DOGA": ("DORS",),
+    "DOAM": ("DORS",),
+    "DOPA": ("DORS",),
+    "DOIN": ("DORS",),
+    "DOST": ("DORS",),
+    "DOSO": ("DOSS",),
+    "FCOP": ("FCRS",),
+    "FMOP": ("FMRS",),
+    "WASP": ("WARP", "WARS"),
+    "WAGP": ("WARP", "WARS"),
+    "WBSP": ("WBRP", "WBRS"),
+    "WBGP": ("WBRP", "WBRS"),
+    "SHOP": ("SHRP",),
+}
@@ -0,0 +1,253 @@
+"""
+Local multiplexing proxy for the ASCOL server.
+
+The TCS only has a handful of ports, and every script opens its own connection.
+The proxy holds the single upstream connection, and many local clients
+(``Ascol(use_proxy=True)``) connect to it instead - the protocol is unchanged.
+
+    - all the lines a client has sent (eg. a batch from ``Ascol.get_many``)
+      are forwarded upstream together, in one round trip.
+    - identical read commands from different clients which arrive while one is
+      already in flight (eg. many scripts polling TERS) share one upstream request.
+    - batches with 'set' commands are forwarded one at a time, in the order
+      they arrive.
+    - each client must still log in (GLLG) before its 'set' commands, as with the
+      real server. The proxy logs in upstream itself, as required.
+
+Run with eg. ``python3 -m dk154_control.tcs.ascol_proxy``
+"""
+
+import asyncio
+from argparse import ArgumentParser
+from logging import getLogger
+
+from dk154_control.tcs import ascol_base, ascol_constants
+from dk154_control.tcs.async_ascol import AsyncAscol
+
+logger = getLogger(__name__.split(".")[-1])
+
+
+def is_set_command(command: str) -> bool:
+    """
+    Commands which change state (or take arguments) must not be merged.
+    """
+    return ascol_base.is_set_command(command) or len(command.split()) > 1
+
+
+class AscolProxy:
+    """
+    Serve the ASCOL protocol to local clients over one upstream connection.
+
+    Args:
+        listen_host (str, default="127.0.0.1"): Interface to accept clients on.
+        listen_port (int, default=``Ascol.PROXY_PORT``): Port to accept clients on.
+        test_mode (bool, default: ``False``): Upstream is the local mock server.
+        external (bool, default: ``False``): Upstream uses the external IP address.
+        debug (bool, default: ``False``): passed to the upstream AsyncAscol.
+        delay (float, optional): passed to the upstream AsyncAscol.
+    """
+
+    def __init__(
+        self,
+        listen_host: str = AsyncAscol.LOCAL_HOST,
+        listen_port: int = AsyncAscol.PROXY_PORT,
+        test_mode: bool = False,
+        external: bool = False,
+        debug: bool = False,
+        delay: float = None,
+    ):
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+
+        # Clients have their own caches: don't cache twice.
+        no_cache = {command: 0.0 for command in ascol_constants.CACHE_TTL}
+        self.upstream = AsyncAscol(
+            test_mode=test_mode,
+            external=external,
+            debug=debug,
+            delay=delay,
+            cache_ttl=no_cache,
+        )
+        self.set_lock = asyncio.Lock()  # asyncio.Lock is FIFO: sets keep their order.
+        self.inflight = {}  # {command: Future} for reads waiting on upstream.
+
+        self.server = None
+        self.n_clients = 0
+        self.n_requests = 0
+        self.n_batches = 0
+        self.n_coalesced = 0
+
+    async def start(self):
+        await self.upstream.connect()
+        self.server = await asyncio.start_server(
+            self.handle_client, self.listen_host, self.listen_port
+        )
+        logger.info(f"ASCOL proxy listening on {self.listen_host}:{self.listen_port}")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        await self.upstream.close()
+        logger.info(f"ASCOL proxy stopped: {self.stats()}")
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    def stats(self) -> dict:
+        return {
+            "clients": self.n_clients,
+            "requests": self.n_requests,
+            "batches": self.n_batches,
+            "coalesced": self.n_coalesced,
+        }
+
+    async def handle_client(self, reader, writer):
+        self.n_clients = self.n_clients + 1
+        peer = writer.get_extra_info("peername")
+        logger.info(f"client connected: {peer}")
+        logged_in = False  # Login is per client connection, as the real server.
+        buffer = b""
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if len(chunk) == 0:
+                    break  # Client closed the connection.
+                buffer = buffer + chunk
+                *lines, buffer = buffer.split(b"\n")
+                commands = [line.decode("ascii").strip() for line in lines]
+                commands = [c for c in commands if len(c) > 0]
+                if len(commands) == 0:
+                    continue
+                # A client's batches are handled in order, so its reads always
+                # see the effect of its own earlier sets.
+                replies, logged_in = await self.request_batch(commands, logged_in)
+                writer.write(
+                    "".join(" ".join(d) + "\n" for d in replies).encode("ascii")
+                )
+                await writer.drain()
+        except (OSError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"client {peer} error: {e}")
+        finally:
+            writer.close()
+            logger.info(f"client disconnected: {peer}")
+
+    async def request_batch(self, commands: list, logged_in: bool):
+        """
+        Reply to all the commands one client has sent, with one upstream
+        ``get_many``. Logins are checked here, in order: 'set' commands from a
+        client which has not logged in reply ERR, and are not forwarded.
+
+        Returns:
+            replies (list of tuple), logged_in (bool)
+        """
+        self.n_requests = self.n_requests + len(commands)
+        self.n_batches = self.n_batches + 1
+        replies = [None] * len(commands)
+        for ii, command in enumerate(commands):
+            if command.split()[0] == "GLLG":
+                replies[ii] = self.login(command)
+                logged_in = replies[ii] == ("1",)
+            elif is_set_command(command) and not logged_in:
+                replies[ii] = ("ERR",)
+
+        forward = [c for c, reply in zip(commands, replies) if reply is None]
+        if any(is_set_command(c) for c in forward):
+            forwarded = await self.forward_sets(forward)
+        else:
+            forwarded = await self.forward_reads(forward)
+        return self.upstream.merge_results(replies, forwarded), logged_in
+
+    async def forward_sets(self, commands: list) -> list:
+        """
+        Forward a batch which includes 'set' commands, in order,
+        logged in upstream.
+        """
+        async with self.set_lock:
+            await self.upstream.gllg()
+            conn_timestamp = self.upstream.conn_timestamp
+            data = await self.upstream.get_many(commands)
+            for ii, command in enumerate(commands):
+                if is_set_command(command) and self.upstream.retry_set(
+                    data[ii], False, conn_timestamp
+                ):
+                    data[ii] = await self.upstream.get_set_data(command)
+            # Reads already in flight may have started before these sets.
+            self.inflight.clear()
+        return data
+
+    async def forward_reads(self, commands: list) -> list:
+        """
+        Forward read commands. Any which are already in flight upstream
+        (from another client) are not sent again.
+        """
+        if len(commands) == 0:
+            return []
+        futures = {}
+        send = []
+        for command in commands:
+            if command in futures:
+                continue
+            future = self.inflight.get(command, None)
+            if future is not None:
+                self.n_coalesced = self.n_coalesced + 1
+            else:
+                future = asyncio.get_running_loop().create_future()
+                self.inflight[command] = future
+                send.append(command)
+            futures[command] = future
+
+        if len(send) > 0:
+            try:
+                data = await self.upstream.get_many(send)
+            except Exception as e:
+                for command in send:
+                    futures[command].set_exception(e)
+                    futures[command].exception()  # Don't warn if nobody else waits.
+            else:
+                for command, result in zip(send, data):
+                    futures[command].set_result(result)
+            finally:
+                for command in send:
+                    if self.inflight.get(command, None) is futures[command]:
+                        self.inflight.pop(command)
+        return [await asyncio.shield(futures[command]) for command in commands]
+
+    def login(self, command: str) -> tuple:
+        """
+        Check a client's password. The proxy logs in upstream itself.
+        """
+        command_code, *args = command.split()
+        password = args[0] if len(args) > 0 else ""
+        if password != self.upstream._GLOBAL_PASSWORD:
+            return ("0",)
+        return ("1",)
+
+
+if __name__ == "__main__":
+    import dk154_control  # Set up the loggers.
+
+    parser = ArgumentParser()
+    parser.add_argument("-t", "--test-mode", action="store_true", default=False)
+    parser.add_argument("-x", "--external", action="store_true", default=False)
+    parser.add_argument("-d", "--debug", action="store_true", default=False)
+    parser.add_argument("--host", default=AsyncAscol.LOCAL_HOST)
+    parser.add_argument("-p", "--port", default=AsyncAscol.PROXY_PORT, type=int)
+    args = parser.parse_args()
+
+    proxy = AscolProxy(
+        listen_host=args.host,
+        listen_port=args.port,
+        test_mode=args.test_mode,
+        external=args.external,
+        debug=args.debug,
+    )
+    try:
+        asyncio.run(proxy.serve_forever())
+    except KeyboardInterrupt:
+        logger.info("proxy interrupted")
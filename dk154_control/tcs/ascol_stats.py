@@ -0,0 +1,167 @@
+"""
+Per-command latency and error counters for ASCOL clients.
+
+Used by ``Ascol`` and ``AsyncAscol``, to see where the time goes on a slow night:
+the TCS (latency of each command), our own ``delay`` before each send,
+or reconnects.
+"""
+
+import json
+import time
+from bisect import bisect_right
+from logging import getLogger
+
+logger = getLogger(__name__.split(".")[-1])
+
+# Upper edges of the latency histogram bins [sec]: 0.5ms to ~65s, x2 each bin.
+# Latencies above the last edge go in one extra (overflow) bin.
+LATENCY_BIN_EDGES = tuple(0.0005 * 2.0**ii for ii in range(18))
+
+
+def histogram_percentile(counts: list, q: float) -> float:
+    """
+    Estimate a percentile [sec] from histogram counts: the upper edge of the
+    bin which contains it.
+    """
+    total = sum(counts)
+    if total == 0:
+        return float("nan")
+    target = q / 100.0 * total
+    cumulative = 0
+    for ii, count in enumerate(counts):
+        cumulative = cumulative + count
+        if cumulative >= target:
+            break
+    if ii >= len(LATENCY_BIN_EDGES):
+        return float("inf")
+    return LATENCY_BIN_EDGES[ii]
+
+
+class AscolStats:
+    """
+    Counters for each command code (eg. "TERS"): number sent, ``ERR`` replies,
+    bytes sent/received, and a histogram of latencies (time from sending the
+    batch that contained the command, until its reply was read).
+    Also counts reconnects, and the time spent in ``delay`` sleeps.
+    """
+
+    def __init__(self):
+        self.t_start = time.time()
+        self.commands = {}
+        self.n_batches = 0
+        self.n_reconnects = 0
+        self.reconnect_time = 0.0
+        self.delay_time = 0.0
+
+    def command_entry(self, command_code: str) -> dict:
+        entry = self.commands.get(command_code, None)
+        if entry is None:
+            entry = {
+                "count": 0,
+                "errors": 0,
+                "bytes_sent": 0,
+                "bytes_received": 0,
+                "latency_total": 0.0,
+                "latency_max": 0.0,
+                "histogram": [0] * (len(LATENCY_BIN_EDGES) + 1),
+            }
+            self.commands[command_code] = entry
+        return entry
+
+    def record(
+        self,
+        command: str,
+        t_send: float,
+        t_receive: float,
+        bytes_sent: int,
+        bytes_received: int,
+        is_error: bool,
+    ):
+        """
+        Record one reply. Times are from ``time.perf_counter()``.
+        """
+        entry = self.command_entry(command.split(maxsplit=1)[0])
+        latency = t_receive - t_send
+        entry["count"] = entry["count"] + 1
+        entry["errors"] = entry["errors"] + int(is_error)
+        entry["bytes_sent"] = entry["bytes_sent"] + bytes_sent
+        entry["bytes_received"] = entry["bytes_received"] + bytes_received
+        entry["latency_total"] = entry["latency_total"] + latency
+        entry["latency_max"] = max(entry["latency_max"], latency)
+        entry["histogram"][bisect_right(LATENCY_BIN_EDGES, latency)] += 1
+
+    def record_batch(self):
+        self.n_batches = self.n_batches + 1
+
+    def record_delay(self, delay: float):
+        self.delay_time = self.delay_time + delay
+
+    def record_reconnect(self, duration: float):
+        self.n_reconnects = self.n_reconnects + 1
+        self.reconnect_time = self.reconnect_time + duration
+
+    def clear(self):
+        self.__init__()
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            stats (dict): totals, and for each command: count, errors, bytes,
+                mean/p50/p99/max latency [sec] and the latency histogram.
+        """
+        commands = {}
+        for command_code, entry in sorted(self.commands.items()):
+            counts = entry["histogram"]
+            latency_max = entry["latency_max"]
+            commands[command_code] = {
+                "count": entry["count"],
+                "errors": entry["errors"],
+                "bytes_sent": entry["bytes_sent"],
+                "bytes_received": entry["bytes_received"],
+                "latency_mean": entry["latency_total"] / max(entry["count"], 1),
+                # Bin edges can't be more than the slowest reply.
+                "latency_p50": min(histogram_percentile(counts, 50.0), latency_max),
+                "latency_p99": min(histogram_percentile(counts, 99.0), latency_max),
+                "latency_max": latency_max,
+                "histogram": list(counts),
+            }
+        return {
+            "duration": time.time() - self.t_start,
+            "commands_sent": sum(e["count"] for e in self.commands.values()),
+            "errors": sum(e["errors"] for e in self.commands.values()),
+            "batches": self.n_batches,
+            "latency_total": sum(e["latency_total"] for e in self.commands.values()),
+            "delay_total": self.delay_time,
+            "reconnects": self.n_reconnects,
+            "reconnect_total": self.reconnect_time,
+            "histogram_edges": list(LATENCY_BIN_EDGES),
+            "commands": commands,
+        }
+
+    def summary_str(self) -> str:
+        stats = self.stats()
+        lines = [
+            f"ASCOL stats: {stats['commands_sent']} commands in {stats['batches']} "
+            f"batches over {stats['duration']:.0f}s, {stats['errors']} ERR",
+            f"    time in: TCS replies {stats['latency_total']:.2f}s, "
+            f"delay {stats['delay_total']:.2f}s, "
+            f"{stats['reconnects']} reconnects {stats['reconnect_total']:.2f}s",
+        ]
+        for command_code, entry in stats["commands"].items():
+            lines.append(
+                f"    {command_code}: n={entry['count']:5d} err={entry['errors']:3d} "
+                f"mean={1e3 * entry['latency_mean']:7.1f}ms "
+                f"p99={1e3 * entry['latency_p99']:7.1f}ms "
+                f"max={1e3 * entry['latency_max']:7.1f}ms"
+            )
+        return "\n".join(lines)
+
+    def dump(self, path=None):
+        """
+        Log a summary, and optionally write the full stats as JSON to ``path``.
+        """
+        logger.info(self.summary_str())
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(self.stats(), f, indent=2)
+            logger.info(f"ASCOL stats written to {path}")
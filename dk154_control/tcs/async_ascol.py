@@ -0,0 +1,310 @@
+"""
+asyncio-native wrapper for the ASCOL TCP-IP protocol.
+
+Mirrors the commands in ``Ascol``, but every command is a coroutine, so that one
+event loop can poll the telescope/dome while also driving other instruments.
+"""
+
+import asyncio
+import time
+from logging import getLogger
+
+from dk154_control.polling import async_poll_until
+from dk154_control.tcs import ascol_commands, ascol_constants
+from dk154_control.tcs.ascol import AscolStatus, STATUS_COMMANDS
+from dk154_control.tcs.ascol_base import AscolBase
+
+logger = getLogger(__name__.split(".")[-1])
+
+
+@ascol_commands.add_async_command_methods
+class AsyncAscol(AscolBase):
+    """
+    ASCOL client built on ``asyncio`` streams. Has the same command methods as
+    ``Ascol``, which must be awaited.
+
+    Example:
+        Use in an ``async with`` block, so the connection is opened and closed nicely.
+
+        >>> import asyncio
+        >>> from dk154_control.tcs.async_ascol import AsyncAscol
+        >>> async def main():
+        ...     async with AsyncAscol() as ascol:
+        ...         tel_state, dome_state = await asyncio.gather(ascol.ters(), ascol.dors())
+        ...     return tel_state, dome_state
+        >>> asyncio.run(main())
+        ('sky track', 'stopped')
+
+    Commands sent concurrently from many tasks share the one connection - they are
+    sent one batch at a time, so responses are never mixed up.
+
+    Args:
+        test_mode (bool, default: ``False``): For testing commands with
+            the local mock server (see ``mock_ascol``).
+        debug (bool, default: ``False``): Log extra information.
+        delay (float, optional):
+            If provided, wait this many seconds before sending commands after request.
+        external (bool): Use the external IP address. Unlikely to be needed...
+        cache_ttl (dict, optional): {command: time-to-live [sec]} for cached
+            responses (see ``Ascol``).
+        use_proxy (bool, default: ``False``): Connect via the local ``AscolProxy``.
+        dump_stats (bool or str, default: ``False``): see ``Ascol``.
+        connect_timeout (float, default=5.0): see ``Ascol``.
+        read_timeout (float, default=10.0): see ``Ascol``.
+        max_reconnects (int, default=5): see ``Ascol``.
+    """
+
+    def __init__(
+        self,
+        test_mode: bool = False,
+        debug: bool = False,
+        delay: float = 0.1,
+        external: bool = False,
+        cache_ttl: dict = None,
+        use_proxy: bool = False,
+        dump_stats=False,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 10.0,
+        max_reconnects: int = 5,
+    ):
+        super().__init__(
+            test_mode=test_mode,
+            debug=debug,
+            delay=delay,
+            external=external,
+            cache_ttl=cache_ttl,
+            use_proxy=use_proxy,
+            dump_stats=dump_stats,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            max_reconnects=max_reconnects,
+        )
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        """
+        (Re-)connect to the ASCOL server, retrying with jittered exponential
+        backoff (see ``Ascol.reconnect``).
+
+        Raises:
+            ConnectionError: if all of ``max_reconnects`` attempts fail.
+        """
+        for attempt in range(self.max_reconnects):
+            try:
+                await self.connect_once()
+                return
+            except (OSError, asyncio.TimeoutError) as e:
+                await asyncio.sleep(self.connect_retry_delay(attempt, e))
+
+    async def connect_once(self):
+        """
+        Connect once, and wait for the reply to ``PROBE_COMMAND`` (see ``Ascol.probe``).
+        """
+        logger.info("async connect")
+        t_start = time.perf_counter()
+        is_reconnect = self.conn_timestamp is not None
+        await self.close()
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.HOST, self.PORT), self.connect_timeout
+        )
+        self.logged_in = False  # Login is per connection.
+        try:
+            self.writer.write(f"{self.PROBE_COMMAND}\n".encode("utf-8"))
+            await self.writer.drain()
+            await self.read_line(timeout=min(self.PROBE_TIMEOUT, self.read_timeout))
+        except (OSError, asyncio.TimeoutError):
+            await self.close()
+            raise
+        self.connected(t_start, is_reconnect)
+
+    async def read_line(self, timeout: float = None) -> bytes:
+        line = await asyncio.wait_for(
+            self.reader.readline(), timeout or self.read_timeout
+        )
+        if not line.endswith(b"\n"):
+            raise ConnectionError("ASCOL server closed the connection")
+        return line
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass  # Already broken - nothing more to do.
+            self.reader, self.writer = None, None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        logger.info("ASCOL connection closed in __aexit__")
+        self.exit_stats()
+
+    async def get_data(self, command: str) -> tuple:
+        """
+        Send one ASCOL command and return the 'raw' response (see ``Ascol.get_data``).
+        """
+        (data,) = await self.get_many([command])
+        return data
+
+    async def get_many(self, commands) -> list:
+        """
+        Send many ASCOL commands in one write, and read the responses back in order.
+        See ``Ascol.get_many``.
+        """
+        commands = list(commands)
+        results = self.cached_results(commands)
+        missed = [c for c, result in zip(commands, results) if result is None]
+        if len(missed) > 0:
+            results = self.merge_results(results, await self.exchange(missed))
+        return results
+
+    async def read_many(self, commands) -> list:
+        """
+        As ``get_many``, but each response is translated as by the method for that
+        command (see ``Ascol.read_many``).
+        """
+        commands = list(commands)
+        data = await self.get_many(commands)
+        return [ascol_commands.decode(c, d) for c, d in zip(commands, data)]
+
+    async def exchange(self, commands: list) -> list:
+        """
+        Send commands to the server, and read the response to each (no caching).
+        """
+        async with self.lock:
+            self.log_send(commands)
+            if self.delay is not None:
+                await asyncio.sleep(self.delay)
+                self.command_stats.record_delay(self.delay)
+
+            if self.writer is None:
+                await self.connect()
+
+            results = []
+            n_resends = 0
+            while len(results) < len(commands):
+                pending = commands[len(results) :]
+                send_command = "".join(c + "\n" for c in pending).encode("utf-8")
+                try:
+                    self.command_stats.record_batch()
+                    t_send = time.perf_counter()
+                    self.writer.write(send_command)
+                    await self.writer.drain()
+                    for command in pending:
+                        line = await self.read_line()
+                        line = line.decode("ascii")[:-1]  # Without the newline.
+                        results.append(self.record_reply(command, line, t_send))
+                except (OSError, asyncio.TimeoutError) as e:
+                    await self.close()  # Late replies would be out of order.
+                    n_resends = n_resends + 1
+                    self.resend_or_raise(e, n_resends, pending)
+                    await self.connect()
+        return results
+
+    async def get_set_data(self, command: str) -> tuple:
+        """
+        Send a 'set' command, which requires the global password.
+        Login (``gllg``) is only sent if not already logged in on this connection.
+
+        If the reply is ERR, and the login was skipped (or the socket was
+        reconnected while sending), log in again and re-send the command once.
+
+        Args:
+            command (str): A 'set' command recognised by ASCOL.
+
+        Returns:
+            data (tuple): The result of the command.
+        """
+        login_skipped = self.logged_in
+        conn_timestamp = self.conn_timestamp
+
+        await self.gllg()
+        data = await self.get_data(command)
+        if self.retry_set(data, login_skipped, conn_timestamp):
+            await self.gllg()
+            data = await self.get_data(command)
+        return data
+
+    async def wait_for_result(
+        self,
+        func,
+        expected_result,
+        delay=None,
+        timeout=180.0,
+        predicted_duration=None,
+        min_delay=0.2,
+        max_delay=5.0,
+        return_wait_result=False,
+    ):
+        """
+        Await a command repeatedly until the expected result is returned.
+        Other tasks on the event loop keep running while waiting.
+        Arguments as for ``Ascol.wait_for_result``.
+
+        Args:
+            func (Callable): The (AsyncAscol) coroutine function to run many times.
+            exp_result (str or tuple of str): The expected result (eg. "sky track")
+
+        Returns:
+            result: The result of `func` which matched `expected_result`
+                (or ``WaitResult``, if ``return_wait_result=True``)
+        """
+        if delay is not None:
+            min_delay, max_delay = delay, delay
+
+        wait_result = await async_poll_until(
+            func,
+            expected_result,
+            timeout=timeout,
+            predicted_duration=predicted_duration,
+            min_delay=min_delay,
+            max_delay=max_delay,
+        )
+        if return_wait_result:
+            return wait_result
+        return wait_result.result
+
+    async def gllg(self, password=None, force=False):
+        """
+        GLobal LoGin [ASCOL 2.2]
+
+        A successful login is remembered for the current connection, so
+        repeated calls are skipped (see ``logins_skipped``) until there is
+        a reconnect or an ERR reply.
+
+        Args:
+            password (str, default: "****"):
+                Send this string as the password to the server.
+                You will likely never need to provide this.
+            force (bool, default: ``False``):
+                Send the login even if already logged in.
+
+        Returns:
+            password_result (str): 0 (wrong pwd) or 1 (correct)
+        """
+        if self.skip_login(password=password, force=force):
+            return ascol_constants.GLLG_CODES["1"]
+        return self.login_result(await self.get_data(self.login_command(password)))
+
+    async def get_status(self) -> AscolStatus:
+        """
+        Read all status commands in a single batch.
+
+        Returns:
+            status (AscolStatus)
+        """
+        data = await self.get_many(STATUS_COMMANDS)
+        return AscolStatus.from_replies(dict(zip(STATUS_COMMANDS, data)))
+
+    async def log_all_status(self):
+        """
+        Log the position/state of telescope, dome, wheels and mirrors.
+        """
+        status = await self.get_status()
+        status.log_telescope_status()
@@ -0,0 +1,40 @@
+"""
+Where the dome should point for a given target.
+"""
+
+from logging import getLogger
+
+import astropy.units as u
+from astropy.coordinates import AltAz, EarthLocation, SkyCoord
+from astropy.time import Time
+
+logger = getLogger(__name__.split(".")[-1])
+
+# Danish 1.54m, La Silla.
+LA_SILLA = EarthLocation(
+    lat=-29.2560 * u.deg, lon=-70.7394 * u.deg, height=2340.0 * u.m
+)
+
+
+def dome_azimuth(
+    coord: SkyCoord, obstime: Time = None, location: EarthLocation = LA_SILLA
+) -> float:
+    """
+    Azimuth of a target, to send to the dome with ``Ascol.dosa``.
+    (North=0, East=90 deg). The offset of the telescope from the centre of the
+    dome is ignored: the slit is wide enough, and once there ``Ascol.doam``
+    can keep the dome following the telescope.
+
+    Args:
+        coord (astropy.coordinates.SkyCoord): the target.
+        obstime (astropy.time.Time, optional): defaults to now.
+        location (astropy.coordinates.EarthLocation, default=LA_SILLA)
+
+    Returns:
+        az (float): dome azimuth [deg], 0-360.
+    """
+    obstime = obstime or Time.now()
+    altaz = coord.transform_to(AltAz(obstime=obstime, location=location))
+    if altaz.alt.deg < 0.0:
+        logger.warning(f"target is below the horizon (alt={altaz.alt.deg:.1f})")
+    return round(float(altaz.az.deg), 2) % 360.0  # DOSA wants 0.00-359.99
@@ -0,0 +1,640 @@
+"""
+Mock ASCOL server, for testing (and benchmarking) without the real TCS.
+
+Serves the ASCOL line protocol on ``Ascol.LOCAL_HOST:Ascol.LOCAL_PORT``, which is
+where ``Ascol(test_mode=True)`` connects. Behind it is a simple model of the
+telescope, dome, flaps and filter wheels: slews take time, wheels rotate before
+they lock, the dome rotates... Network latency, jitter, and failures
+(ERR replies, dropped connections) can be injected.
+
+Run with eg. ``python3 -m dk154_control.tcs.mock_ascol --latency 0.05``
+"""
+
+import asyncio
+import threading
+import time
+from argparse import ArgumentParser
+from logging import getLogger
+
+import numpy as np
+from astropy.coordinates import SkyCoord
+
+from dk154_control.tcs.ascol import Ascol
+from dk154_control.tcs.dome import dome_azimuth
+from dk154_control.tcs.slew_model import SlewModel, axis_distances, axis_slew_time
+from dk154_control.utils import dec_dms_to_deg, ra_hms_to_deg
+
+logger = getLogger(__name__.split(".")[-1])
+
+
+def deg_to_hms_str(ra: float) -> str:
+    hours = (ra % 360.0) / 15.0
+    hh, rem = divmod(hours * 3600.0, 3600.0)
+    mm, ss = divmod(rem, 60.0)
+    return f"{int(hh):02d}{int(mm):02d}{ss:05.2f}"
+
+
+def deg_to_dms_str(dec: float) -> str:
+    sign = "-" if dec < 0 else "+"
+    dd, rem = divmod(abs(dec) * 3600.0, 3600.0)
+    mm, ss = divmod(rem, 60.0)
+    return f"{sign}{int(dd):02d}{int(mm):02d}{ss:05.2f}"
+
+
+class TimedState:
+    """
+    A state code, which shows ``moving_code`` until ``t_end``, then ``final_code``.
+    """
+
+    def __init__(self, code: str):
+        self.moving_code = code
+        self.final_code = code
+        self.t_end = 0.0
+
+    def start(self, moving_code: str, final_code: str, duration: float, now: float):
+        self.moving_code = moving_code
+        self.final_code = final_code
+        self.t_end = now + duration
+
+    def set(self, code: str):
+        self.moving_code, self.final_code, self.t_end = code, code, 0.0
+
+    def is_moving(self, now: float) -> bool:
+        return now < self.t_end
+
+    def get(self, now: float) -> str:
+        return self.moving_code if now < self.t_end else self.final_code
+
+
+class MockTelescope:
+    """
+    State machine for the mock TCS. State is computed from the clock when each
+    command is handled - nothing runs in the background.
+
+    Args:
+        time_scale (float, default=1.0): multiply the duration of all movements,
+            eg. ``0.01`` to make slews, dome rotation etc. 100x faster.
+        meteo (dict, optional): {command: value} to update ``DEFAULT_METEO``.
+        rng (numpy.random.Generator, optional): for the noise on meteo readings.
+        clock (Callable, optional): returns the time [sec], default ``time.monotonic``.
+    """
+
+    # Times are in [sec], before ``time_scale``.
+    TEON_TIME = 5.0
+    TEPA_TIME = 30.0
+    TEIN_TIME = 20.0
+    TEFL_TIME = 60.0
+    DOME_SPEED = 3.0  # deg/s
+    SLIT_TIME = 15.0
+    FLAP_TIME = 10.0
+    WHEEL_STEP_TIME = 1.5  # per filter position
+
+    PARK_RA_DEC = (0.0, -29.25)
+    LAT_LON = ("-291500.00", "-704400.00")  # as GLLL
+
+    DEFAULT_METEO = {
+        "MEBE": 0.0,
+        "MEBN": 0.0,
+        "MEBW": 0.0,
+        "METW": 0.0,
+        "MEHU": 20.0,
+        "METE": 12.0,
+        "MEWS": 5.0,
+        "MEPR": 0,
+        "MEAP": 770.0,
+        "MEPY": -80.0,
+    }
+
+    def __init__(
+        self, time_scale: float = 1.0, meteo: dict = None, rng=None, clock=None
+    ):
+        self.time_scale = time_scale
+        self.meteo = dict(self.DEFAULT_METEO)
+        self.meteo.update(meteo or {})
+        self.rng = rng or np.random.default_rng()
+        self.clock = clock or time.monotonic
+        self.slew_parameters = dict(SlewModel.DEFAULT_PARAMETERS)
+
+        self.telescope = TimedState("04")  # ready
+        self.slew_start = self.PARK_RA_DEC
+        self.slew_end = self.PARK_RA_DEC
+        self.slew_t0 = 0.0
+        self.slew_duration = 0.0
+        self.target = None
+        self.position = "0"
+
+        self.dome = TimedState("00")
+        self.dome_az_t0 = 0.0
+        self.dome_az_start = 0.0
+        self.dome_target = 0.0  # where the dome is going (or is).
+        self.dome_set_az = 0.0  # from DOSA, used by DOGA.
+        self.dome_auto = False
+
+        self.slit = TimedState("04")  # closed
+        self.flap_cassegrain = TimedState("04")
+        self.flap_mirror = TimedState("04")
+        self.shutter = "0"
+
+        self.wheel_a = TimedState("04")
+        self.wheel_a_position = TimedState("0")
+        self.wheel_a_target = "0"
+        self.wheel_b = TimedState("04")
+        self.wheel_b_position = TimedState("0")
+        self.wheel_b_target = "0"
+
+        self.read_handlers = {
+            "GLRE": lambda now: "1",
+            "GLSR": lambda now: "1",
+            "GLLL": lambda now: " ".join(self.LAT_LON),
+            "GLUT": self.glut,
+            "GLSD": self.glsd,
+            "GLDP": lambda now: "19539",
+            "TRRD": self.trrd,
+            "TERS": self.telescope.get,
+            "DORS": self.dome.get,
+            "DOSS": self.slit.get,
+            "DOLA": lambda now: "0",
+            "FCRS": self.flap_cassegrain.get,
+            "FMRS": self.flap_mirror.get,
+            "WARP": self.wheel_a_position.get,
+            "WARS": self.wheel_a.get,
+            "WBRP": self.wheel_b_position.get,
+            "WBRS": self.wheel_b.get,
+            "FORA": lambda now: "0.00",
+            "FORS": lambda now: "00",
+            "SHRP": lambda now: self.shutter,
+        }
+        for command in self.DEFAULT_METEO:
+            self.read_handlers[command] = lambda now, c=command: self.meteo_reading(c)
+        for command in ("VNOS", "VNES", "VEAS", "VSES", "VSOS", "VSWS", "VWES", "VNWS"):
+            self.read_handlers[command] = lambda now: "05"
+
+        self.set_handlers = {
+            "TEON": self.teon,
+            "TEST": self.test,
+            "TEFL": self.tefl,
+            "TEPA": self.tepa,
+            "TEIN": self.tein,
+            "TSRA": self.tsra,
+            "TGRA": self.tgra,
+            "DOSA": self.dosa,
+            "DOGA": self.doga,
+            "DOAM": self.doam,
+            "DOPA": self.dopa,
+            "DOIN": self.doin,
+            "DOSO": self.doso,
+            "DOST": self.dost,
+            "FCOP": lambda now, arg: self.flap(self.flap_cassegrain, now, arg),
+            "FMOP": lambda now, arg: self.flap(self.flap_mirror, now, arg),
+            "WASP": lambda now, arg: self.wheel_set("a", arg, 8),
+            "WBSP": lambda now, arg: self.wheel_set("b", arg, 7),
+            "WAGP": lambda now: self.wheel_go("a", now),
+            "WBGP": lambda now: self.wheel_go("b", now),
+            "SHOP": self.shop,
+        }
+
+    def handle(self, command: str, logged_in: bool) -> str:
+        """
+        Reply to one command (without the newline). Set commands must be logged in.
+        """
+        command_code, *args = command.split()
+        now = self.clock()
+        try:
+            if command_code in self.read_handlers and len(args) == 0:
+                return self.read_handlers[command_code](now)
+            if command_code in self.set_handlers and logged_in:
+                return self.set_handlers[command_code](now, *args)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"mock: bad command '{command}': {e}")
+        return "ERR"
+
+    def scaled(self, duration: float) -> float:
+        return duration * self.time_scale
+
+    # ===== Global
+    def glut(self, now):
+        t_unix = time.time()
+        mjd = t_unix / 86400.0 + 40587.0
+        seconds = (t_unix % 86400.0) // 0.01 * 0.01
+        hh, rem = divmod(seconds, 3600.0)
+        mm, ss = divmod(rem, 60.0)
+        return f"{int(mjd)} {int(hh):02d}{int(mm):02d}{ss:05.2f}"
+
+    def glsd(self, now):
+        days = time.time() / 86400.0 + 40587.0 - 51544.5  # since J2000
+        gmst = 280.46061837 + 360.98564736629 * days
+        longitude = ra_hms_to_deg(self.LAT_LON[1].lstrip("-")) / 15.0
+        return deg_to_hms_str(gmst - longitude)
+
+    def meteo_reading(self, command):
+        value = self.meteo[command]
+        if command == "MEPR":
+            return f"{int(value)} 1"
+        if command == "MEWS":
+            value = max(value + self.rng.normal(0.0, 0.5), 0.0)
+        return f"{value:.2f} 1"
+
+    # ===== Telescope
+    def current_ra_dec(self, now):
+        if self.slew_duration <= 0.0:
+            return self.slew_end
+        frac = min(max((now - self.slew_t0) / self.slew_duration, 0.0), 1.0)
+        (ra0, dec0), (ra1, dec1) = self.slew_start, self.slew_end
+        d_ra = (ra1 - ra0 + 180.0) % 360.0 - 180.0
+        return (ra0 + frac * d_ra) % 360.0, dec0 + frac * (dec1 - dec0)
+
+    def trrd(self, now):
+        ra, dec = self.current_ra_dec(now)
+        return f"{deg_to_hms_str(ra)} {deg_to_dms_str(dec)} {self.position}"
+
+    def move_to(self, ra, dec, now, duration):
+        self.slew_start = self.current_ra_dec(now)
+        self.slew_end = (ra, dec)
+        self.slew_t0 = now
+        self.slew_duration = duration
+
+    def stop_moving(self, now):
+        self.slew_start = self.slew_end = self.current_ra_dec(now)
+        self.slew_duration = 0.0
+
+    def teon(self, now, on_off):
+        if on_off == "1":
+            self.telescope.start("02", "04", self.scaled(self.TEON_TIME), now)
+        elif on_off == "0":
+            self.stop_moving(now)
+            self.telescope.start("01", "00", self.scaled(self.TEON_TIME), now)
+        else:
+            return "ERR"
+        return "1"
+
+    def test(self, now):
+        self.stop_moving(now)
+        self.telescope.set("04")
+        return "1"
+
+    def tefl(self, now):
+        self.position = "1" if self.position == "0" else "0"
+        self.telescope.start("09", "05", self.scaled(self.TEFL_TIME), now)
+        return "1"
+
+    def tepa(self, now):
+        duration = self.scaled(self.TEPA_TIME)
+        self.move_to(*self.PARK_RA_DEC, now, duration)
+        self.telescope.start("11", "04", duration, now)
+        return "1"
+
+    def tein(self, now):
+        self.telescope.start("12", "04", self.scaled(self.TEIN_TIME), now)
+        return "1"
+
+    def tsra(self, now, ra_str, dec_str, position):
+        if position not in ("0", "1"):
+            return "ERR"
+        self.target = (ra_hms_to_deg(ra_str), dec_dms_to_deg(dec_str), position)
+        return "1"
+
+    def tgra(self, now):
+        if self.target is None or self.telescope.get(now) not in ("04", "05"):
+            return "ERR"
+        ra, dec, position = self.target
+        ra_start, dec_start = self.current_ra_dec(now)
+        d_ra, d_dec = axis_distances(ra_start, dec_start, ra, dec)
+        p = self.slew_parameters
+        duration = max(
+            float(axis_slew_time(d_ra, p["ra_speed"], p["ra_accel"])),
+            float(axis_slew_time(d_dec, p["dec_speed"], p["dec_accel"])),
+        )
+        duration = self.scaled(duration)
+        self.move_to(ra, dec, now, duration)
+        self.position = position
+        self.telescope.start("07", "05", duration, now)
+        if self.dome_auto:
+            self.dome_go(self.dome_azimuth(ra, dec), now, auto=True)
+        return "1"
+
+    # ===== Dome
+    def dome_azimuth(self, ra, dec):
+        """
+        Where the automated dome goes for a telescope at ``ra``, ``dec`` [deg].
+        """
+        coord = SkyCoord(ra=ra, dec=dec, unit="deg")
+        return dome_azimuth(coord)
+
+    def current_dome_az(self, now):
+        if not self.dome.is_moving(now):
+            return self.dome_target
+        duration = self.dome.t_end - self.dome_az_t0
+        frac = (now - self.dome_az_t0) / duration if duration > 0 else 1.0
+        d_az = (self.dome_target - self.dome_az_start + 180.0) % 360.0 - 180.0
+        return (self.dome_az_start + frac * d_az) % 360.0
+
+    def dome_go(self, az, now, auto=False, moving_code=None):
+        start = self.current_dome_az(now)
+        d_az = (az - start + 180.0) % 360.0 - 180.0
+        if auto:
+            final_code = "03"
+            moving_code = moving_code or ("04" if d_az < 0 else "05")
+        else:
+            final_code = "00"
+            moving_code = moving_code or ("01" if d_az < 0 else "02")
+        self.dome_az_start, self.dome_az_t0, self.dome_target = start, now, az % 360.0
+        duration = self.scaled(abs(d_az) / self.DOME_SPEED)
+        self.dome.start(moving_code, final_code, duration, now)
+
+    def dosa(self, now, az_str):
+        self.dome_set_az = float(az_str)
+        return "1"
+
+    def doga(self, now):
+        self.dome_auto = False
+        self.dome_go(self.dome_set_az, now)
+        return "1"
+
+    def doam(self, now):
+        self.dome_auto = True
+        ra, dec = self.current_ra_dec(now)
+        self.dome_go(self.dome_azimuth(ra, dec), now, auto=True)
+        return "1"
+
+    def dopa(self, now):
+        self.dome_auto = False
+        self.dome_go(0.0, now, moving_code="08")
+        return "1"
+
+    def doin(self, now):
+        self.dome_auto = False
+        self.dome.start("11", "00", self.scaled(self.TEIN_TIME), now)
+        return "1"
+
+    def doso(self, now, open_close):
+        if open_close == "1":
+            self.slit.start("01", "03", self.scaled(self.SLIT_TIME), now)
+        elif open_close == "0":
+            self.slit.start("02", "04", self.scaled(self.SLIT_TIME), now)
+        else:
+            return "ERR"
+        return "1"
+
+    def dost(self, now):
+        self.dome_auto = False
+        self.dome_target = self.current_dome_az(now)
+        self.dome.set("00")
+        return "1"
+
+    # ===== Flaps, wheels, shutter
+    def flap(self, flap: TimedState, now, open_close):
+        if open_close == "1":
+            flap.start("01", "03", self.scaled(self.FLAP_TIME), now)
+        elif open_close == "0":
+            flap.start("02", "04", self.scaled(self.FLAP_TIME), now)
+        else:
+            return "ERR"
+        return "1"
+
+    def wheel_set(self, wheel, position, n_positions):
+        if int(position) not in range(n_positions):
+            return "ERR"
+        setattr(self, f"wheel_{wheel}_target", position)
+        return "1"
+
+    def wheel_go(self, wheel, now):
+        state = getattr(self, f"wheel_{wheel}")
+        position = getattr(self, f"wheel_{wheel}_position")
+        target = getattr(self, f"wheel_{wheel}_target")
+        rotating_code = "8" if wheel == "a" else "7"
+
+        current = position.get(now)
+        if current == rotating_code:
+            return "ERR"  # Still moving.
+        n_steps = abs(int(target) - int(current))
+        duration = self.scaled(max(n_steps, 1) * self.WHEEL_STEP_TIME)
+        moving_code = "01" if int(target) > int(current) else "02"
+        state.start(moving_code, "04", duration, now)
+        position.start(rotating_code, target, duration, now)
+        return "1"
+
+    def shop(self, now, open_close):
+        if open_close not in ("0", "1"):
+            return "ERR"
+        self.shutter = open_close
+        return "1"
+
+
+class MockAscolServer:
+    """
+    asyncio server for the mock TCS.
+
+    Each batch of commands read from a client waits ``latency`` (+/- ``jitter``)
+    once, then each command waits ``service_time`` - so batching commands helps
+    here in the same way as with the real server.
+
+    Example:
+        Run the server in a background thread, for use with a (blocking) ``Ascol``.
+
+        >>> with MockAscolServer(latency=0.02, time_scale=0.1):
+        ...     with Ascol(test_mode=True) as ascol:
+        ...         print(ascol.ters())
+        ready
+
+    Args:
+        host (str, default="127.0.0.1")
+        port (int, default=``Ascol.LOCAL_PORT``)
+        latency (float, default=0.0): delay before replying to each batch [sec].
+        jitter (float, default=0.0): the latency varies uniformly by +/- this [sec].
+        service_time (float, default=0.0): extra delay for each command [sec].
+        error_rate (float, default=0.0): fraction of commands which reply ERR.
+        drop_rate (float, default=0.0): fraction of batches where the server
+            closes the connection instead of replying.
+        seed (int, optional): for the random failures/jitter.
+        telescope (MockTelescope, optional): else a new one,
+            with ``time_scale`` and ``meteo``.
+        time_scale (float, default=1.0): see ``MockTelescope``.
+        meteo (dict, optional): see ``MockTelescope``.
+    """
+
+    def __init__(
+        self,
+        host: str = Ascol.LOCAL_HOST,
+        port: int = Ascol.LOCAL_PORT,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        service_time: float = 0.0,
+        error_rate: float = 0.0,
+        drop_rate: float = 0.0,
+        seed: int = None,
+        telescope: MockTelescope = None,
+        time_scale: float = 1.0,
+        meteo: dict = None,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.service_time = service_time
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.rng = np.random.default_rng(seed)
+        self.telescope = telescope or MockTelescope(
+            time_scale=time_scale, meteo=meteo, rng=self.rng
+        )
+
+        self.server = None
+        self.loop = None
+        self.thread = None
+
+        self.n_connections = 0
+        self.n_commands = 0
+        self.n_errors = 0
+        self.n_drops = 0
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.n_connections,
+            "commands": self.n_commands,
+            "injected_errors": self.n_errors,
+            "dropped": self.n_drops,
+        }
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle_client, self.host, self.port
+        )
+        logger.info(f"mock ASCOL server on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        logger.info(f"mock ASCOL server stopped: {self.stats()}")
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    def __enter__(self):
+        self.start_thread()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop_thread()
+
+    def start_thread(self):
+        """
+        Run the server on its own event loop, in a background thread.
+        """
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.start())
+            started.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.stop())
+            pending = asyncio.all_tasks(self.loop)  # Clients still connected.
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(
+                asyncio.gather(*pending, return_exceptions=True)
+            )
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name="MockAscolServer", daemon=True)
+        self.thread.start()
+        if not started.wait(timeout=5.0):
+            raise RuntimeError("mock ASCOL server did not start")
+
+    def stop_thread(self, timeout: float = 5.0):
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=timeout)
+        self.thread = None
+
+    def batch_delay(self) -> float:
+        if self.jitter > 0.0:
+            return max(self.latency + self.rng.uniform(-self.jitter, self.jitter), 0.0)
+        return self.latency
+
+    async def handle_client(self, reader, writer):
+        self.n_connections = self.n_connections + 1
+        logged_in = False  # Login is per connection, as the real server.
+        buffer = b""
+        try:
+            while True:
+                chunk = await reader.read(4096)
+                if len(chunk) == 0:
+                    break
+                buffer = buffer + chunk
+                *lines, buffer = buffer.split(b"\n")
+                if len(lines) == 0:
+                    continue
+
+                delay = self.batch_delay()
+                if delay > 0.0:
+                    await asyncio.sleep(delay)
+                if self.drop_rate > 0.0 and self.rng.random() < self.drop_rate:
+                    self.n_drops = self.n_drops + 1
+                    break
+
+                replies = []
+                for line in lines:
+                    command = line.decode("ascii").strip()
+                    if len(command) == 0:
+                        continue
+                    self.n_commands = self.n_commands + 1
+                    if self.service_time > 0.0:
+                        await asyncio.sleep(self.service_time)
+                    if self.error_rate > 0.0 and self.rng.random() < self.error_rate:
+                        self.n_errors = self.n_errors + 1
+                        replies.append("ERR")
+                        continue
+                    if command.startswith("GLLG"):
+                        logged_in = command.split()[1:] == [Ascol._GLOBAL_PASSWORD]
+                        replies.append("1" if logged_in else "0")
+                        continue
+                    replies.append(self.telescope.handle(command, logged_in))
+                writer.write("".join(r + "\n" for r in replies).encode("ascii"))
+                await writer.drain()
+        except OSError as e:
+            logger.warning(f"mock: client error {e}")
+        except asyncio.CancelledError:
+            pass  # Server shutting down.
+        finally:
+            writer.close()
+
+
+if __name__ == "__main__":
+    import dk154_control  # Set up the loggers.
+
+    parser = ArgumentParser()
+    parser.add_argument("--host", default=Ascol.LOCAL_HOST)
+    parser.add_argument("-p", "--port", default=Ascol.LOCAL_PORT, type=int)
+    parser.add_argument("--latency", default=0.0, type=float)
+    parser.add_argument("--jitter", default=0.0, type=float)
+    parser.add_argument("--service-time", default=0.0, type=float)
+    parser.add_argument("--error-rate", default=0.0, type=float)
+    parser.add_argument("--drop-rate", default=0.0, type=float)
+    parser.add_argument("--time-scale", default=1.0, type=float)
+    parser.add_argument("--seed", default=None, type=int)
+    args = parser.parse_args()
+
+    server = MockAscolServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        service_time=args.service_time,
+        error_rate=args.error_rate,
+        drop_rate=args.drop_rate,
+        seed=args.seed,
+        time_scale=args.time_scale,
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        logger.info("mock server interrupted")
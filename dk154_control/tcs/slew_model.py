@@ -0,0 +1,174 @@
+"""
+Estimate how long a telescope slew (TSRA + TGRA) will take.
+
+Each completed slew is recorded (start/end coordinates from TRRD, and the time taken
+for TERS to return to 'ready'/'sky track'). A per-axis speed/acceleration model is
+fitted to the history, and is saved to disk so it improves night after night.
+"""
+
+import json
+import time
+from collections import namedtuple
+from logging import getLogger
+from pathlib import Path
+
+import numpy as np
+
+from dk154_control import root_dir
+from dk154_control.utils import dec_dms_to_deg, ra_hms_to_deg
+
+logger = getLogger(__name__.split(".")[-1])
+
+SlewRecord = namedtuple(
+    "SlewRecord",
+    ("ra_start", "dec_start", "ra_end", "dec_end", "duration", "timestamp"),
+)
+
+
+def axis_distances(ra_start, dec_start, ra_end, dec_end):
+    """
+    Distance travelled by each axis [deg]. RA distance is the shortest way round.
+    """
+    d_ra = np.abs((np.asarray(ra_end) - np.asarray(ra_start) + 180.0) % 360.0 - 180.0)
+    d_dec = np.abs(np.asarray(dec_end) - np.asarray(dec_start))
+    return d_ra, d_dec
+
+
+def axis_slew_time(distance, speed, accel):
+    """
+    Time to move ``distance`` [deg] with a trapezoidal velocity profile:
+    accelerate at ``accel`` [deg/s2] up to ``speed`` [deg/s], cruise, decelerate.
+    Short moves never reach full speed.
+    """
+    distance = np.asarray(distance, dtype=float)
+    ramp_distance = speed**2 / accel
+    long_time = distance / speed + speed / accel
+    short_time = 2.0 * np.sqrt(distance / accel)
+    return np.where(distance >= ramp_distance, long_time, short_time)
+
+
+class SlewModel:
+    """
+    Slew-time estimator, with one speed/acceleration per axis (RA, Dec).
+
+    The slew time is the time for the slowest axis. For moves long enough to reach
+    full speed, the time for each axis is linear in distance (``d/v + v/a``), so
+    the speed and acceleration for each axis are fitted with a straight line to the
+    slews where that axis was the slowest.
+
+    Args:
+        path (Path, optional): where the model and slew history are saved.
+    """
+
+    DEFAULT_PATH = root_dir / "logs" / "slew_model.json"
+
+    DEFAULT_PARAMETERS = {
+        "ra_speed": 1.0,  # deg/s
+        "ra_accel": 0.1,  # deg/s2
+        "dec_speed": 1.0,
+        "dec_accel": 0.1,
+    }
+    MIN_RECORDS = 3  # Need at least this many slews to fit an axis.
+    MAX_HISTORY = 500
+
+    def __init__(self, path: Path = None):
+        self.path = Path(path or self.DEFAULT_PATH)
+        self.parameters = dict(self.DEFAULT_PARAMETERS)
+        self.history = []
+
+    @classmethod
+    def load(cls, path: Path = None):
+        """
+        Load a saved model, or start a new one if there's no saved model.
+        """
+        model = cls(path=path)
+        if not model.path.exists():
+            logger.info(f"no slew model at {model.path} - use defaults")
+            return model
+        try:
+            with open(model.path) as f:
+                saved = json.load(f)
+            model.parameters.update(saved.get("parameters", {}))
+            model.history = [SlewRecord(*rec) for rec in saved.get("history", [])]
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"could not read slew model {model.path}: {e}")
+        return model
+
+    def save(self):
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        saved = {
+            "parameters": self.parameters,
+            "history": [list(rec) for rec in self.history],
+        }
+        with open(self.path, "w") as f:
+            json.dump(saved, f, indent=2)
+
+    def predict(self, ra_start, dec_start, ra_end, dec_end):
+        """
+        Predict the slew time [sec] between two coordinates, all in [deg].
+        """
+        d_ra, d_dec = axis_distances(ra_start, dec_start, ra_end, dec_end)
+        p = self.parameters
+        t_ra = axis_slew_time(d_ra, p["ra_speed"], p["ra_accel"])
+        t_dec = axis_slew_time(d_dec, p["dec_speed"], p["dec_accel"])
+        return float(np.maximum(t_ra, t_dec))
+
+    def predict_from_trrd(self, ra_str, dec_str, ra_end, dec_end):
+        """
+        As ``predict``, with the start position as returned by ``Ascol.trrd``.
+        """
+        ra_start, dec_start = ra_hms_to_deg(ra_str), dec_dms_to_deg(dec_str)
+        return self.predict(ra_start, dec_start, ra_end, dec_end)
+
+    def record(self, ra_start, dec_start, ra_end, dec_end, duration, fit=True):
+        """
+        Add a completed slew to the history (coordinates in [deg], duration in [sec]),
+        and re-fit the model.
+        """
+        rec = SlewRecord(
+            float(ra_start),
+            float(dec_start),
+            float(ra_end),
+            float(dec_end),
+            float(duration),
+            time.time(),
+        )
+        self.history.append(rec)
+        self.history = self.history[-self.MAX_HISTORY :]
+        if fit:
+            self.fit()
+
+    def fit(self, n_iter=5):
+        """
+        Fit speed and acceleration for each axis to the slew history.
+        """
+        if len(self.history) < self.MIN_RECORDS:
+            return
+        hist = np.array([rec[:5] for rec in self.history])
+        d_ra, d_dec = axis_distances(hist[:, 0], hist[:, 1], hist[:, 2], hist[:, 3])
+        duration = hist[:, 4]
+
+        for ii in range(n_iter):
+            p = self.parameters
+            t_ra = axis_slew_time(d_ra, p["ra_speed"], p["ra_accel"])
+            t_dec = axis_slew_time(d_dec, p["dec_speed"], p["dec_accel"])
+            ra_slowest = t_ra >= t_dec
+
+            new_parameters = dict(p)
+            for axis, distance, mask in [
+                ("ra", d_ra, ra_slowest),
+                ("dec", d_dec, ~ra_slowest),
+            ]:
+                speed = p[f"{axis}_speed"]
+                accel = p[f"{axis}_accel"]
+                # Only the long moves are linear in distance.
+                mask = mask & (distance >= speed**2 / accel)
+                if mask.sum() < self.MIN_RECORDS or np.ptp(distance[mask]) <= 0.0:
+                    continue
+                slope, intercept = np.polyfit(distance[mask], duration[mask], 1)
+                if slope <= 0.0 or intercept <= 0.0:
+                    continue  # Unphysical - keep the previous values.
+                new_parameters[f"{axis}_speed"] = float(1.0 / slope)
+                new_parameters[f"{axis}_accel"] = float((1.0 / slope) / intercept)
+            self.parameters = new_parameters
+        logger.info(f"slew model parameters: {self.parameters}")
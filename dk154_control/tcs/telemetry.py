@@ -0,0 +1,189 @@
+"""
+Background polling of the ASCOL server.
+
+One thread keeps one ASCOL connection, polls each command at its own rate, and
+publishes a read-only ``AscolStatus`` snapshot. Any number of consumers can read the
+latest snapshot without any network I/O.
+"""
+
+import threading
+import time
+from logging import getLogger
+
+from dk154_control.tcs.ascol import Ascol, AscolStatus, STATUS_COMMANDS
+from dk154_control.tcs.telemetry_store import METEO_FIELDS
+
+logger = getLogger(__name__.split(".")[-1])
+
+
+class TelemetryPoller:
+    """
+    Poll ASCOL status commands in a background thread.
+
+    Example:
+        >>> from dk154_control.tcs.telemetry import TelemetryPoller
+        >>> with TelemetryPoller() as poller:
+        ...     status = poller.wait_for_status()
+        ...     print(status.telescope_state)
+        ...     status = poller.get_status() # no network I/O!
+        sky track
+
+    Args:
+        test_mode (bool, default: ``False``): Connect to local mock server.
+        rates (dict, optional): {command: poll period [sec]}, updates ``DEFAULT_RATES``.
+            All of ``ascol.STATUS_COMMANDS`` are always polled (they are needed
+            for ``AscolStatus``). Responses to any other commands
+            (eg. "METW") are available in ``AscolStatus.replies``.
+        debug (bool, default: ``False``): passed to Ascol.
+        delay (float, optional): passed to Ascol.
+        external (bool, default: ``False``): passed to Ascol.
+        store (TelemetryStore, optional): every poll is appended to this store.
+            To record the meteo readings too, use ``rates=TelemetryPoller.METEO_RATES``.
+    """
+
+    DEFAULT_RATES = {
+        "GLUT": 1.0,
+        "TERS": 1.0,
+        "TRRD": 1.0,
+        "DORS": 2.0,
+        "WARS": 2.0,
+        "WBRS": 2.0,
+        "DOSS": 5.0,
+        "SHRP": 5.0,
+        "WARP": 10.0,
+        "WBRP": 10.0,
+        "FCRS": 10.0,
+        "FMRS": 10.0,
+        "GLRE": 30.0,
+        "GLSR": 30.0,
+    }
+    DEFAULT_RATE = 10.0  # For STATUS_COMMANDS missing from rates.
+    METEO_RATES = {command: 30.0 for command in METEO_FIELDS.values()}
+    RECONNECT_WAIT = 2.0
+
+    def __init__(
+        self,
+        test_mode: bool = False,
+        rates: dict = None,
+        debug: bool = False,
+        delay: float = None,
+        external: bool = False,
+        store=None,
+    ):
+        self.test_mode = test_mode
+        self.debug = debug
+        self.delay = delay
+        self.external = external
+        self.store = store
+
+        self.rates = {c: self.DEFAULT_RATE for c in STATUS_COMMANDS}
+        self.rates.update(self.DEFAULT_RATES)
+        self.rates.update(rates or {})
+
+        self.replies = {}
+        self.reply_times = {}
+        self.status = None
+        self.n_polls = 0
+
+        self.has_status = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self.run, name="TelemetryPoller", daemon=True
+        )
+        self.thread.start()
+        logger.info("telemetry poller started")
+
+    def stop(self, timeout: float = 5.0):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+        logger.info("telemetry poller stopped")
+
+    def get_status(self) -> AscolStatus:
+        """
+        Returns:
+            status (AscolStatus or None): the latest (read-only) snapshot,
+                or None if nothing has been polled yet.
+        """
+        return self.status
+
+    def wait_for_status(self, timeout: float = 10.0) -> AscolStatus:
+        """
+        As ``get_status``, but wait for the first snapshot if needed.
+        """
+        if not self.has_status.wait(timeout=timeout):
+            raise TimeoutError(f"no telemetry after {timeout:.1f}s")
+        return self.status
+
+    def run(self):
+        # Don't use Ascol's cache: poll each command at the rate requested.
+        cache_ttl = {command: 0.0 for command in self.rates}
+        next_due = {command: 0.0 for command in self.rates}
+
+        ascol = None
+        while not self.stop_event.is_set():
+            try:
+                if ascol is None:
+                    ascol = Ascol(
+                        test_mode=self.test_mode,
+                        debug=self.debug,
+                        delay=self.delay,
+                        external=self.external,
+                        cache_ttl=cache_ttl,
+                    )
+
+                t_now = time.monotonic()
+                due = [c for c, t_due in next_due.items() if t_due <= t_now]
+                if len(due) > 0:
+                    self.poll(ascol, due)
+                    for command in due:
+                        next_due[command] = t_now + self.rates[command]
+
+                wait = min(next_due.values()) - time.monotonic()
+                self.stop_event.wait(timeout=max(wait, 0.0))
+            except OSError as e:
+                logger.warning(f"telemetry poll failed ({e}): reconnect")
+                if ascol is not None:
+                    ascol.close()
+                ascol = None
+                self.stop_event.wait(timeout=self.RECONNECT_WAIT)
+
+        if ascol is not None:
+            ascol.close()
+        if self.store is not None:
+            self.store.flush()
+
+    def poll(self, ascol: Ascol, commands: list):
+        """
+        Read ``commands`` in one batch, and publish a new snapshot.
+        """
+        data = ascol.get_many(commands)
+        t_reply = time.time()
+        for command, reply in zip(commands, data):
+            self.replies[command] = reply
+            self.reply_times[command] = t_reply
+        self.n_polls = self.n_polls + 1
+        if self.store is not None:
+            self.store.append_replies(self.replies, timestamp=t_reply)
+
+        try:
+            status = AscolStatus.from_replies(self.replies)
+        except (KeyError, ValueError) as e:
+            logger.warning(f"could not decode telemetry: {e}")
+            return
+        self.status = status.freeze()  # Swapping the reference is atomic.
+        self.has_status.set()
@@ -0,0 +1,188 @@
+"""
+Fixed-size ring buffer of telescope and meteo telemetry.
+
+Records are rows of a NumPy structured array, backed by a memory-mapped ``.npy``
+file, so the history survives restarts and can be read by other processes.
+Queries by time are a binary search plus array slices - no log grepping.
+"""
+
+import time
+from logging import getLogger
+from pathlib import Path
+
+import numpy as np
+
+from dk154_control import root_dir
+from dk154_control.utils import dec_dms_to_deg, ra_hms_to_deg
+
+logger = getLogger(__name__.split(".")[-1])
+
+# Status commands whose (first) reply is an integer code.
+CODE_FIELDS = {
+    "remote_state": "GLRE",
+    "safety_relay_state": "GLSR",
+    "telescope_state": "TERS",
+    "dome_state": "DORS",
+    "dome_slit_state": "DOSS",
+    "flap_cassegrain_state": "FCRS",
+    "flap_mirror_state": "FMRS",
+    "shutter_position": "SHRP",
+    "wheel_a_state": "WARS",
+    "wheel_b_state": "WBRS",
+    "wheel_a_position": "WARP",
+    "wheel_b_position": "WBRP",
+}
+
+# Meteo commands, which reply "<value> <validity>". Invalid readings are stored as NaN.
+METEO_FIELDS = {
+    "brightness_east": "MEBE",
+    "brightness_north": "MEBN",
+    "brightness_west": "MEBW",
+    "twilight": "METW",
+    "humidity": "MEHU",
+    "temperature": "METE",
+    "wind_speed": "MEWS",
+    "precipitation": "MEPR",
+    "pressure": "MEAP",
+    "irradiance": "MEPY",
+}
+
+TELEMETRY_DTYPE = np.dtype(
+    [("time", "f8"), ("ra", "f8"), ("dec", "f8"), ("position", "i1")]
+    + [(field, "i1") for field in CODE_FIELDS]
+    + [(field, "f4") for field in METEO_FIELDS]
+)
+
+
+def record_from_replies(replies: dict, timestamp: float = None) -> np.ndarray:
+    """
+    Build one telemetry record from 'raw' ASCOL responses, keyed by command.
+    Missing codes are -1, and missing/invalid meteo readings are NaN.
+    """
+    record = np.zeros((), dtype=TELEMETRY_DTYPE)
+    record["time"] = timestamp or time.time()
+
+    try:
+        ra_str, dec_str, position_code, *dummy_values = replies["TRRD"]
+        record["ra"] = ra_hms_to_deg(ra_str)
+        record["dec"] = dec_dms_to_deg(dec_str)
+        record["position"] = int(position_code)
+    except (KeyError, ValueError):
+        record["ra"], record["dec"], record["position"] = np.nan, np.nan, -1
+
+    for field, command in CODE_FIELDS.items():
+        try:
+            record[field] = int(replies[command][0])
+        except (KeyError, IndexError, ValueError):
+            record[field] = -1
+
+    for field, command in METEO_FIELDS.items():
+        try:
+            value, validity_code, *dummy_values = replies[command]
+            record[field] = float(value) if validity_code == "1" else np.nan
+        except (KeyError, ValueError):
+            record[field] = np.nan
+    return record
+
+
+class TelemetryStore:
+    """
+    Memory-mapped ring buffer of telemetry records (see ``TELEMETRY_DTYPE``).
+
+    Example:
+        Wind speed over the last hour, from another process while the poller is running.
+
+        >>> store = TelemetryStore()
+        >>> recent = store.since(time.time() - 3600.0)
+        >>> recent["wind_speed"].max()
+
+    Args:
+        path (Path, optional): the ``.npy`` file. An index file ``<name>.index.npy``
+            is kept next to it.
+        capacity (int, default=100000): number of records kept (~1 day at 1 Hz).
+            Ignored if the file already exists.
+    """
+
+    DEFAULT_PATH = root_dir / "logs" / "telemetry.npy"
+
+    def __init__(self, path: Path = None, capacity: int = 100_000):
+        self.path = Path(path or self.DEFAULT_PATH)
+        self.index_path = self.path.with_name(self.path.stem + ".index.npy")
+
+        if self.path.exists() and self.index_path.exists():
+            self.data = np.lib.format.open_memmap(self.path, mode="r+")
+            if self.data.dtype != TELEMETRY_DTYPE:
+                msg = (
+                    f"{self.path} has a different dtype - move it, or use another path"
+                )
+                raise ValueError(msg)
+            self.index = np.lib.format.open_memmap(self.index_path, mode="r+")
+            logger.info(f"opened telemetry store {self.path} ({len(self)} records)")
+        else:
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            self.data = np.lib.format.open_memmap(
+                self.path, mode="w+", dtype=TELEMETRY_DTYPE, shape=(capacity,)
+            )
+            self.index = np.lib.format.open_memmap(
+                self.index_path, mode="w+", dtype="i8", shape=(2,)
+            )  # [next write position, number of records]
+            logger.info(f"new telemetry store {self.path} (capacity {capacity})")
+
+        self.capacity = len(self.data)
+
+    def __len__(self):
+        return int(self.index[1])
+
+    def append(self, record: np.ndarray):
+        head = int(self.index[0])
+        self.data[head] = record
+        # Only move the index after the record is written.
+        self.index[1] = min(int(self.index[1]) + 1, self.capacity)
+        self.index[0] = (head + 1) % self.capacity
+
+    def append_replies(self, replies: dict, timestamp: float = None):
+        self.append(record_from_replies(replies, timestamp=timestamp))
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def segments(self):
+        """
+        The (up to two) slices of the buffer, each in time order, oldest first.
+        """
+        head, count = int(self.index[0]), int(self.index[1])
+        if count < self.capacity:
+            return [self.data[:count]]
+        return [self.data[head:], self.data[:head]]
+
+    def latest(self, n: int = 1) -> np.ndarray:
+        """
+        The most recent ``n`` records, oldest first (a copy).
+        """
+        n = min(n, len(self))
+        if n == 0:
+            return np.zeros(0, dtype=TELEMETRY_DTYPE)
+        head = int(self.index[0])
+        indices = np.arange(head - n, head) % self.capacity
+        return self.data[indices]
+
+    def between(self, t_start: float, t_end: float = None) -> np.ndarray:
+        """
+        All records with ``t_start <= time < t_end``, oldest first (a copy).
+
+        Args:
+            t_start (float): unix time.
+            t_end (float, optional): unix time. Defaults to include the newest record.
+        """
+        t_end = t_end or np.inf
+        chunks = []
+        for segment in self.segments():
+            times = segment["time"]
+            i_start = np.searchsorted(times, t_start, side="left")
+            i_end = np.searchsorted(times, t_end, side="left")
+            chunks.append(segment[i_start:i_end])
+        return np.concatenate(chunks)
+
+    def since(self, t_start: float) -> np.ndarray:
+        return self.between(t_start)
@@ -4,8 +4,6 @@ import os
 
 import numpy as np
 
-from astropy.coordinates import Angle
-
 
 class SilenceLoggers:
 
@@ -28,14 +26,15 @@ def dec_dms_to_deg(dms):
     else:
         dms_str = dms
 
-    d_str = dms_str[:3]
-    m_str = dms_str[3:5]
-    s_str = dms_str[5:]
-
-    new_str = f"{d_str}d{m_str}m{s_str}s"
+    # Plain arithmetic, rather than astropy Angle: this is called for every
+    # telemetry record, and is ~100x faster.
+    sign = -1.0 if dms_str.startswith("-") else 1.0
+    dms_str = dms_str.lstrip("+-")
+    d_str = dms_str[:2]
+    m_str = dms_str[2:4]
+    s_str = dms_str[4:]
 
-    angle = Angle(new_str)
-    return angle.deg
+    return sign * (int(d_str) + int(m_str) / 60.0 + float(s_str) / 3600.0)
 
 
 def ra_hms_to_deg(hms):
@@ -53,7 +52,4 @@ def ra_hms_to_deg(hms):
     m_str = hms_str[2:4]
     s_str = hms_str[4:]
 
-    new_str = f"{h_str}h{m_str}m{s_str}s"
-
-    angle = Angle(new_str)
-    return angle.deg
+    return 15.0 * (int(h_str) + int(m_str) / 60.0 + float(s_str) / 3600.0)
@@ -1,8 +1,7 @@
 import time
 from argparse import ArgumentParser
 
-from dk154_control.tcs.ascol import Ascol
-
+from dk154_control.tcs.telemetry import TelemetryPoller
 
 if __name__ == "__main__":
     parser = ArgumentParser()
@@ -14,7 +13,9 @@ if __name__ == "__main__":
     test_mode = args.test_mode  # False by default
     debug = args.debug  # False by default
 
-    with Ascol(test_mode=test_mode, debug=debug) as ascol:
+    # The poller keeps one connection, and other readers can share its snapshots.
+    with TelemetryPoller(test_mode=test_mode, debug=debug) as poller:
+        poller.wait_for_status()
         while True:
-            ascol.log_all_status()
-            time.sleep(2.0)
+            poller.get_status().log_telescope_status()
+            time.sleep(args.sleep_time)
@@ -0,0 +1,229 @@
+"""
+Benchmark ASCOL round trips.
+
+By default, runs against the bundled mock server (``mock_ascol``) in a background
+thread, with the latency given by ``--latency``. Use ``--no-mock`` to run against
+whatever is already listening on the test port (eg. the mock server with other
+settings), or ``--real`` for the real TCS (without the wheel test).
+
+Results are saved as JSON (``logs/benchmarks/`` by default), and can be compared
+with an earlier run with ``--compare old.json``.
+"""
+
+import json
+import platform
+import subprocess
+import time
+from argparse import ArgumentParser
+from logging import getLogger
+from pathlib import Path
+
+import numpy as np
+
+import dk154_control
+from dk154_control import root_dir
+from dk154_control.tcs.ascol import Ascol, AscolStatus, STATUS_COMMANDS
+from dk154_control.tcs.mock_ascol import MockAscolServer
+from dk154_control.utils import SilenceLoggers
+
+logger = getLogger("bench_" + __file__.split("/")[-1].split("_")[0])
+
+READ_COMMANDS = ("TERS", "TRRD", "GLUT", "DORS", "WARP", "MEWS")
+NO_CACHE = {command: 0.0 for command in STATUS_COMMANDS + READ_COMMANDS}
+
+
+def timing_summary(durations) -> dict:
+    """
+    Summary statistics of a list of durations [sec], reported in [ms].
+    """
+    durations = np.asarray(durations)
+    return {
+        "n": int(len(durations)),
+        "mean_ms": float(1e3 * durations.mean()),
+        "p50_ms": float(1e3 * np.percentile(durations, 50)),
+        "p99_ms": float(1e3 * np.percentile(durations, 99)),
+        "max_ms": float(1e3 * durations.max()),
+    }
+
+
+def time_calls(func, n_repeats: int) -> list:
+    durations = []
+    for ii in range(n_repeats):
+        t1 = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - t1)
+    return durations
+
+
+def bench_commands(ascol: Ascol, n_repeats: int) -> dict:
+    """
+    Single commands with ``get_data`` (cache off): latency and commands/sec.
+    """
+    results = {}
+    for command in READ_COMMANDS:
+        durations = time_calls(lambda: ascol.get_data(command), n_repeats)
+        summary = timing_summary(durations)
+        summary["commands_per_sec"] = float(len(durations) / np.sum(durations))
+        results[command] = summary
+    return results
+
+
+def bench_snapshots(ascol: Ascol, n_repeats: int, args) -> dict:
+    """
+    A full status snapshot: one command at a time, batched, and the helpers.
+    """
+    n_commands = len(STATUS_COMMANDS)
+
+    def one_at_a_time():
+        for command in STATUS_COMMANDS:
+            ascol.get_data(command)
+
+    results = {}
+    for name, func in [
+        ("sequential_get_data", one_at_a_time),
+        ("get_many", lambda: ascol.get_many(STATUS_COMMANDS)),
+        ("log_all_status", ascol.log_all_status),
+        ("AscolStatus.from_ascol", lambda: AscolStatus.from_ascol(ascol)),
+    ]:
+        durations = time_calls(func, n_repeats)
+        summary = timing_summary(durations)
+        summary["commands_per_sec"] = float(
+            n_commands * len(durations) / np.sum(durations)
+        )
+        results[name] = summary
+
+    # collect_silent opens a new connection every time.
+    durations = time_calls(
+        lambda: AscolStatus.collect_silent(test_mode=args.test_mode, delay=None),
+        max(n_repeats // 10, 3),
+    )
+    results["AscolStatus.collect_silent"] = timing_summary(durations)
+    return results
+
+
+def bench_reconnect(ascol: Ascol, n_repeats: int) -> dict:
+    durations = time_calls(ascol.connect_socket, n_repeats)
+    return timing_summary(durations)
+
+
+def bench_wait_for_result(ascol: Ascol, n_repeats: int) -> dict:
+    """
+    Rotate wheel A between two positions, and time how long ``wait_for_result``
+    takes to notice that the wheel has stopped (mock server only).
+    """
+    durations, n_polls = [], []
+    for ii in range(n_repeats):
+        position = "1" if ii % 2 == 0 else "2"
+        ascol.wasp(position)
+        ascol.wagp()
+        t1 = time.perf_counter()
+        wait_result = ascol.wait_for_result(
+            ascol.wars, "locked", min_delay=0.05, return_wait_result=True
+        )
+        durations.append(time.perf_counter() - t1)
+        n_polls.append(wait_result.n_polls)
+    summary = timing_summary(durations)
+    summary["mean_polls"] = float(np.mean(n_polls))
+    return summary
+
+
+def get_git_commit() -> str:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=root_dir,
+        )
+        return result.stdout.strip()
+    except OSError:
+        return "unknown"
+
+
+def run_benchmarks(args) -> dict:
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "settings": {k: str(v) for k, v in vars(args).items()},
+    }
+    with Ascol(test_mode=args.test_mode, delay=None, cache_ttl=NO_CACHE) as ascol:
+        logger.info("benchmark single commands")
+        results["commands"] = bench_commands(ascol, args.n_repeats)
+        logger.info("benchmark status snapshots")
+        results["snapshots"] = bench_snapshots(ascol, args.n_repeats, args)
+        logger.info("benchmark reconnect")
+        results["reconnect"] = bench_reconnect(ascol, max(args.n_repeats // 10, 3))
+        if not args.real:
+            logger.info("benchmark wait_for_result")
+            results["wait_for_result"] = bench_wait_for_result(ascol, 5)
+    return results
+
+
+def flatten(results: dict, prefix="") -> dict:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix=f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def print_results(results: dict, previous: dict = None):
+    flat = flatten({k: results[k] for k in results if k != "settings"})
+    old = flatten(previous or {})
+    for key, value in flat.items():
+        if not key.endswith(("p50_ms", "p99_ms", "commands_per_sec")):
+            continue
+        line = f"{key:60s} {value:10.3f}"
+        if key in old and old[key] > 0:
+            line = line + f"  ({value / old[key]:.2f}x previous)"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument("-n", "--n-repeats", default=200, type=int)
+    parser.add_argument("--latency", default=0.002, type=float)
+    parser.add_argument("--jitter", default=0.0005, type=float)
+    parser.add_argument("--time-scale", default=0.1, type=float)
+    parser.add_argument("--no-mock", action="store_true", default=False)
+    parser.add_argument("--real", action="store_true", default=False)
+    parser.add_argument("-o", "--output", default=None, type=Path)
+    parser.add_argument("--compare", default=None, type=Path)
+    parser.add_argument("--with-logging", action="store_true", default=False)
+    args = parser.parse_args()
+    args.test_mode = not args.real
+
+    mock_server = None
+    if not (args.no_mock or args.real):
+        mock_server = MockAscolServer(
+            latency=args.latency, jitter=args.jitter, time_scale=args.time_scale
+        )
+        mock_server.start_thread()
+
+    try:
+        if args.with_logging:
+            results = run_benchmarks(args)
+        else:
+            with SilenceLoggers():  # Else mostly measures writing the log files.
+                results = run_benchmarks(args)
+    finally:
+        if mock_server is not None:
+            mock_server.stop_thread()
+
+    output = args.output
+    if output is None:
+        output_dir = root_dir / "logs" / "benchmarks"
+        output_dir.mkdir(exist_ok=True, parents=True)
+        output = output_dir / f"ascol_{time.strftime('%y%m%d_%H%M%S')}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"benchmark results written to {output}")
+
+    previous = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_results(results, previous=previous)